@@ -1,16 +1,30 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
-from flair.data import Sentence
-from pandas import DataFrame
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from src.api.response_encoding import ResponseEncoding
+from src.api.schemas.detect_entities import DetectEntitiesRequest, DetectEntitiesResponse
+from src.api.schemas.detect_entities_and_pseudonymize import DetectEntitiesAndPseudonymizeRequest, DetectEntitiesAndPseudonymizeResponse
+from src.domain.entity_span import EntitySpan, entity_spans_to_columns, entity_spans_to_rows, pseudonymize_text
+from src.domain.exceptions import (JobNotFoundError, ModelMemoryBudgetExceededError, ModelQueueFullError,
+                                   UnsupportedResponseEncodingError)
+from src.infrastructure.frameworks.mt5_output_parser import MT5OutputParser
+from src.infrastructure.services.entity_span_inference import infer_entity_spans, to_output_items
+from src.infrastructure.services.inference_metrics import InferenceMetrics
+from src.infrastructure.services.job_queue import Job, JobQueue
+from src.infrastructure.services.job_runner import JobRunner
+from src.infrastructure.services.model_executor import ExecutionTiming, TimedResult
 from src.infrastructure.services.model_service_impl import ModelServiceImpl
-from typing import Any, Dict, List
+from src.utils import AppInfo, record_quantity, record_stage, stage_labels, timed_stage
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple, Type, Union
 
+import asyncio
+import json
 import logging
-import pandas as pd
-import re
 import subprocess
 import threading
+import time
 import uvicorn
 
 # Logging setup
@@ -19,19 +33,52 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.model_service = ModelServiceImpl()
+    # the prefork server hands every worker the model service started up in its master
+    if getattr(app.state, "model_service", None) is None:
+        app.state.model_service = ModelServiceImpl()
+    app_info = AppInfo.load()
+    app.state.mt5_output_parsers = {
+        entity_set.entity_set_id: MT5OutputParser(app_info.get_fine_grained_labels(entity_set.entity_set_id))
+        for entity_set in app_info.entity_sets
+    }
+    app.state.streaming_settings = app_info.streaming
+    app.state.response_encoding_settings = app_info.response_encoding
+    app.state.inference_metrics = InferenceMetrics()
+    if app_info.metrics.enabled:
+        app.state.inference_metrics.install()
+    # load and warm up the models in the background, /ready reports when they are done,
+    # in a prefork worker only the models the master could not share are loaded, the shared ones are warm already
+    threading.Thread(target=app.state.model_service.start_up, name="model-startup", daemon=True).start()
+    app.state.jobs_settings = app_info.jobs
+    app.state.job_queue, job_runner = None, None
+    if app_info.jobs.enabled:
+        app.state.job_queue = JobQueue(sqlite_path=app_info.jobs.sqlite_path, lease_seconds=app_info.jobs.lease_seconds)
+        job_runner = JobRunner(job_queue=app.state.job_queue,
+                               model_service=app.state.model_service,
+                               process_texts=_process_job_texts,
+                               workers=app_info.jobs.workers,
+                               chunk_size=app_info.jobs.chunk_size,
+                               max_defer_seconds=app_info.jobs.max_defer_seconds,
+                               retention_seconds=app_info.jobs.retention_seconds)
+        job_runner.start()
     yield
+    if job_runner is not None:
+        job_runner.stop(timeout=30.0)
+        app.state.job_queue.close()
+    app.state.inference_metrics.uninstall()
 
 # Initialize FastAPI app
 app = FastAPI(lifespan=lifespan)
 
-labels = ['CITY', 'DATE', 'EMAIL', 'FAMILY', 'FEMALE', 'MALE', 'ORG', 
-          'PHONE', 'STREET', 'STREETNO', 'UFID', 'URL', 'USER', 'ZIP']
-
 supported_entity_set_model_dict = {
     "codealltag": ["bilstm-crf-plus", "deepset-gelectra-large", "google-mt5-base"]
 }
 
+# the models generating pseudonyms, the others only detect entities
+pseudonymizing_entity_set_model_dict = {
+    "codealltag": ["google-mt5-base"]
+}
+
 # Define input schema
 class ApiRequest(BaseModel):
     entity_set_id: str
@@ -48,205 +95,430 @@ class DataItem(BaseModel):
 class ApiResponse(BaseModel):
     output: List[List[DataItem]]
 
-def get_annotation_df_with_input_text_and_predicted_text(input_text: str, 
-                                                         predicted_text: str,
-                                                         labels: List[str]) -> DataFrame:
-    tuples = list()
-
-    input_text_length = len(input_text)
-    input_text_copy = input_text[0: input_text_length]
-
-    item_delim = ";"
-    token_delim = ":"
-    token_id = 0
-    next_cursor = 0
-
-    predicted_items = predicted_text.split(item_delim)
-    for item in predicted_items:
-        item = item.strip()
-        label, token, pseudonym = "", "", ""
-
-        for l in labels:
-            if re.search((r'\b' + l + r'\b' +':'), item):
-                label = l
-                break
+# Define the status schema of a batch job
+class JobResponse(BaseModel):
+    job_id: str
+    entity_set_id: str
+    model_id: str
+    state: str
+    total_texts: int
+    completed_texts: int
+    progress: float
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    error: Optional[str]
+
+# Define the schema of a page of the results of a batch job, output[i] is the output of input text offset + i
+class JobResultsResponse(BaseModel):
+    job_id: str
+    state: str
+    offset: int
+    next_offset: Optional[int]
+    output: List[List[DataItem]]
 
-        if label != "":
-            item = item[item.find(label + ":"):]
-            value_splits = item.split(label+token_delim)
-            token_pseudonym = value_splits[1].strip()
-            pattern = r'^(.*?)\s*\*\*(.*?)\*\*'
-            matches = re.search(pattern, token_pseudonym)
-            if matches:
-                token = matches.group(1)
-                pseudonym = matches.group(2)
-            else:
-                token = token_pseudonym
-
-            if len(token.strip()) > 0:
-
-                start = input_text_copy.find(token)
-                if start == -1 and ' ' in token:
-                    token = token.replace(' ', '')
-                    start = input_text_copy.find(token)
-
-                if start != -1:
-                    end = start + len(token)
-
-                    token_id += 1
-                    prev_cursor = next_cursor
-                    next_cursor += end
-                    input_text_copy = input_text[next_cursor: input_text_length]
-
-                    start = prev_cursor + start
-                    end = prev_cursor + end
-
-                    tuples.append((
-                        'T' + str(token_id),
-                        label,
-                        start,
-                        end,
-                        input_text[start:end],
-                        pseudonym
-                    ))
-
-    return pd.DataFrame(
-        tuples,
-        columns=["Token_ID", "Label", "Start", "End", "Token", "Pseudonym"]
-    )
+# Define the schema of a line of the streamed request body
+class StreamInputLine(BaseModel):
+    text: str
+    id: Optional[str] = None
 
-def get_pseudonymized_text(input_text: str, predicted_annotation_df: DataFrame) -> str:
-    output_text = input_text
-    offset = 0
-    for index, row in predicted_annotation_df.iterrows():
-        output_text = output_text[:(row.Start+offset)] + row.Pseudonym + output_text[(row.End+offset):]
-        offset += len(row.Pseudonym) - len(row.Token)
-    return output_text
-
-def get_annotation_df_with_flair_tagger(input_text: str, tagger_id: str) -> DataFrame:
-    tuples = list()
-    
-    email_content = input_text
-    model_inference_maker = app.state.model_service.get_model_inference_maker('codealltag', tagger_id)
-    sentences = model_inference_maker.infer(input_text=input_text)
-
-    email_content_length = len(email_content)
-    email_content_copy = email_content[0:email_content_length]
-
-    token_id = 0
-    next_cursor = 0
-    for sentence in sentences:
-        labels = sentence.get_labels()
-        for label in labels:
-            text = label.data_point.text
-            start = email_content_copy.find(text)
-            if start == -1 and ' ' in text:
-                start = email_content_copy.find(text.split(' ')[0])
-                text = text.replace(' ', '')
-
-            if start != -1:
-                end = start + len(text)
-
-                token_id += 1
-                prev_cursor = next_cursor
-                next_cursor += end
-                email_content_copy = email_content[next_cursor:email_content_length]
-
-                start = prev_cursor + start
-                end = prev_cursor + end
-
-                tuples.append((
-                    'T' + str(token_id),
-                    label.value,
-                    start,
-                    end,
-                    email_content[start:end]
-                ))
-            else:
-                token_id += 1
-                tuples.append((
-                    'T' + str(token_id),
-                    label.value,
-                    -1,
-                    -1,
-                    text
-                ))
-
-    return pd.DataFrame(
-        tuples,
-        columns=["Token_ID", "Label", "Start", "End", "Token"]
-    )
+def _infer_for_codealltag_mT5(input_data) -> List[List[List[EntitySpan]]]:
+    micro_batcher = app.state.model_service.get_micro_batcher(input_data.entity_set_id, input_data.model_id)
+    return infer_entity_spans(micro_batcher.infer, input_data.input_texts, input_data.repeat,
+                              mt5_output_parser=app.state.mt5_output_parsers[input_data.entity_set_id])
 
 def _process_for_codealltag_mT5(input_data, output):
-    model_inference_maker = app.state.model_service.get_model_inference_maker(input_data.entity_set_id, input_data.model_id)
-    for input_text in input_data.input_texts:
-        per_text_output: List[DataItem] = list()
-        predicted_texts: List[str] = model_inference_maker.infer(input_text=input_text, 
-                                                              max_length=512, 
-                                                              padding="max_length", 
-                                                              truncation=True, 
-                                                              repeat_count=input_data.repeat, 
-                                                              temperature=0.8, 
-                                                              do_sample=True, 
-                                                              top_k=100)
-        
-        for predicted_text in predicted_texts:
-            print(predicted_text)
-            output_df = get_annotation_df_with_input_text_and_predicted_text(input_text, predicted_text, labels)
-            output_text = get_pseudonymized_text(input_text, output_df)
-            data_item = DataItem(output_dict=output_df.to_dict(), output_text=output_text)
-            per_text_output.append(data_item)
-
-        output.append(per_text_output)
-    
+    output_items = to_output_items(input_data.input_texts, _infer_for_codealltag_mT5(input_data), with_pseudonym=True)
+    output.extend([DataItem(**item) for item in per_text_output] for per_text_output in output_items)
     return output
 
+def _infer_for_codealltag_tagger(input_data) -> List[List[List[EntitySpan]]]:
+    micro_batcher = app.state.model_service.get_micro_batcher(input_data.entity_set_id, input_data.model_id)
+    return infer_entity_spans(micro_batcher.infer, input_data.input_texts, input_data.repeat)
+
 def _process_for_codealltag_tagger(input_data, output):
-    tagger_id = input_data.model_id
-    for input_text in input_data.input_texts:
-        per_text_output: List[DataItem] = list()
-        output_df = get_annotation_df_with_flair_tagger(input_text, tagger_id)
-        data_item = DataItem(output_dict=output_df.to_dict(), output_text='not_available')
-        per_text_output.append(data_item)
-        output.append(per_text_output)
-    
+    output_items = to_output_items(input_data.input_texts, _infer_for_codealltag_tagger(input_data), with_pseudonym=False)
+    output.extend([DataItem(**item) for item in per_text_output] for per_text_output in output_items)
     return output
 
 def _process_for_entity_set_and_model(input_data, output):
-    if input_data.entity_set_id == 'codealltag':
-        if input_data.model_id == 'google-mt5-base':
-            output = _process_for_codealltag_mT5(input_data, output)
-        else:
-            output = _process_for_codealltag_tagger(input_data, output)
+    # keep the model resident while the request is using it, label all stages of the request with the model
+    with app.state.model_service.acquire_model(input_data.entity_set_id, input_data.model_id), \
+            stage_labels(entity_set_id=input_data.entity_set_id, model_id=input_data.model_id):
+        if input_data.entity_set_id == 'codealltag':
+            if input_data.model_id == 'google-mt5-base':
+                output = _process_for_codealltag_mT5(input_data, output)
+            else:
+                output = _process_for_codealltag_tagger(input_data, output)
 
     return output
 
-@app.post("/predict", response_model=ApiResponse)
-def predict(input_data: ApiRequest):
+def _infer_entity_spans(input_data) -> List[List[List[EntitySpan]]]:
+    if input_data.entity_set_id == 'codealltag':
+        if input_data.model_id == 'google-mt5-base':
+            return _infer_for_codealltag_mT5(input_data)
+        return _infer_for_codealltag_tagger(input_data)
+    return [[list()] for _ in input_data.input_texts]
+
+def _encode_v1_response(input_data, with_pseudonym: bool, response_encoding: ResponseEncoding) -> Tuple[bytes, Dict[str, str]]:
+    # the content is built from plain dicts and lists in the layout of src/api/schemas, without validating it again
+    with stage_labels(entity_set_id=input_data.entity_set_id, model_id=input_data.model_id):
+        with app.state.model_service.acquire_model(input_data.entity_set_id, input_data.model_id):
+            entity_spans_per_input: List[List[List[EntitySpan]]] = _infer_entity_spans(input_data)
+
+        with timed_stage("serialize"):
+            to_entities = entity_spans_to_columns if response_encoding.layout == "columns" else entity_spans_to_rows
+            if with_pseudonym:
+                output: List[Any] = [
+                    [{"entities": to_entities(entity_spans, True), "pseudonymized_text": pseudonymize_text(input_text, entity_spans)}
+                     for entity_spans in entity_spans_per_sample]
+                    for input_text, entity_spans_per_sample in zip(input_data.input_texts, entity_spans_per_input)
+                ]
+            else:
+                output = [to_entities(entity_spans_per_sample[0], False) for entity_spans_per_sample in entity_spans_per_input]
+            return response_encoding.encode({"output": output})
+
+def _process_job_texts(entity_set_id: str, model_id: str, repeat: int, input_texts: List[str]) -> List[List[Dict[str, Any]]]:
+    input_data = ApiRequest(entity_set_id=entity_set_id, model_id=model_id, input_texts=input_texts, repeat=repeat)
+    output: List[List[DataItem]] = _process_for_entity_set_and_model(input_data, list())
+    return [[data_item.model_dump() for data_item in per_text_output] for per_text_output in output]
+
+def _validate_entity_set_and_model(entity_set_id: str, model_id: str):
+    if not entity_set_id or entity_set_id not in supported_entity_set_model_dict.keys():
+        msg: str = f'Invalid entity_set_id={entity_set_id}, supported values: {list(supported_entity_set_model_dict.keys())}'
+        raise Exception(msg)
+
+    if not model_id or model_id not in supported_entity_set_model_dict[entity_set_id]:
+        msg: str = f'Invalid model_id, supported values: {supported_entity_set_model_dict[entity_set_id]}'
+        raise Exception(msg)
+
+# the body is parsed in the endpoint to time it, the schema is documented explicitly
+@app.post("/predict", response_model=ApiResponse, openapi_extra={
+    "requestBody": {"required": True, "content": {"application/json": {"schema": ApiRequest.model_json_schema()}}}
+})
+async def predict(request: Request, response: Response):
+    body: bytes = await request.body()
+    parse_started_at: float = time.perf_counter()
+    try:
+        input_data: ApiRequest = ApiRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False), body=body)
+    parse_seconds: float = time.perf_counter() - parse_started_at
+
     output: List[List[DataItem]] = list()
     try:
-        if not input_data.entity_set_id or input_data.entity_set_id not in supported_entity_set_model_dict.keys():
-            msg: str = f'Invalid entity_set_id={input_data.entity_set_id}, supported values: {list(supported_entity_set_model_dict.keys())}'
-            raise Exception(msg)
-        
-        if not input_data.model_id or input_data.model_id not in supported_entity_set_model_dict[input_data.entity_set_id]:
-            msg: str = f'Invalid model_id, supported values: {supported_entity_set_model_dict[input_data.entity_set_id]}'
-            raise Exception(msg)
-        
-        output = _process_for_entity_set_and_model(input_data, output)
+        _validate_entity_set_and_model(input_data.entity_set_id, input_data.model_id)
+
+        # only supported ids become metric labels
+        record_stage("request_parse", parse_seconds, entity_set_id=input_data.entity_set_id, model_id=input_data.model_id)
+        for input_text in input_data.input_texts:
+            record_quantity("input_chars", len(input_text), entity_set_id=input_data.entity_set_id, model_id=input_data.model_id)
+        model_executor = app.state.model_service.get_model_executor(input_data.entity_set_id, input_data.model_id)
+        timed_result: TimedResult = await asyncio.wrap_future(
+            model_executor.submit(_process_for_entity_set_and_model, input_data, output)
+        )
+        output = timed_result.result
+        _set_timing_headers(response, timed_result.timing)
         return ApiResponse(output=output)
     
+    except ModelQueueFullError as e:
+        logger.warning(f"predict rejected: {str(e)}")
+        raise HTTPException(status_code=429, detail=f"request rejected, {str(e)}",
+                            headers={"Retry-After": str(e.retry_after_seconds)})
+
+    except ModelMemoryBudgetExceededError as e:
+        logger.warning(f"predict rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"request rejected, {str(e)}",
+                            headers={"Retry-After": str(e.retry_after_seconds)})
+
     except Exception as e:
         logger.error(f"predict failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"request failed, {str(e)}")
 
+_V1_RESPONSES: Dict[Union[int, str], Dict[str, Any]] = {
+    200: {"description": "The output in the rows layout of the schema, or with layout=columns one list per entity field. "
+                         "Encoded as JSON, or as MessagePack for Accept: application/msgpack, "
+                         "and compressed for Accept-Encoding: gzip.",
+          "content": {ResponseEncoding.MSGPACK: {}}},
+    406: {"description": "None of the accepted media types is available."}
+}
+
+@app.post("/v1/detect_entities", response_model=DetectEntitiesResponse, responses=_V1_RESPONSES, openapi_extra={
+    "requestBody": {"required": True, "content": {"application/json": {"schema": DetectEntitiesRequest.model_json_schema()}}}
+})
+async def detect_entities_v1(request: Request, layout: Literal["rows", "columns"] = "rows"):
+    return await _respond_v1(request, DetectEntitiesRequest, False, layout)
+
+@app.post("/v1/detect_entities_and_pseudonymize", response_model=DetectEntitiesAndPseudonymizeResponse,
+          responses=_V1_RESPONSES, openapi_extra={
+    "requestBody": {"required": True,
+                    "content": {"application/json": {"schema": DetectEntitiesAndPseudonymizeRequest.model_json_schema()}}}
+})
+async def detect_entities_and_pseudonymize_v1(request: Request, layout: Literal["rows", "columns"] = "rows"):
+    return await _respond_v1(request, DetectEntitiesAndPseudonymizeRequest, True, layout)
+
+async def _respond_v1(request: Request, request_schema: Type[BaseModel], with_pseudonym: bool, layout: str) -> Response:
+    body: bytes = await request.body()
+    parse_started_at: float = time.perf_counter()
+    try:
+        input_data = request_schema.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False), body=body)
+    parse_seconds: float = time.perf_counter() - parse_started_at
+
+    try:
+        response_encoding: ResponseEncoding = ResponseEncoding.negotiate(
+            request.headers.get("accept"), request.headers.get("accept-encoding"), layout,
+            gzip_min_bytes=app.state.response_encoding_settings.gzip_min_bytes,
+            gzip_level=app.state.response_encoding_settings.gzip_level
+        )
+    except UnsupportedResponseEncodingError as e:
+        raise HTTPException(status_code=406, detail=f"request rejected, {str(e)}")
+
+    try:
+        _validate_entity_set_and_model(input_data.entity_set_id, input_data.model_id)
+        if with_pseudonym and input_data.model_id not in pseudonymizing_entity_set_model_dict.get(input_data.entity_set_id, []):
+            msg: str = f'Invalid model_id, pseudonymizing models: {pseudonymizing_entity_set_model_dict.get(input_data.entity_set_id, [])}'
+            raise Exception(msg)
+
+        record_stage("request_parse", parse_seconds, entity_set_id=input_data.entity_set_id, model_id=input_data.model_id)
+        for input_text in input_data.input_texts:
+            record_quantity("input_chars", len(input_text), entity_set_id=input_data.entity_set_id, model_id=input_data.model_id)
+        api_request = ApiRequest(entity_set_id=input_data.entity_set_id, model_id=input_data.model_id,
+                                 input_texts=input_data.input_texts, repeat=getattr(input_data, "repeat", 1))
+        model_executor = app.state.model_service.get_model_executor(input_data.entity_set_id, input_data.model_id)
+        timed_result: TimedResult = await asyncio.wrap_future(
+            model_executor.submit(_encode_v1_response, api_request, with_pseudonym, response_encoding)
+        )
+        content, headers = timed_result.result
+        response = Response(content=content, headers=headers)
+        _set_timing_headers(response, timed_result.timing)
+        return response
+
+    except ModelQueueFullError as e:
+        logger.warning(f"{request.url.path} rejected: {str(e)}")
+        raise HTTPException(status_code=429, detail=f"request rejected, {str(e)}",
+                            headers={"Retry-After": str(e.retry_after_seconds)})
+
+    except ModelMemoryBudgetExceededError as e:
+        logger.warning(f"{request.url.path} rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"request rejected, {str(e)}",
+                            headers={"Retry-After": str(e.retry_after_seconds)})
+
+    except Exception as e:
+        logger.error(f"{request.url.path} failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"request failed, {str(e)}")
+
+class _BodyReadingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that leaves receiving to the response content, which reads the request body while streaming.
+    A client going away surfaces as a failed send instead of through a concurrent disconnect listener.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+@app.post("/predict/stream", openapi_extra={
+    "requestBody": {"required": True, "content": {"application/x-ndjson": {"schema": StreamInputLine.model_json_schema()}}}
+})
+async def predict_stream(request: Request, entity_set_id: str, model_id: str, repeat: int = 1):
+    """
+    Predict a stream of texts, one JSON object with text and an optional id per line of the request body.
+    The body is read as the texts are processed, at most streaming.max_in_flight_texts texts are in flight at a time.
+    Every DataItem is sent as soon as its text is done, as one NDJSON line or, for Accept: text/event-stream,
+    as one server-sent event with index, id, sample, output_dict and output_text.
+    index is the zero-based number of the line of the text in the body, blank lines included.
+    A text that fails yields a line with index, id and error instead, the stream goes on with the next text.
+    """
+    try:
+        _validate_entity_set_and_model(entity_set_id, model_id)
+    except Exception as e:
+        logger.error(f"predict_stream failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"request failed, {str(e)}")
+
+    results: AsyncIterator[Dict[str, Any]] = _stream_predictions(request, entity_set_id, model_id, repeat)
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return _BodyReadingStreamingResponse(_format_events(results), media_type="text/event-stream",
+                                             headers={"Cache-Control": "no-cache"})
+    return _BodyReadingStreamingResponse(_format_ndjson(results), media_type="application/x-ndjson")
+
+async def _read_lines(request: Request, max_line_bytes: int) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    # yields every non-blank line of the body with its zero-based line number, None for a line longer than max_line_bytes
+    buffer: bytearray = bytearray()
+    oversized: bool = False
+    line_number: int = 0
+    async for chunk in request.stream():
+        start: int = 0
+        while start <= len(chunk):
+            end: int = chunk.find(b"\n", start)
+            if not oversized:
+                buffer += chunk[start: len(chunk) if end < 0 else end]
+                if len(buffer) > max_line_bytes:
+                    buffer.clear()
+                    oversized = True
+            if end < 0:
+                break
+            if oversized:
+                yield line_number, None
+            elif buffer.strip():
+                yield line_number, bytes(buffer)
+            buffer.clear()
+            oversized = False
+            line_number += 1
+            start = end + 1
+    if oversized:
+        yield line_number, None
+    elif buffer.strip():
+        yield line_number, bytes(buffer)
+
+async def _stream_predictions(request: Request,
+                              entity_set_id: str,
+                              model_id: str,
+                              repeat: int) -> AsyncIterator[Dict[str, Any]]:
+    settings = app.state.streaming_settings
+    model_executor = app.state.model_service.get_model_executor(entity_set_id, model_id)
+    lines: AsyncIterator[Tuple[int, Optional[bytes]]] = _read_lines(request, settings.max_line_bytes)
+    in_flight: Dict[asyncio.Future, Tuple[int, Optional[str]]] = dict()
+    pending: Optional[Tuple[int, StreamInputLine]] = None
+    exhausted: bool = False
+
+    while True:
+        while not exhausted and len(in_flight) < max(settings.max_in_flight_texts, 1):
+            if pending is None:
+                try:
+                    index, line = await lines.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                if line is None:
+                    yield {"index": index, "id": None, "error": f"line longer than {settings.max_line_bytes} bytes"}
+                    continue
+                parse_started_at: float = time.perf_counter()
+                try:
+                    input_line: StreamInputLine = StreamInputLine.model_validate_json(line)
+                except ValidationError as e:
+                    yield {"index": index, "id": None, "error": f"invalid line, {str(e)}"}
+                    continue
+                record_stage("request_parse", time.perf_counter() - parse_started_at,
+                             entity_set_id=entity_set_id, model_id=model_id)
+                record_quantity("input_chars", len(input_line.text), entity_set_id=entity_set_id, model_id=model_id)
+                pending = (index, input_line)
+
+            input_data = ApiRequest(entity_set_id=entity_set_id, model_id=model_id,
+                                    input_texts=[pending[1].text], repeat=repeat)
+            try:
+                future = model_executor.submit(_process_for_entity_set_and_model, input_data, list())
+            except ModelQueueFullError as e:
+                # the executor is shared with other requests, wait for a text of this stream or for the retry hint
+                if not in_flight:
+                    await asyncio.sleep(e.retry_after_seconds)
+                    continue
+                break
+            in_flight[asyncio.wrap_future(future)] = (pending[0], pending[1].id)
+            pending = None
+
+        if not in_flight:
+            if exhausted:
+                return
+            continue
+
+        done, _ = await asyncio.wait(in_flight.keys(), return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            line_index, line_id = in_flight.pop(future)
+            try:
+                timed_result: TimedResult = future.result()
+            except Exception as e:
+                logger.error(f"predict_stream failed for line {line_index}: {str(e)}")
+                yield {"index": line_index, "id": line_id, "error": f"request failed, {str(e)}"}
+                continue
+            for sample, data_item in enumerate(timed_result.result[0]):
+                yield {"index": line_index, "id": line_id, "sample": sample, **data_item.model_dump()}
+
+async def _format_ndjson(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for result in results:
+        yield (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+
+async def _format_events(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for result in results:
+        yield f"data: {json.dumps(result, ensure_ascii=False)}\n\n".encode("utf-8")
+    yield b"event: end\ndata: {}\n\n"
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(input_data: ApiRequest):
+    if app.state.job_queue is None:
+        raise HTTPException(status_code=404, detail="batch jobs are disabled")
+    if len(input_data.input_texts) > app.state.jobs_settings.max_texts_per_job:
+        raise HTTPException(status_code=413,
+                            detail=f"request rejected, at most {app.state.jobs_settings.max_texts_per_job} input_texts per job")
+    try:
+        _validate_entity_set_and_model(input_data.entity_set_id, input_data.model_id)
+        job: Job = await asyncio.to_thread(app.state.job_queue.submit, input_data.entity_set_id, input_data.model_id,
+                                           input_data.repeat, input_data.input_texts)
+        return _to_job_response(job)
+
+    except Exception as e:
+        logger.error(f"submit_job failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"request failed, {str(e)}")
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    return _to_job_response(await _call_job_queue(app.state.job_queue.get_job if app.state.job_queue else None, job_id))
+
+@app.get("/jobs/{job_id}/results", response_model=JobResultsResponse)
+async def get_job_results(job_id: str, offset: int = 0, limit: int = 100):
+    offset, limit = max(offset, 0), min(max(limit, 1), 1000)
+    output: List[List[Dict[str, Any]]] = await _call_job_queue(
+        app.state.job_queue.get_results if app.state.job_queue else None, job_id, offset, limit
+    )
+    # the job is read after its results, so a completed state means no results are missing from the page
+    job: Job = await _call_job_queue(app.state.job_queue.get_job, job_id)
+    next_offset: int = offset + len(output)
+    return JobResultsResponse(job_id=job.job_id, state=job.state, offset=offset,
+                              next_offset=next_offset if next_offset < job.total_texts else None, output=output)
+
+@app.delete("/jobs/{job_id}", status_code=204)
+async def delete_job(job_id: str):
+    await _call_job_queue(app.state.job_queue.delete if app.state.job_queue else None, job_id)
+    return Response(status_code=204)
+
+async def _call_job_queue(method, *args):
+    if method is None:
+        raise HTTPException(status_code=404, detail="batch jobs are disabled")
+    try:
+        return await asyncio.to_thread(method, *args)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def _to_job_response(job: Job) -> JobResponse:
+    return JobResponse(**job._asdict(), progress=round(job.completed_texts / job.total_texts, 4) if job.total_texts else 1.0)
+
+@app.get("/ready")
+async def ready():
+    readiness: Dict[str, Any] = app.state.model_service.get_readiness()
+    return JSONResponse(content=readiness, status_code=200 if readiness["ready"] else 503)
+
+@app.get("/residency")
+async def residency():
+    return app.state.model_service.get_residency()
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(content=app.state.inference_metrics.render(), media_type=InferenceMetrics.CONTENT_TYPE)
+
+def _set_timing_headers(response: Response, timing: ExecutionTiming):
+    response.headers["X-Queue-Wait-Ms"] = f"{timing.queue_wait_ms:.1f}"
+    response.headers["X-Compute-Ms"] = f"{timing.compute_ms:.1f}"
+    response.headers["Server-Timing"] = ", ".join(
+        [f"queue;dur={timing.queue_wait_ms:.1f}", f"compute;dur={timing.compute_ms:.1f}"] +
+        [f"{stage};dur={elapsed_ms:.1f}" for stage, elapsed_ms in timing.stage_ms.items()]
+    )
+
 # Function to run streamlit with a subprocess
 def run_streamlit():
     subprocess.run(["streamlit", "run", "streamlit_app.py", "--server.port", "8501", "--server.headless", "true"])
 
-# Start streamlit subprocess in a separate thread
-threading.Thread(target=run_streamlit, daemon=True).start()
-
-# Run the FastAPI app
+# Run the FastAPI app, with the streamlit UI next to it, importing this module has no side effects
 if __name__ == "__main__":
+    threading.Thread(target=run_streamlit, daemon=True).start()
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
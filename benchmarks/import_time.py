@@ -0,0 +1,104 @@
+"""
+Startup profile of the API module based on `python -X importtime`.
+
+Imports the module in a fresh interpreter, reports its cumulative import time and the slowest imports,
+and fails if the import exceeds the time budget or pulls in a heavy framework that should only be
+imported once a model is loaded.
+
+    python benchmarks/import_time.py --module app --budget-ms 1500
+"""
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+import argparse
+import json
+import subprocess
+import sys
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES: List[str] = ["flair", "torch", "transformers", "pandas", "streamlit", "somajo"]
+
+
+class ImportRecord(NamedTuple):
+    """
+    One line of the -X importtime output, times in microseconds.
+    """
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def profile_import(module: str) -> List[ImportRecord]:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+    :param module: The module to import.
+    :return: The import records in the order reported by the interpreter.
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=ROOT_DIR, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr}")
+
+    records: List[ImportRecord] = list()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        records.append(ImportRecord(name.strip(), int(self_us), int(cumulative_us)))
+    return records
+
+
+def summarize(module: str, records: List[ImportRecord], top: int) -> Dict:
+    """
+    Summarize the import records of a module.
+    :param module: The imported module.
+    :param records: The import records.
+    :param top: The number of slowest imports to report.
+    :return: The total import time, the slowest imports and the heavy modules that were imported.
+    """
+    total_us: int = next((record.cumulative_us for record in records if record.module == module), 0)
+    imported: set = {record.module for record in records}
+    return {
+        "module": module,
+        "total_ms": total_us / 1000.0,
+        "slowest": [
+            {"module": record.module, "self_ms": record.self_us / 1000.0, "cumulative_ms": record.cumulative_us / 1000.0}
+            for record in sorted(records, key=lambda record: record.self_us, reverse=True)[:top]
+        ],
+        "heavy_modules": [heavy for heavy in HEAVY_MODULES if heavy in imported]
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="The module to import, defaults to app.")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if the import takes longer.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of fresh imports, the fastest one is reported.")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to report.")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+    args = parser.parse_args()
+
+    summaries: List[Dict] = [summarize(args.module, profile_import(args.module), args.top) for _ in range(max(args.repeat, 1))]
+    summary: Dict = min(summaries, key=lambda summary: summary["total_ms"])
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"import {summary['module']}: {summary['total_ms']:.1f} ms (fastest of {len(summaries)})")
+        print(f"{'self [ms]':>10} {'cumulative [ms]':>16}  module")
+        for record in summary["slowest"]:
+            print(f"{record['self_ms']:>10.1f} {record['cumulative_ms']:>16.1f}  {record['module']}")
+
+    failed: bool = False
+    if summary["heavy_modules"]:
+        print(f"heavy modules imported at import time: {', '.join(summary['heavy_modules'])}", file=sys.stderr)
+        failed = True
+    if args.budget_ms is not None and summary["total_ms"] > args.budget_ms:
+        print(f"import time {summary['total_ms']:.1f} ms exceeds the budget of {args.budget_ms:.1f} ms", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+"""
+Microbenchmark of the inference makers, called directly without HTTP, result caches or batching in front of them.
+The text cache of SoMaJo and the sentence cache are disabled as well, unless --with-caches is given,
+since the timed calls repeat the same texts.
+
+Every model is loaded the way its config entry describes (model_impl, loading strategy, precision, tokenization) in a
+fresh process and run on the sample texts of its entity set and on synthetic emails of controlled length.
+The sweep covers input length x batch size x repeat count (repeats only apply to generation models). For every
+configuration the report holds:
+
+    latency      p50/p95/p99/mean milliseconds of one call on a batch, over --iterations timed calls after --warmup
+    throughput   input tokens per second, tokens estimated at four characters each as the micro-batcher does
+    memory       the RSS after loading the model and the peak RSS of the process so far
+    stages       mean milliseconds per call of the timed stages: somajo_tokenize, subword_tokenize, model_forward,
+                 decode, align and serialize, the remainder is reported as other
+
+Synthetic emails are generated from a fixed seed, so runs with the same arguments send the same inputs.
+The JSON report can be saved as a baseline and compared against later runs of the same sweep:
+
+    python benchmarks/model_benchmark.py --model bilstm-crf-plus --output baseline.json
+    python benchmarks/model_benchmark.py --model bilstm-crf-plus --baseline baseline.json --max-regression-pct 10
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.infrastructure.frameworks.compiled_sequence_tagger_inference_maker import CompiledSequenceTaggerInferenceMaker
+from src.infrastructure.frameworks.model_inference_maker import ModelInferenceMaker
+from src.infrastructure.frameworks.model_precision import ModelPrecision
+from src.infrastructure.frameworks.mt5_for_conditional_generation_inference_maker import MT5ForConditionalGenerationInferenceMaker
+from src.infrastructure.frameworks.mt5_for_conditional_generation_loader import MT5ForConditionalGenerationLoader
+from src.infrastructure.frameworks.mt5_for_conditional_generation_onnx_inference_maker import MT5ForConditionalGenerationONNXInferenceMaker
+from src.infrastructure.frameworks.mt5_for_conditional_generation_onnx_loader import MT5ForConditionalGenerationONNXLoader
+from src.infrastructure.frameworks.mt5_output_parser import MT5OutputParser
+from src.infrastructure.frameworks.sequence_tagger_inference_maker import SequenceTaggerInferenceMaker
+from src.infrastructure.frameworks.sequence_tagger_loader import SequenceTaggerLoader
+from src.infrastructure.frameworks.sequence_tagger_onnx_loader import SequenceTaggerONNXLoader
+from src.infrastructure.frameworks.sequence_tagger_torchscript_loader import SequenceTaggerTorchScriptLoader
+from src.infrastructure.services.entity_span_inference import infer_entity_spans, to_output_items
+from src.infrastructure.services.micro_batcher import MicroBatcher
+from src.utils import AppInfo, collect_stage_timings, timed_stage
+
+STAGES: List[str] = ["somajo_tokenize", "subword_tokenize", "model_forward", "decode", "align", "serialize"]
+
+FIRST_NAMES: List[str] = ["Anna", "Jonas", "Lena", "Felix", "Miriam", "Tobias", "Sarah", "Lukas", "Katrin", "Moritz"]
+LAST_NAMES: List[str] = ["Becker", "Hoffmann", "Wagner", "Schulz", "Krüger", "Neumann", "Schwarz", "Zimmermann"]
+CITIES: List[str] = ["Hamburg", "Köln", "Dresden", "Freiburg", "Bremen", "Hannover", "Nürnberg", "Potsdam"]
+STREETS: List[str] = ["Gartenstraße", "Bahnhofstraße", "Am Markt", "Rosenweg", "Kirchgasse", "Bergstraße"]
+SENTENCES: List[str] = [
+    "ich hoffe, es geht dir gut und du hattest ein schönes Wochenende in {city}.",
+    "Können wir uns am {day}. {month} um {hour} Uhr bei mir in der {street} {number} treffen?",
+    "Ruf mich einfach unter 0{phone} an, falls etwas dazwischenkommt.",
+    "{first} {last} hat gefragt, ob du die Unterlagen an {email} schicken kannst.",
+    "Die Rechnung über {amount} Euro habe ich gestern an {first} weitergeleitet.",
+    "Nächste Woche bin ich mit {first} in {city}, danach melde ich mich wieder.",
+    "Meine neue Adresse ist {street} {number}, {zip} {city}.",
+    "Vielen Dank noch einmal für deine Hilfe beim Umzug, das war wirklich großartig.",
+    "Das Treffen mit Herrn {last} wurde auf den {day}. {month} verschoben."
+]
+MONTHS: List[str] = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September", "Oktober"]
+
+
+def make_synthetic_email(word_count: int, random_generator: random.Random) -> str:
+    """
+    Generate a German email with names, addresses, dates, phone numbers and email addresses, about word_count words long.
+    :param word_count: The targeted number of words, the email ends with the first sentence reaching it.
+    :param random_generator: The seeded random generator.
+    :return: The email text.
+    """
+    sender_first, sender_last = random_generator.choice(FIRST_NAMES), random_generator.choice(LAST_NAMES)
+    recipient: str = random_generator.choice(FIRST_NAMES)
+    parts: List[str] = [f"Hallo {recipient},"]
+    words: int = 1
+    while words < word_count:
+        first, last = random_generator.choice(FIRST_NAMES), random_generator.choice(LAST_NAMES)
+        sentence: str = random_generator.choice(SENTENCES).format(
+            city=random_generator.choice(CITIES), street=random_generator.choice(STREETS),
+            number=random_generator.randint(1, 120), zip=random_generator.randint(10000, 99999),
+            day=random_generator.randint(1, 28), month=random_generator.choice(MONTHS), hour=random_generator.randint(8, 20),
+            phone=random_generator.randint(100000000, 999999999), first=first, last=last,
+            email=f"{first.lower()}.{last.lower()}@example.de", amount=random_generator.randint(10, 2000)
+        )
+        parts.append(sentence)
+        words += len(sentence.split())
+    parts.append(f"Viele Grüße\n{sender_first} {sender_last}")
+    return "\n\n".join([parts[0], " ".join(parts[1:-1]), parts[-1]])
+
+
+def build_inference_maker(entity_set_cfg, model_cfg, with_caches: bool) -> Tuple[Any, ModelInferenceMaker]:
+    """
+    Build the loader and inference maker of a model the way the model service does, without result caches.
+    """
+    model_path = ROOT_DIR.joinpath(*entity_set_cfg.supported_models_root_dir, *model_cfg.model_directory_name, model_cfg.model_version)
+    model_precision = ModelPrecision(mode=model_cfg.model_precision.mode, source_path=model_path,
+                                     cache_dir=model_cfg.model_precision.cache_dir,
+                                     loading_strategy=model_cfg.model_loading_strategy)
+    tokenization: Dict[str, int] = {"somajo_parallel": model_cfg.model_tokenization.somajo_parallel,
+                                    "somajo_cache_size": model_cfg.model_tokenization.somajo_cache_size if with_caches else 0}
+    sentence_cache_size: int = model_cfg.model_sentence_cache.max_entries if model_cfg.model_sentence_cache.enabled and with_caches else 0
+    strategy: str = model_cfg.model_loading_strategy
+    if model_cfg.model_impl == "SequenceTagger":
+        model_loader = SequenceTaggerLoader(model_name_or_path=model_path, loading_strategy=strategy, model_precision=model_precision)
+        return model_loader, SequenceTaggerInferenceMaker(model_loader=model_loader, sentence_cache_size=sentence_cache_size, **tokenization)
+    if model_cfg.model_impl in ["SequenceTaggerTorchScript", "SequenceTaggerONNX"]:
+        loader_class = SequenceTaggerTorchScriptLoader if model_cfg.model_impl == "SequenceTaggerTorchScript" else SequenceTaggerONNXLoader
+        model_loader = loader_class(model_name_or_path=model_path / loader_class.DIRECTORY_NAME, loading_strategy=strategy,
+                                    model_precision=model_precision)
+        return model_loader, CompiledSequenceTaggerInferenceMaker(model_loader=model_loader, sentence_cache_size=sentence_cache_size,
+                                                                  **tokenization)
+    if model_cfg.model_impl == "MT5ForConditionalGeneration":
+        model_loader = MT5ForConditionalGenerationLoader(model_name_or_path=model_path, loading_strategy=strategy,
+                                                         model_precision=model_precision)
+        return model_loader, MT5ForConditionalGenerationInferenceMaker(model_loader=model_loader, **tokenization)
+    if model_cfg.model_impl == "MT5ForConditionalGenerationONNX":
+        model_loader = MT5ForConditionalGenerationONNXLoader(model_name_or_path=model_path / MT5ForConditionalGenerationONNXLoader.DIRECTORY_NAME,
+                                                             loading_strategy=strategy, model_precision=model_precision)
+        return model_loader, MT5ForConditionalGenerationONNXInferenceMaker(model_loader=model_loader, **tokenization)
+    raise ValueError(f"Unsupported model impl type: {model_cfg.model_impl}")
+
+
+def run_call(model_inference_maker: ModelInferenceMaker,
+             mt5_output_parser: MT5OutputParser,
+             texts: List[str],
+             repeat_count: int) -> None:
+    """
+    Run one call the way the /predict endpoint does, including building and serializing its output.
+    """
+    is_mt5: bool = isinstance(model_inference_maker, MT5ForConditionalGenerationInferenceMaker)
+    entity_spans_per_text = infer_entity_spans(lambda method, **kwargs: getattr(model_inference_maker, method)(**kwargs),
+                                               texts, repeat_count, mt5_output_parser=mt5_output_parser if is_mt5 else None)
+    outputs: List[List[Dict[str, Any]]] = to_output_items(texts, entity_spans_per_text, with_pseudonym=is_mt5)
+    with timed_stage("serialize"):
+        json.dumps({"output": outputs})
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Get the q-th percentile of values by the nearest-rank method.
+    """
+    sorted_values: List[float] = sorted(values)
+    return sorted_values[min(max(math.ceil(q / 100.0 * len(sorted_values)) - 1, 0), len(sorted_values) - 1)]
+
+
+def get_rss_mib() -> float:
+    """
+    Get the current resident set size of this process.
+    """
+    with open("/proc/self/statm", encoding="utf-8") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def get_peak_rss_mib() -> float:
+    """
+    Get the peak resident set size of this process so far.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark_model(entity_set_id: str, model_id: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Load a model and run the sweep on it, in a fresh process so that peak memory is measured per model.
+    :param entity_set_id: The entity set id.
+    :param model_id: The model id.
+    :param settings: The sweep settings parsed from the command line.
+    :return: The report of the model.
+    """
+    app_info = AppInfo.load()
+    entity_set_cfg = app_info.get_entity_set(entity_set_id)
+    model_cfg = next(model for model in entity_set_cfg.supported_models if model.model_id == model_id)
+    model_loader, model_inference_maker = build_inference_maker(entity_set_cfg, model_cfg, settings["with_caches"])
+    rss_before_load_mib: float = get_rss_mib()
+    if model_loader.load() is None:
+        raise RuntimeError(f"Failed to load {entity_set_id}/{model_id}")
+    report: Dict[str, Any] = {
+        "entity_set_id": entity_set_id,
+        "model_id": model_id,
+        "model_impl": model_cfg.model_impl,
+        "loading_strategy": model_cfg.model_loading_strategy,
+        "precision": model_cfg.model_precision.mode,
+        "load_seconds": round(model_loader.load_seconds, 3),
+        "rss_model_mib": round(get_rss_mib() - rss_before_load_mib, 1),
+        "configs": list()
+    }
+    mt5_output_parser = MT5OutputParser(app_info.get_fine_grained_labels(entity_set_id))
+    is_generation_model: bool = isinstance(model_inference_maker, MT5ForConditionalGenerationInferenceMaker)
+    repeat_counts: List[int] = settings["repeats"] if is_generation_model else [1]
+
+    random_generator = random.Random(settings["seed"])
+    inputs: List[Tuple[str, List[str]]] = [("sample_texts", list(entity_set_cfg.sample_texts))] + [
+        (f"synthetic_{word_count}_words", [make_synthetic_email(word_count, random_generator) for _ in range(max(settings["batch_sizes"]))])
+        for word_count in settings["lengths"]
+    ]
+    for input_name, input_texts in inputs:
+        for batch_size in settings["batch_sizes"]:
+            texts: List[str] = [input_texts[index % len(input_texts)] for index in range(batch_size)]
+            input_tokens: int = sum(MicroBatcher.estimate_tokens(text) for text in texts)
+            for repeat_count in repeat_counts:
+                if "torch" in sys.modules:
+                    import torch
+                    torch.manual_seed(settings["seed"])
+                for _ in range(settings["warmup"]):
+                    run_call(model_inference_maker, mt5_output_parser, texts, repeat_count)
+                latencies_ms: List[float] = list()
+                stage_ms: Dict[str, float] = dict()
+                for _ in range(settings["iterations"]):
+                    started_at: float = time.perf_counter()
+                    with collect_stage_timings() as stage_timings:
+                        run_call(model_inference_maker, mt5_output_parser, texts, repeat_count)
+                    latencies_ms.append((time.perf_counter() - started_at) * 1000)
+                    for stage, elapsed in stage_timings.items():
+                        stage_ms[stage] = stage_ms.get(stage, 0.0) + elapsed * 1000
+                stages: Dict[str, float] = {stage: round(stage_ms.get(stage, 0.0) / len(latencies_ms), 2) for stage in STAGES}
+                stages["other"] = round(max(sum(latencies_ms) / len(latencies_ms) - sum(stages.values()), 0.0), 2)
+                report["configs"].append({
+                    "input": input_name,
+                    "batch_size": batch_size,
+                    "repeat_count": repeat_count,
+                    "input_tokens": input_tokens,
+                    "p50_ms": round(percentile(latencies_ms, 50), 2),
+                    "p95_ms": round(percentile(latencies_ms, 95), 2),
+                    "p99_ms": round(percentile(latencies_ms, 99), 2),
+                    "mean_ms": round(sum(latencies_ms) / len(latencies_ms), 2),
+                    "tokens_per_second": round(input_tokens * len(latencies_ms) / (sum(latencies_ms) / 1000), 1),
+                    "peak_rss_mib": round(get_peak_rss_mib(), 1),
+                    "stage_ms": stages
+                })
+                print(f"{entity_set_id}/{model_id} {input_name} batch {batch_size} repeat {repeat_count}: "
+                      f"p50 {report['configs'][-1]['p50_ms']:.1f} ms, {report['configs'][-1]['tokens_per_second']:.0f} tokens/s",
+                      flush=True)
+    return report
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any], max_regression_pct: float) -> List[str]:
+    """
+    Compare the p50 latency and the throughput of every configuration with the same configuration in the baseline.
+    :param report: The report of this run, annotated in place with the deltas.
+    :param baseline: The report of the baseline run.
+    :param max_regression_pct: The largest slowdown in percent that is not reported as a regression.
+    :return: A description of every regression.
+    """
+    baseline_configs: Dict[Tuple, Dict[str, Any]] = {
+        (model["entity_set_id"], model["model_id"], config["input"], config["batch_size"], config["repeat_count"]): config
+        for model in baseline["models"] for config in model["configs"]
+    }
+    regressions: List[str] = list()
+    for model in report["models"]:
+        for config in model["configs"]:
+            key: Tuple = (model["entity_set_id"], model["model_id"], config["input"], config["batch_size"], config["repeat_count"])
+            baseline_config: Optional[Dict[str, Any]] = baseline_configs.get(key)
+            if baseline_config is None:
+                continue
+            config["p50_delta_pct"] = round(100.0 * (config["p50_ms"] / baseline_config["p50_ms"] - 1.0), 1)
+            config["tokens_per_second_delta_pct"] = round(
+                100.0 * (config["tokens_per_second"] / baseline_config["tokens_per_second"] - 1.0), 1
+            )
+            if config["p50_delta_pct"] > max_regression_pct:
+                regressions.append(f"{'/'.join(str(part) for part in key)}: p50 {baseline_config['p50_ms']:.1f} -> "
+                                   f"{config['p50_ms']:.1f} ms ({config['p50_delta_pct']:+.1f}%)")
+    return regressions
+
+
+def get_environment() -> Dict[str, Any]:
+    """
+    Describe the machine and the code the benchmark ran on.
+    """
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "omp_num_threads": os.environ.get("OMP_NUM_THREADS"),
+        "git_commit": commit.stdout.strip() if commit.returncode == 0 else None,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entity-set", default="codealltag", help="The entity set id.")
+    parser.add_argument("--model", action="append", default=None, help="The model id, all models of the entity set by default.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32], help="The number of texts per call.")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[50, 200, 800], help="The word counts of the synthetic emails.")
+    parser.add_argument("--repeats", type=int, nargs="+", default=[1, 3], help="The repeat counts of generation models.")
+    parser.add_argument("--iterations", type=int, default=20, help="The timed calls per configuration.")
+    parser.add_argument("--warmup", type=int, default=2, help="The untimed calls per configuration.")
+    parser.add_argument("--seed", type=int, default=13, help="The seed of the synthetic emails and of sampling.")
+    parser.add_argument("--with-caches", action="store_true", help="Keep the configured SoMaJo and sentence caches.")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file.")
+    parser.add_argument("--baseline", default=None, help="A report to compare with.")
+    parser.add_argument("--max-regression-pct", type=float, default=10.0, help="The p50 slowdown tolerated against the baseline.")
+    args = parser.parse_args()
+
+    app_info = AppInfo.load()
+    entity_set_cfg = app_info.get_entity_set(args.entity_set)
+    if entity_set_cfg is None:
+        raise SystemExit(f"Unknown entity set: {args.entity_set}")
+    model_ids: List[str] = args.model or [model.model_id for model in entity_set_cfg.supported_models]
+    unknown_model_ids: List[str] = [model_id for model_id in model_ids
+                                    if model_id not in {model.model_id for model in entity_set_cfg.supported_models}]
+    if unknown_model_ids:
+        raise SystemExit(f"Unknown models {unknown_model_ids} in entity set {args.entity_set}")
+
+    settings: Dict[str, Any] = {"batch_sizes": args.batch_sizes, "lengths": args.lengths, "repeats": args.repeats,
+                                "iterations": max(args.iterations, 1), "warmup": args.warmup, "seed": args.seed,
+                                "with_caches": args.with_caches}
+    report: Dict[str, Any] = {"environment": get_environment(), "settings": settings, "models": list()}
+    for model_id in model_ids:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            report["models"].append(executor.submit(benchmark_model, args.entity_set, model_id, settings).result())
+
+    regressions: List[str] = list()
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(report, json.load(f), args.max_regression_pct)
+        report["regressions"] = regressions
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
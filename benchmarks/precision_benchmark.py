@@ -0,0 +1,212 @@
+"""
+Accuracy and latency of the inference precision modes of a model.
+
+Every mode (fp32, int8, bf16) is loaded the way the API loads it and run on an evaluation set, one document at a time.
+For each mode the span-level F1 and the per-document latency are reported, together with their difference to fp32.
+For int8 mT5 models the benchmark also checks that the cached conversion predicts the same spans as a fresh conversion,
+Flair taggers are converted on every load and have no cached conversion.
+
+The evaluation set is a JSONL file with one document per line:
+    {"text": "...", "entities": [{"label": "CITY", "start": 10, "end": 16}, ...]}
+Without one, the sample texts of the entity set are used and the fp32 predictions serve as reference,
+i.e. the reported F1 is the agreement with fp32.
+
+    python benchmarks/precision_benchmark.py --entity-set codealltag --model bilstm-crf-plus --dataset dev.jsonl
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.domain.entity_span import EntitySpan
+from src.infrastructure.frameworks.cached_model_loader import CachedModelLoader
+from src.infrastructure.frameworks.model_inference_maker import ModelInferenceMaker
+from src.infrastructure.frameworks.model_precision import ModelPrecision
+from src.infrastructure.frameworks.mt5_for_conditional_generation_inference_maker import MT5ForConditionalGenerationInferenceMaker
+from src.infrastructure.frameworks.mt5_for_conditional_generation_loader import MT5ForConditionalGenerationLoader
+from src.infrastructure.frameworks.mt5_output_parser import MT5OutputParser
+from src.infrastructure.frameworks.sequence_tagger_inference_maker import SequenceTaggerInferenceMaker
+from src.infrastructure.frameworks.sequence_tagger_loader import SequenceTaggerLoader
+from src.utils import AppInfo
+
+Span = Tuple[str, int, int]
+
+
+def load_dataset(dataset_path: Optional[str], sample_texts: List[str]) -> Tuple[List[str], Optional[List[Set[Span]]]]:
+    """
+    Load the evaluation texts and their gold spans.
+    :param dataset_path: The path of the JSONL evaluation set, None to use the sample texts.
+    :param sample_texts: The sample texts of the entity set.
+    :return: The texts and, if there is an evaluation set, the gold spans of every text.
+    """
+    if not dataset_path:
+        return list(sample_texts), None
+    texts: List[str] = list()
+    gold_spans: List[Set[Span]] = list()
+    with open(dataset_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            document: Dict[str, Any] = json.loads(line)
+            texts.append(document["text"])
+            gold_spans.append({(entity["label"], entity["start"], entity["end"]) for entity in document["entities"]})
+    return texts, gold_spans
+
+
+def build_inference_maker(entity_set_cfg, model_cfg, mode: str,
+                          use_cache: bool = True) -> Tuple[CachedModelLoader, ModelInferenceMaker]:
+    """
+    Build the loader and inference maker of a model in the given precision mode, without result caches.
+    Without use_cache the model is converted on every load instead of using the cached conversion.
+    """
+    model_path = ROOT_DIR.joinpath(*entity_set_cfg.supported_models_root_dir, *model_cfg.model_directory_name, model_cfg.model_version)
+    model_precision = ModelPrecision(mode=mode, source_path=model_path if use_cache else None,
+                                     cache_dir=model_cfg.model_precision.cache_dir)
+    if model_cfg.model_impl == "SequenceTagger":
+        model_loader = SequenceTaggerLoader(model_name_or_path=model_path, model_precision=model_precision)
+        return model_loader, SequenceTaggerInferenceMaker(model_loader=model_loader)
+    if model_cfg.model_impl == "MT5ForConditionalGeneration":
+        model_loader = MT5ForConditionalGenerationLoader(model_name_or_path=model_path, model_precision=model_precision)
+        return model_loader, MT5ForConditionalGenerationInferenceMaker(model_loader=model_loader)
+    raise ValueError(f"Unsupported model impl type: {model_cfg.model_impl}")
+
+
+def predict_spans(model_inference_maker: ModelInferenceMaker, mt5_output_parser: MT5OutputParser, text: str) -> Set[Span]:
+    """
+    Predict the entity spans of a text the way the API does, decoding greedily for generation models.
+    """
+    if isinstance(model_inference_maker, MT5ForConditionalGenerationInferenceMaker):
+        chunked_generation = model_inference_maker.infer_chunked([text], max_length=512, padding="longest", do_sample=False)[0]
+        entity_spans: List[EntitySpan] = mt5_output_parser.parse_chunks(text, chunked_generation.chunks, chunked_generation.samples[0])
+    else:
+        entity_spans = model_inference_maker.infer_entity_spans([text])[0]
+    return {(entity_span.label, entity_span.start, entity_span.end) for entity_span in entity_spans}
+
+
+def score(predicted_spans: List[Set[Span]], reference_spans: List[Set[Span]]) -> Dict[str, float]:
+    """
+    Compute span-level micro precision, recall and F1 with exact label and offset matches.
+    """
+    true_positives: int = sum(len(predicted & reference) for predicted, reference in zip(predicted_spans, reference_spans))
+    predicted_count: int = sum(len(predicted) for predicted in predicted_spans)
+    reference_count: int = sum(len(reference) for reference in reference_spans)
+    precision: float = true_positives / predicted_count if predicted_count else 0.0
+    recall: float = true_positives / reference_count if reference_count else 0.0
+    f1: float = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def run_mode(entity_set_cfg, model_cfg, mode: str, texts: List[str], mt5_output_parser: MT5OutputParser) -> Dict[str, Any]:
+    """
+    Load a model in a precision mode, warm it up and predict every text, timing each document.
+    """
+    model_loader, model_inference_maker = build_inference_maker(entity_set_cfg, model_cfg, mode)
+    if model_loader.load() is None:
+        raise RuntimeError(f"Failed to load {model_cfg.model_id} in {mode}")
+    predict_spans(model_inference_maker, mt5_output_parser, texts[0])
+
+    predicted_spans: List[Set[Span]] = list()
+    latencies_ms: List[float] = list()
+    for text in texts:
+        started_at: float = time.perf_counter()
+        predicted_spans.append(predict_spans(model_inference_maker, mt5_output_parser, text))
+        latencies_ms.append((time.perf_counter() - started_at) * 1000.0)
+
+    result: Dict[str, Any] = {
+        "mode": mode,
+        "load_seconds": model_loader.load_seconds,
+        "resident_bytes": model_loader.resident_bytes,
+        "latency_mean_ms": statistics.mean(latencies_ms),
+        "latency_p50_ms": statistics.median(latencies_ms),
+        "latency_p95_ms": sorted(latencies_ms)[min(int(0.95 * len(latencies_ms)), len(latencies_ms) - 1)],
+        "predicted_spans": predicted_spans
+    }
+    model_loader.unload()
+    return result
+
+
+def check_int8_cache(entity_set_cfg, model_cfg, texts: List[str], mt5_output_parser: MT5OutputParser) -> Dict[str, Any]:
+    """
+    Load the cached int8 conversion of a model, creating it first if there is none, and a fresh conversion,
+    and compare their predictions on every text.
+    """
+    model_loader, model_inference_maker = build_inference_maker(entity_set_cfg, model_cfg, ModelPrecision.INT8)
+    if model_loader.load() is not None and not model_loader.model_precision.cache_hit:
+        model_loader.unload()
+        model_loader.load()
+    if not model_loader.model_precision.cache_hit:
+        raise RuntimeError(f"Failed to load the cached int8 conversion of {model_cfg.model_id}")
+    cached_spans: List[Set[Span]] = [predict_spans(model_inference_maker, mt5_output_parser, text) for text in texts]
+    model_loader.unload()
+
+    model_loader, model_inference_maker = build_inference_maker(entity_set_cfg, model_cfg, ModelPrecision.INT8, use_cache=False)
+    if model_loader.load() is None:
+        raise RuntimeError(f"Failed to load {model_cfg.model_id} in {ModelPrecision.INT8}")
+    converted_spans: List[Set[Span]] = [predict_spans(model_inference_maker, mt5_output_parser, text) for text in texts]
+    model_loader.unload()
+
+    mismatched_documents: int = sum(cached != converted for cached, converted in zip(cached_spans, converted_spans))
+    return {"cache_matches_conversion": mismatched_documents == 0, "mismatched_documents": mismatched_documents}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entity-set", default="codealltag", help="The entity set id.")
+    parser.add_argument("--model", required=True, help="The model id.")
+    parser.add_argument("--modes", nargs="+", default=ModelPrecision.MODES, choices=ModelPrecision.MODES,
+                        help="The precision modes to compare, fp32 is always included as baseline.")
+    parser.add_argument("--dataset", default=None, help="JSONL evaluation set, defaults to the sample texts.")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path.")
+    args = parser.parse_args()
+
+    app_info = AppInfo.load()
+    entity_set_cfg = app_info.get_entity_set(args.entity_set)
+    if entity_set_cfg is None:
+        raise SystemExit(f"Unknown entity set: {args.entity_set}")
+    model_cfg = next((model for model in entity_set_cfg.supported_models if model.model_id == args.model), None)
+    if model_cfg is None:
+        raise SystemExit(f"Unknown model {args.model} in entity set {args.entity_set}")
+
+    texts, gold_spans = load_dataset(args.dataset, entity_set_cfg.sample_texts)
+    mt5_output_parser = MT5OutputParser(app_info.get_fine_grained_labels(args.entity_set))
+    modes: List[str] = [ModelPrecision.FP32] + [mode for mode in args.modes if mode != ModelPrecision.FP32]
+
+    results: List[Dict[str, Any]] = [run_mode(entity_set_cfg, model_cfg, mode, texts, mt5_output_parser) for mode in modes]
+    reference_spans: List[Set[Span]] = gold_spans if gold_spans is not None else results[0]["predicted_spans"]
+    for result in results:
+        result.update(score(result.pop("predicted_spans"), reference_spans))
+    baseline: Dict[str, Any] = results[0]
+    for result in results:
+        result["f1_delta"] = result["f1"] - baseline["f1"]
+        result["latency_p50_delta_pct"] = 100.0 * (result["latency_p50_ms"] / baseline["latency_p50_ms"] - 1.0)
+
+    reference: str = "gold" if gold_spans is not None else "fp32 predictions"
+    print(f"{args.entity_set}/{args.model}, {len(texts)} documents, F1 against {reference}")
+    print(f"{'mode':<6} {'F1':>7} {'dF1':>8} {'p50 ms':>9} {'p95 ms':>9} {'d p50':>8} {'resident MB':>12} {'load s':>8}")
+    for result in results:
+        print(f"{result['mode']:<6} {result['f1']:>7.4f} {result['f1_delta']:>+8.4f} "
+              f"{result['latency_p50_ms']:>9.1f} {result['latency_p95_ms']:>9.1f} {result['latency_p50_delta_pct']:>+7.1f}% "
+              f"{(result['resident_bytes'] or 0) / 2 ** 20:>12.1f} {result['load_seconds']:>8.2f}")
+
+    int8_cache: Optional[Dict[str, Any]] = None
+    if ModelPrecision.INT8 in modes and model_cfg.model_impl == "MT5ForConditionalGeneration":
+        int8_cache = check_int8_cache(entity_set_cfg, model_cfg, texts, mt5_output_parser)
+        print(f"int8 cache hit against fresh conversion: {len(texts) - int8_cache['mismatched_documents']}/{len(texts)} "
+              f"documents with the same predictions")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"entity_set_id": args.entity_set, "model_id": args.model, "reference": reference,
+                       "documents": len(texts), "results": results, "int8_cache": int8_cache}, f, indent=2)
+    return 0 if int8_cache is None or int8_cache["cache_matches_conversion"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
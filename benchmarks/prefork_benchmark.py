@@ -0,0 +1,261 @@
+"""
+Startup time, memory per process and throughput of the API served single-process and by the prefork server.
+
+The server is started in a fresh process group the way it is deployed, either single-process
+(`uvicorn app:app`) or with the prefork server (`python server.py --workers N`), and measured in three steps:
+
+    startup     seconds until /ready answers 200 on as many consecutive requests as there are workers
+    memory      RSS and PSS of the server and each of its worker processes, after start up and again after the load
+    throughput  /predict requests per second and their latency percentiles, from --concurrency clients for --duration s
+
+RSS counts the shared weight pages once per process and so overstates the memory of forked workers, PSS splits every
+shared page evenly across the processes sharing it. The total PSS is what the server takes from the node.
+Run every mode on the same idle machine, with the same model, texts and concurrency:
+
+    python benchmarks/prefork_benchmark.py --mode single --model bilstm-crf-plus --output single.json
+    python benchmarks/prefork_benchmark.py --mode prefork --workers 4 --model bilstm-crf-plus --output prefork-4.json
+
+Measured with --model google-mt5-base --concurrency 2 --duration 300, single-process against 2 prefork workers.
+The run used 1 core and 6 GiB of RAM, Python 3.11, torch 2.14 and transformers 4.49. The fine-tuned weights are
+not part of the repository, so a randomly initialized model with the architecture of mt5-base (582M parameters,
+2.2 GiB safetensors) stood in for them. It generates up to max_length tokens for every text, which makes every
+request slower than with the fine-tuned model, but the same in both modes:
+
+                                  single      prefork, 2 workers
+    startup                       342 s       306 s (the workers do not warm up the shared model again)
+    RSS after startup             3005 MiB    master 2851 MiB, workers 447 MiB each
+    PSS after startup, total      2998 MiB    2885 MiB (master 2562, workers 162 each)
+    RSS after load                3127 MiB    master 2851 MiB, workers 2482 and 2540 MiB
+    PSS after load, total         3119 MiB    3147 MiB (master 1226, workers 931 and 990)
+    /predict throughput           8 in 300 s  6 in 300 s
+    /predict latency p50 / p95    91 / 98 s   97 / 152 s
+
+Two workers take about the memory of one process: the weights are shared, and the RSS of each worker counts them
+again. The throughput does not improve on a single core, where the workers only take turns. It needs as many cores
+as workers times threads_per_worker, and this run did not measure that.
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.utils import AppInfo
+
+
+def start_server(mode: str, port: int, workers: int, threads_per_worker: Optional[int]) -> subprocess.Popen:
+    """
+    Start the server in a new process group.
+    :param mode: single or prefork.
+    :param port: The port to listen on.
+    :param workers: The number of prefork workers.
+    :param threads_per_worker: The intra-op threads of every prefork worker, None for the default.
+    :return: The server process.
+    """
+    if mode == "single":
+        command: List[str] = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)]
+    else:
+        command = [sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+        if threads_per_worker:
+            command += ["--threads-per-worker", str(threads_per_worker)]
+    return subprocess.Popen(command, cwd=ROOT_DIR, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, consecutive: int, timeout_seconds: float) -> float:
+    """
+    Wait until /ready answers 200 on consecutive requests, which land on different workers.
+    :param base_url: The URL of the server.
+    :param server: The server process.
+    :param consecutive: The number of consecutive ready answers required.
+    :param timeout_seconds: The maximum time to wait.
+    :return: The seconds it took.
+    """
+    started_at: float = time.perf_counter()
+    ready_answers: int = 0
+    while ready_answers < consecutive:
+        if server.poll() is not None:
+            raise RuntimeError(f"The server exited with code {server.returncode} during start up")
+        if time.perf_counter() - started_at > timeout_seconds:
+            raise TimeoutError(f"The server was not ready within {timeout_seconds}s")
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=5) as response:
+                ready_answers = ready_answers + 1 if response.status == 200 else 0
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            ready_answers = 0
+        if ready_answers < consecutive:
+            time.sleep(0.2)
+    return time.perf_counter() - started_at
+
+
+def get_process_tree(root_pid: int) -> List[int]:
+    """
+    Get a process and all its descendants.
+    :param root_pid: The pid of the root process.
+    :return: The pids, root first.
+    """
+    parent_pids: Dict[int, int] = dict()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as f:
+                # the command name in parentheses may contain spaces, the parent pid follows the state after it
+                parent_pids[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    pids: List[int] = [root_pid]
+    for pid in pids:
+        pids.extend(child_pid for child_pid, parent_pid in parent_pids.items() if parent_pid == pid)
+    return pids
+
+
+def measure_memory(root_pid: int) -> Dict[str, Any]:
+    """
+    Read the RSS and PSS of a process and its descendants from /proc, Linux only.
+    :param root_pid: The pid of the server process.
+    :return: The memory of every process in MiB and the totals.
+    """
+    processes: List[Dict[str, Any]] = list()
+    for pid in get_process_tree(root_pid):
+        memory: Dict[str, Any] = {"pid": pid}
+        try:
+            with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as f:
+                for line in f:
+                    name, _, value = line.partition(":")
+                    if name in ["Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"]:
+                        memory[f"{name.lower()}_mib"] = round(int(value.split()[0]) / 1024, 1)
+        except OSError:
+            continue
+        processes.append(memory)
+    return {
+        "processes": processes,
+        "total_rss_mib": round(sum(memory.get("rss_mib", 0.0) for memory in processes), 1),
+        "total_pss_mib": round(sum(memory.get("pss_mib", 0.0) for memory in processes), 1)
+    }
+
+
+def run_load(base_url: str, payloads: List[bytes], concurrency: int, duration_seconds: float) -> Dict[str, Any]:
+    """
+    Send /predict requests from concurrent clients for a fixed duration.
+    :param base_url: The URL of the server.
+    :param payloads: The request bodies, sent round-robin.
+    :param concurrency: The number of concurrent clients.
+    :param duration_seconds: The duration of the load.
+    :return: The throughput, the latency percentiles and the error counts.
+    """
+    latencies_ms: List[float] = list()
+    status_counts: Dict[str, int] = dict()
+    lock = threading.Lock()
+    stop_at: float = time.perf_counter() + duration_seconds
+
+    def client(client_index: int) -> None:
+        request_index: int = client_index
+        while time.perf_counter() < stop_at:
+            request = urllib.request.Request(f"{base_url}/predict", data=payloads[request_index % len(payloads)],
+                                             headers={"Content-Type": "application/json"})
+            request_index += concurrency
+            started_at: float = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=300) as response:
+                    response.read()
+                    status: str = str(response.status)
+            except urllib.error.HTTPError as e:
+                status = str(e.code)
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                status = "connection_error"
+            elapsed_ms: float = (time.perf_counter() - started_at) * 1000
+            with lock:
+                status_counts[status] = status_counts.get(status, 0) + 1
+                if status == "200":
+                    latencies_ms.append(elapsed_ms)
+
+    started_at: float = time.perf_counter()
+    clients: List[threading.Thread] = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed_seconds: float = time.perf_counter() - started_at
+
+    latencies_ms.sort()
+    percentiles: List[float] = statistics.quantiles(latencies_ms, n=100) if len(latencies_ms) > 1 else latencies_ms * 99
+    return {
+        "requests_per_second": round(len(latencies_ms) / elapsed_seconds, 2),
+        "p50_ms": round(percentiles[49], 1) if percentiles else None,
+        "p95_ms": round(percentiles[94], 1) if percentiles else None,
+        "p99_ms": round(percentiles[98], 1) if percentiles else None,
+        "status_counts": status_counts
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", required=True, choices=["single", "prefork"], help="How the server is run.")
+    parser.add_argument("--workers", type=int, default=None, help="The prefork workers, defaults to model_server.")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="The intra-op threads of every worker.")
+    parser.add_argument("--port", type=int, default=8765, help="The port of the server under test.")
+    parser.add_argument("--entity-set", default="codealltag", help="The entity set id.")
+    parser.add_argument("--model", required=True, help="The model id.")
+    parser.add_argument("--texts", default=None, help="Texts to send, one per line, defaults to the sample texts.")
+    parser.add_argument("--concurrency", type=int, default=8, help="The number of concurrent clients.")
+    parser.add_argument("--duration", type=float, default=60.0, help="The seconds of load.")
+    parser.add_argument("--startup-timeout", type=float, default=900.0, help="The seconds to wait for the server.")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file.")
+    args = parser.parse_args()
+
+    app_info = AppInfo.load()
+    entity_set_cfg = app_info.get_entity_set(args.entity_set)
+    if entity_set_cfg is None:
+        raise SystemExit(f"Unknown entity set: {args.entity_set}")
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            texts: List[str] = [line.strip() for line in f if line.strip()]
+    else:
+        texts = list(entity_set_cfg.sample_texts)
+    payloads: List[bytes] = [
+        json.dumps({"entity_set_id": args.entity_set, "model_id": args.model, "input_texts": [text], "repeat": 1}).encode("utf-8")
+        for text in texts
+    ]
+
+    workers: int = 1 if args.mode == "single" else (args.workers or app_info.model_server.workers)
+    base_url: str = f"http://127.0.0.1:{args.port}"
+    server = start_server(args.mode, args.port, workers, args.threads_per_worker)
+    try:
+        report: Dict[str, Any] = {
+            "mode": args.mode,
+            "workers": workers,
+            "threads_per_worker": args.threads_per_worker,
+            "available_cores": len(os.sched_getaffinity(0)),
+            "model": f"{args.entity_set}/{args.model}",
+            "concurrency": args.concurrency,
+            "startup_seconds": round(wait_until_ready(base_url, server, 2 * workers, args.startup_timeout), 1),
+            "memory_after_startup": measure_memory(server.pid)
+        }
+        report["load"] = run_load(base_url, payloads, args.concurrency, args.duration)
+        report["memory_after_load"] = measure_memory(server.pid)
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait(timeout=60)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Payload size and encode time of the /predict response against the encodings of the versioned endpoints.
+
+The entity spans of a large batch are synthesized, so no model is loaded. Every encoding is timed end to end,
+from the entity spans to the bytes sent:
+
+    predict       DataItem objects with the column-oriented output_dict, validated by pydantic, stdlib json
+    v1 rows       one object per entity as in src/api/schemas, orjson
+    v1 columns    one list per entity field, orjson
+    ... +gzip     the same, gzip compressed as negotiated with Accept-Encoding: gzip
+    ... msgpack   MessagePack instead of JSON, if msgpack is installed
+
+    python benchmarks/response_encoding_benchmark.py --texts 1000 --entities 40
+"""
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from pydantic import BaseModel
+from src.api.response_encoding import ResponseEncoding
+from src.domain.entity_span import (EntitySpan, entity_spans_to_columns, entity_spans_to_output_dict, entity_spans_to_rows,
+                                    pseudonymize_text)
+
+
+# the output schema of /predict, see app.py
+class DataItem(BaseModel):
+    output_dict: Dict[str, Any]
+    output_text: str
+
+
+class ApiResponse(BaseModel):
+    output: List[List[DataItem]]
+
+
+def make_batch(texts: int, entities: int, seed: int) -> List[Any]:
+    """
+    Synthesize input texts with their entity spans.
+    :return: The (input text, entity spans) of every text.
+    """
+    rng = random.Random(seed)
+    labels: List[str] = ["MALE", "FAMILY", "EMAIL", "PHONE", "STREET", "CITY", "ORG", "DATE"]
+    batch: List[Any] = list()
+    for _ in range(texts):
+        parts: List[str] = list()
+        entity_spans: List[EntitySpan] = list()
+        cursor: int = 0
+        for _ in range(entities):
+            filler: str = " ".join(rng.choice(["Hallo", "und", "bitte", "den", "Termin", "morgen"]) for _ in range(6)) + " "
+            token: str = rng.choice(["Hans", "Müller", "Berlin", "hans@example.org", "0176 1234567"])
+            start: int = cursor + len(filler)
+            entity_spans.append(EntitySpan(rng.choice(labels), start, start + len(token), token, "Paul"))
+            parts.extend([filler, token])
+            cursor = start + len(token)
+        batch.append(("".join(parts), entity_spans))
+    return batch
+
+
+def encode_predict(batch: List[Any]) -> bytes:
+    response = ApiResponse(output=[
+        [DataItem(output_dict=entity_spans_to_output_dict(entity_spans, with_pseudonym=True),
+                  output_text=pseudonymize_text(input_text, entity_spans))]
+        for input_text, entity_spans in batch
+    ])
+    return json.dumps(response.model_dump()).encode("utf-8")
+
+
+def encode_v1(response_encoding: ResponseEncoding) -> Callable[[List[Any]], bytes]:
+    to_entities = entity_spans_to_columns if response_encoding.layout == "columns" else entity_spans_to_rows
+
+    def encode(batch: List[Any]) -> bytes:
+        output = [[{"entities": to_entities(entity_spans, True), "pseudonymized_text": pseudonymize_text(input_text, entity_spans)}]
+                  for input_text, entity_spans in batch]
+        return response_encoding.encode({"output": output})[0]
+    return encode
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=1000, help="The texts of the batch.")
+    parser.add_argument("--entities", type=int, default=40, help="The entities per text.")
+    parser.add_argument("--iterations", type=int, default=10, help="The timed encodings per variant.")
+    parser.add_argument("--seed", type=int, default=13, help="The seed of the synthetic batch.")
+    args = parser.parse_args()
+
+    batch: List[Any] = make_batch(args.texts, args.entities, args.seed)
+    variants: Dict[str, Callable[[List[Any]], bytes]] = {"predict": encode_predict}
+    for media_type in ResponseEncoding.supported_media_types():
+        name: str = "" if media_type == ResponseEncoding.JSON else " msgpack"
+        for layout in ResponseEncoding.LAYOUTS:
+            for use_gzip in [False, True]:
+                variants[f"v1 {layout}{name}{' +gzip' if use_gzip else ''}"] = encode_v1(
+                    ResponseEncoding(media_type=media_type, layout=layout, gzip=use_gzip)
+                )
+
+    report: Dict[str, Any] = {"texts": args.texts, "entities_per_text": args.entities, "variants": dict()}
+    for name, encode in variants.items():
+        encode(batch)
+        timings_ms: List[float] = list()
+        for _ in range(args.iterations):
+            started_at: float = time.perf_counter()
+            body: bytes = encode(batch)
+            timings_ms.append((time.perf_counter() - started_at) * 1000)
+        report["variants"][name] = {"bytes": len(body), "median_ms": round(statistics.median(timings_ms), 1)}
+        print(f"{name:<28} {len(body) / 2 ** 20:8.2f} MiB {statistics.median(timings_ms):9.1f} ms")
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,275 @@
+"""
+Offline pseudonymization of a corpus with a model of the model service, without going through the API.
+
+    python scripts/bulk_pseudonymize.py --input emails.jsonl --output results.jsonl --model bilstm-crf-plus --workers 4
+    python scripts/bulk_pseudonymize.py --input emails/ --output results.jsonl --model google-mt5-base --repeat 2
+
+The input is a JSONL file with one document per line, its text in --text-field and its id in --id-field (the line
+number if missing), or a directory whose .txt files are the documents, their paths relative to it being their ids.
+The documents are read as they are processed, in shards of --shard-size documents, which are spread over --workers
+processes forked from this one after it has loaded the model, so the weights are shared the way the prefork server
+shares them. Every worker runs inference with --threads-per-worker intra-op threads, by default the available cores
+split evenly across the workers.
+
+Every document becomes one output line {"id": ..., "output": [[{"output_dict": ..., "output_text": ...}, ...]]},
+the ApiResponse of /predict for that document alone, in the order of the input. Progress is checkpointed to
+<output>.checkpoint.json after every shard written, an interrupted run started again with the same arguments
+resumes after the last shard written. Use --restart to start from scratch.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.infrastructure.frameworks.mt5_output_parser import MT5OutputParser
+from src.infrastructure.services.entity_span_inference import infer_entity_spans, to_output_items
+from src.infrastructure.services.model_service_impl import ModelServiceImpl
+from src.infrastructure.services.prefork_server import PreforkServer
+from src.utils import AppInfo
+
+Document = Tuple[str, str]
+
+# set in the master before the workers are forked from it
+_model_service: ModelServiceImpl = None
+_mt5_output_parser: Optional[MT5OutputParser] = None
+
+
+def iter_documents(input_path: Path, text_field: str, id_field: str, skip: int = 0) -> Iterator[Document]:
+    """
+    Read the documents of a JSONL file or a directory of .txt files.
+    :param input_path: The JSONL file or the directory.
+    :param text_field: The field of the text in a JSONL line.
+    :param id_field: The field of the id in a JSONL line.
+    :param skip: The number of documents to skip, without reading their texts from a directory.
+    :return: An iterator over (id, text) of every document.
+    """
+    if input_path.is_dir():
+        paths: List[Path] = sorted(path for path in input_path.rglob("*.txt") if path.is_file())
+        for path in paths[skip:]:
+            yield path.relative_to(input_path).as_posix(), path.read_text(encoding="utf-8")
+        return
+
+    with input_path.open(encoding="utf-8") as f:
+        document_index: int = 0
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            document_index += 1
+            if document_index <= skip:
+                continue
+            try:
+                document: Dict[str, Any] = json.loads(line)
+                text: str = document[text_field]
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"Invalid document on line {line_number} of {input_path}: {e!r}")
+            yield str(document.get(id_field, line_number)), text
+
+
+def iter_shards(documents: Iterator[Document], shard_size: int) -> Iterator[List[Document]]:
+    """
+    Group documents into shards.
+    :param documents: The documents.
+    :param shard_size: The number of documents of a shard, the last one may have fewer.
+    :return: An iterator over the shards.
+    """
+    shard: List[Document] = list()
+    for document in documents:
+        shard.append(document)
+        if len(shard) == shard_size:
+            yield shard
+            shard = list()
+    if shard:
+        yield shard
+
+
+def init_worker(threads_per_worker: int) -> None:
+    """
+    Restore the per-process state of the model service in a worker forked from the master.
+    """
+    PreforkServer.set_intra_op_threads(threads_per_worker)
+    _model_service.after_fork()
+
+
+def predict_shard(entity_set_id: str, model_id: str, repeat: int, shard: List[Document]) -> Tuple[str, int]:
+    """
+    Pseudonymize the documents of a shard in one batch, the way /predict does.
+    :return: The output lines of the shard and the number of characters processed.
+    """
+    model_inference_maker = _model_service.get_model_inference_maker(entity_set_id, model_id)
+    texts: List[str] = [text for _, text in shard]
+    with _model_service.acquire_model(entity_set_id, model_id):
+        entity_spans_per_input = infer_entity_spans(
+            lambda method, **kwargs: getattr(model_inference_maker, method)(**kwargs), texts, repeat,
+            mt5_output_parser=_mt5_output_parser
+        )
+    outputs: List[List[Dict[str, Any]]] = to_output_items(texts, entity_spans_per_input,
+                                                          with_pseudonym=_mt5_output_parser is not None)
+
+    lines: str = "".join(
+        json.dumps({"id": document_id, "output": [output]}, ensure_ascii=False) + "\n"
+        for (document_id, _), output in zip(shard, outputs)
+    )
+    return lines, sum(len(text) for text in texts)
+
+
+def load_checkpoint(checkpoint_path: Path, run: Dict[str, Any], restart: bool) -> Dict[str, Any]:
+    """
+    Load the checkpoint of an interrupted run with the same arguments, or start a new one.
+    :raises ValueError: If the checkpoint belongs to a run with other arguments.
+    """
+    if restart or not checkpoint_path.exists():
+        return {"run": run, "next_shard": 0, "documents": 0, "output_bytes": 0, "finished": False}
+    with checkpoint_path.open(encoding="utf-8") as f:
+        checkpoint: Dict[str, Any] = json.load(f)
+    if checkpoint["run"] != run:
+        raise ValueError(f"The checkpoint {checkpoint_path} belongs to a run with other arguments, "
+                         f"use --restart to start from scratch: {checkpoint['run']}")
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path: Path, checkpoint: Dict[str, Any]) -> None:
+    """
+    Replace the checkpoint atomically.
+    """
+    temporary_path: Path = checkpoint_path.with_name(checkpoint_path.name + ".tmp")
+    with temporary_path.open("w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, checkpoint_path)
+
+
+def main() -> int:
+    global _model_service, _mt5_output_parser
+
+    server_cfg = AppInfo.load().model_server
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="A JSONL file or a directory of .txt files.")
+    parser.add_argument("--output", required=True, help="The JSONL file to write the results to.")
+    parser.add_argument("--entity-set", default="codealltag", help="The entity set id.")
+    parser.add_argument("--model", required=True, help="The model id.")
+    parser.add_argument("--repeat", type=int, default=1, help="The samples per document of generative models.")
+    parser.add_argument("--text-field", default="text", help="The field of the text in a JSONL line.")
+    parser.add_argument("--id-field", default="id", help="The field of the id in a JSONL line.")
+    parser.add_argument("--shard-size", type=int, default=64, help="The documents per shard.")
+    parser.add_argument("--workers", type=int, default=server_cfg.workers, help="The number of worker processes.")
+    parser.add_argument("--threads-per-worker", type=int, default=server_cfg.threads_per_worker,
+                        help="The intra-op threads of every worker.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from scratch.")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        raise SystemExit("The bulk runner needs os.fork, which is not available on this platform")
+    app_info = AppInfo.load()
+    entity_set_cfg = app_info.get_entity_set(args.entity_set)
+    if entity_set_cfg is None:
+        raise SystemExit(f"Unknown entity set: {args.entity_set}")
+    model_cfg = next((model_cfg for model_cfg in entity_set_cfg.supported_models if model_cfg.model_id == args.model), None)
+    if model_cfg is None:
+        raise SystemExit(f"Unknown model {args.model} in entity set {args.entity_set}")
+
+    input_path: Path = Path(args.input).resolve()
+    output_path: Path = Path(args.output).resolve()
+    checkpoint_path: Path = output_path.with_name(output_path.name + ".checkpoint.json")
+    workers: int = max(args.workers, 1)
+    threads_per_worker: int = args.threads_per_worker or max(PreforkServer.get_available_cores() // workers, 1)
+    run: Dict[str, Any] = {"input": str(input_path), "entity_set_id": args.entity_set, "model_id": args.model,
+                           "repeat": args.repeat, "text_field": args.text_field, "id_field": args.id_field,
+                           "shard_size": args.shard_size}
+    checkpoint: Dict[str, Any] = load_checkpoint(checkpoint_path, run, args.restart)
+    if checkpoint["finished"]:
+        print(f"{output_path} is complete with {checkpoint['documents']} documents, use --restart to run again")
+        return 0
+    if checkpoint["output_bytes"] and (not output_path.exists() or output_path.stat().st_size < checkpoint["output_bytes"]):
+        raise SystemExit(f"{output_path} is shorter than its checkpoint, use --restart to start from scratch")
+
+    # the master loads the model single-threaded, see PreforkServer.run
+    PreforkServer.set_intra_op_threads(1)
+    started_at: float = time.perf_counter()
+    _model_service = ModelServiceImpl()
+    if model_cfg.model_impl.startswith("MT5ForConditionalGeneration"):
+        _mt5_output_parser = MT5OutputParser(app_info.get_fine_grained_labels(args.entity_set))
+    with _model_service.acquire_model(args.entity_set, args.model) as model:
+        if model is None:
+            raise SystemExit(f"Failed to load {args.entity_set}/{args.model}")
+    _model_service.prepare_fork()
+    gc.collect()
+    gc.freeze()
+    print(f"Loaded {args.entity_set}/{args.model} in {time.perf_counter() - started_at:.1f}s, "
+          f"running {workers} workers of {threads_per_worker} intra-op threads")
+    if checkpoint["next_shard"]:
+        print(f"Resuming after {checkpoint['documents']} documents in {checkpoint['next_shard']} shards")
+
+    shards: Iterator[List[Document]] = iter_shards(
+        iter_documents(input_path, args.text_field, args.id_field, skip=checkpoint["next_shard"] * args.shard_size),
+        max(args.shard_size, 1)
+    )
+    # shards are written in input order, completed shards wait for the ones before them within the window
+    max_pending_shards: int = 2 * workers
+    pending: Dict[int, Future] = dict()
+    next_shard_to_submit: int = checkpoint["next_shard"]
+    exhausted: bool = False
+    documents: int = 0
+    characters: int = 0
+    started_at = time.perf_counter()
+
+    with output_path.open("ab") as output, ProcessPoolExecutor(max_workers=workers,
+                                                                 mp_context=multiprocessing.get_context("fork"),
+                                                                 initializer=init_worker,
+                                                                 initargs=(threads_per_worker,)) as executor:
+        # drop the lines of a shard that was being written when the run was interrupted
+        output.truncate(checkpoint["output_bytes"])
+        output.seek(checkpoint["output_bytes"])
+        while True:
+            while not exhausted and len(pending) < max_pending_shards:
+                shard: Optional[List[Document]] = next(shards, None)
+                if shard is None:
+                    exhausted = True
+                    break
+                pending[next_shard_to_submit] = executor.submit(predict_shard, args.entity_set, args.model, args.repeat, shard)
+                next_shard_to_submit += 1
+            if not pending:
+                break
+
+            lines, shard_characters = pending.pop(checkpoint["next_shard"]).result()
+            output.write(lines.encode("utf-8"))
+            output.flush()
+            os.fsync(output.fileno())
+            shard_documents: int = lines.count("\n")
+            documents += shard_documents
+            characters += shard_characters
+            checkpoint.update(next_shard=checkpoint["next_shard"] + 1,
+                              documents=checkpoint["documents"] + shard_documents,
+                              output_bytes=output.tell())
+            save_checkpoint(checkpoint_path, checkpoint)
+            elapsed_seconds: float = time.perf_counter() - started_at
+            print(f"{checkpoint['documents']} documents written, {documents / elapsed_seconds:.2f} documents/s")
+
+    elapsed_seconds = time.perf_counter() - started_at
+    checkpoint["finished"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    print(json.dumps({
+        "model": f"{args.entity_set}/{args.model}",
+        "workers": workers,
+        "threads_per_worker": threads_per_worker,
+        "documents": documents,
+        "total_documents": checkpoint["documents"],
+        "seconds": round(elapsed_seconds, 1),
+        "documents_per_second": round(documents / elapsed_seconds, 2) if elapsed_seconds else None,
+        "characters_per_second": round(characters / elapsed_seconds, 1) if elapsed_seconds else None
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
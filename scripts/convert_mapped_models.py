@@ -0,0 +1,125 @@
+"""
+Offline conversion of models to the memory-mapped artifact loaded by the memory_mapped loading strategy.
+
+    SequenceTagger               model.pt          -> mapped/model.safetensors, skeleton.pkl, manifest.json
+    MT5ForConditionalGeneration  pytorch_model.bin -> mapped/model.safetensors, config.json, tokenizer files, manifest.json
+
+The artifact is written to the mapped/ directory of the model version. The transformer of a tagger with transformer
+embeddings is part of the artifact, so loading it reads nothing from flair_cache_root. Switch the
+model_loading_strategy of the model in config/app_info.yml to memory_mapped once the check passes.
+The check compares the predictions on the texts and reports the load time of both formats; run it twice to compare
+with a warm page cache, or drop the page cache in between to compare cold starts.
+
+    python scripts/convert_mapped_models.py --entity-set codealltag --check
+    python scripts/convert_mapped_models.py --entity-set codealltag --model google-mt5-base --check
+"""
+from pathlib import Path
+from typing import Any, Dict, List
+
+import argparse
+import json
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.infrastructure.frameworks.mapped_model_artifact import MappedModelArtifact
+from src.infrastructure.frameworks.mt5_for_conditional_generation_loader import MT5ForConditionalGenerationLoader
+from src.infrastructure.frameworks.sequence_tagger_inference_maker import SequenceTaggerInferenceMaker
+from src.infrastructure.frameworks.sequence_tagger_loader import SequenceTaggerLoader
+from src.utils import AppInfo
+
+LOADERS: Dict[str, Any] = {
+    "SequenceTagger": SequenceTaggerLoader,
+    "MT5ForConditionalGeneration": MT5ForConditionalGenerationLoader
+}
+
+
+def convert(model_impl: str, model_path: Path) -> Dict[str, Any]:
+    """
+    Load the model from its original files and write the mapped artifact.
+    :return: The manifest of the artifact.
+    """
+    model_loader = LOADERS[model_impl](model_name_or_path=model_path)
+    model = model_loader.load()
+    if model is None:
+        raise RuntimeError(f"Failed to load the model at {model_path}")
+    mapped_directory: Path = model_path / MappedModelArtifact.DIRECTORY_NAME
+    if model_impl == "SequenceTagger":
+        return MappedModelArtifact.save_module(model, mapped_directory, model_impl)
+    model.config.save_pretrained(mapped_directory)
+    model_loader.tokenizer.save_pretrained(mapped_directory)
+    return MappedModelArtifact.save_state_dict(model, mapped_directory, model_impl)
+
+
+def check(model_impl: str, model_path: Path, texts: List[str]) -> Dict[str, Any]:
+    """
+    Load the model from its original files and from the mapped artifact and compare their predictions on the texts.
+    :return: The load times and the number of texts with different predictions.
+    """
+    eager_loader = LOADERS[model_impl](model_name_or_path=model_path)
+    mapped_loader = LOADERS[model_impl](model_name_or_path=model_path, loading_strategy="memory_mapped")
+    eager_model, mapped_model = eager_loader.load(), mapped_loader.load()
+    if mapped_model is None:
+        raise RuntimeError(f"Failed to load the mapped artifact of {model_path}")
+    report: Dict[str, Any] = {
+        "original_load_seconds": round(eager_loader.load_seconds, 3),
+        "mapped_load_seconds": round(mapped_loader.load_seconds, 3)
+    }
+
+    if model_impl == "SequenceTagger":
+        eager_spans = SequenceTaggerInferenceMaker(model_loader=eager_loader).infer_entity_spans(texts)
+        mapped_spans = SequenceTaggerInferenceMaker(model_loader=mapped_loader).infer_entity_spans(texts)
+        report["span_mismatches"] = sum(eager != mapped for eager, mapped in zip(eager_spans, mapped_spans))
+        return report
+
+    import torch
+
+    with torch.no_grad():
+        inputs = eager_loader.tokenizer(texts, padding=True, truncation=True, max_length=512, return_tensors="pt")
+        eager_ids = eager_model.generate(**inputs, max_length=64, do_sample=False)
+        mapped_ids = mapped_model.generate(**inputs, max_length=64, do_sample=False)
+    report["generation_mismatches"] = sum(
+        eager.tolist() != mapped.tolist() for eager, mapped in zip(eager_ids, mapped_ids)
+    ) + abs(eager_ids.shape[0] - mapped_ids.shape[0])
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entity-set", default="codealltag", help="The entity set id.")
+    parser.add_argument("--model", action="append", default=None, help="The model id, all models of the entity set by default.")
+    parser.add_argument("--skip-convert", action="store_true", help="Only check existing artifacts.")
+    parser.add_argument("--check", action="store_true", help="Compare the mapped models with the original ones.")
+    args = parser.parse_args()
+
+    app_info = AppInfo.load()
+    entity_set_cfg = app_info.get_entity_set(args.entity_set)
+    if entity_set_cfg is None:
+        raise SystemExit(f"Unknown entity set: {args.entity_set}")
+
+    failed: bool = False
+    for model_cfg in entity_set_cfg.supported_models:
+        if args.model and model_cfg.model_id not in args.model:
+            continue
+        # compiled impls keep their own formats, their eager impl is converted
+        model_impl: str = "MT5ForConditionalGeneration" if model_cfg.model_impl.startswith("MT5ForConditionalGeneration") else "SequenceTagger"
+        model_path: Path = ROOT_DIR.joinpath(*entity_set_cfg.supported_models_root_dir, *model_cfg.model_directory_name,
+                                             model_cfg.model_version)
+        if not args.skip_convert:
+            started_at: float = time.perf_counter()
+            manifest: Dict[str, Any] = convert(model_impl, model_path)
+            print(f"Converted {args.entity_set}/{model_cfg.model_id} in {time.perf_counter() - started_at:.1f}s: "
+                  f"{manifest['tensor_count']} tensors, {manifest['tensor_bytes'] / 2 ** 20:.1f} MiB")
+        if args.check:
+            report: Dict[str, Any] = check(model_impl, model_path, list(entity_set_cfg.sample_texts))
+            print(json.dumps({"model": f"{args.entity_set}/{model_cfg.model_id}", **report}, indent=2))
+            if any(value for key, value in report.items() if key.endswith("mismatches")):
+                print(f"Check failed for {args.entity_set}/{model_cfg.model_id}", file=sys.stderr)
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Offline export of a model to a compiled inference backend, with a parity check against the eager model.
+
+    SequenceTagger with word and Flair embeddings (bilstm-crf-plus)  -> torchscript  (model_impl SequenceTaggerTorchScript)
+    SequenceTagger with transformer embeddings (deepset-gelectra-large) -> onnx       (model_impl SequenceTaggerONNX)
+    MT5ForConditionalGeneration (google-mt5-base)                    -> onnx         (model_impl MT5ForConditionalGenerationONNX)
+
+The compiled model is written to the torchscript/ or onnx/ directory of the model version, where the loaders of the
+compiled model_impl types look for it. Switch the model_impl of the model in config/app_info.yml once the check passes.
+
+    python scripts/export_compiled_models.py --entity-set codealltag --model bilstm-crf-plus --backend torchscript --check
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import argparse
+import json
+import sys
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.infrastructure.frameworks.compiled_model_exporter import (check_mt5_parity, check_tagger_parity, export_onnx_mt5,
+                                                                   export_onnx_tagger, export_torchscript_tagger)
+from src.infrastructure.frameworks.mt5_for_conditional_generation_loader import MT5ForConditionalGenerationLoader
+from src.infrastructure.frameworks.mt5_for_conditional_generation_onnx_loader import MT5ForConditionalGenerationONNXLoader
+from src.infrastructure.frameworks.sequence_tagger_loader import SequenceTaggerLoader
+from src.infrastructure.frameworks.sequence_tagger_onnx_loader import SequenceTaggerONNXLoader
+from src.infrastructure.frameworks.sequence_tagger_torchscript_loader import SequenceTaggerTorchScriptLoader
+from src.infrastructure.frameworks.somajo_tokenizer import SoMaJoTokenizer
+from src.utils import AppInfo
+
+# the eager model_impl a backend can be exported from, and the loader of the exported model
+BACKENDS: Dict[Tuple[str, str], Any] = {
+    ("SequenceTagger", "torchscript"): SequenceTaggerTorchScriptLoader,
+    ("SequenceTagger", "onnx"): SequenceTaggerONNXLoader,
+    ("MT5ForConditionalGeneration", "onnx"): MT5ForConditionalGenerationONNXLoader
+}
+
+
+def load_texts(texts_path: str, sample_texts: List[str]) -> List[str]:
+    """
+    Load the texts to check parity on, one per line, or use the sample texts of the entity set.
+    """
+    if not texts_path:
+        return list(sample_texts)
+    with open(texts_path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def export(model_impl: str, backend: str, model_path: Path, output_directory: Path) -> None:
+    """
+    Load the eager fp32 model and export it.
+    """
+    if model_impl == "SequenceTagger":
+        tagger = SequenceTaggerLoader(model_name_or_path=model_path).load()
+        if tagger is None:
+            raise RuntimeError(f"Failed to load the tagger at {model_path}")
+        if backend == "torchscript":
+            export_torchscript_tagger(tagger, output_directory)
+        else:
+            export_onnx_tagger(tagger, output_directory)
+    else:
+        model_loader = MT5ForConditionalGenerationLoader(model_name_or_path=model_path)
+        model = model_loader.load()
+        if model is None:
+            raise RuntimeError(f"Failed to load the MT5 model at {model_path}")
+        export_onnx_mt5(model, model_loader.tokenizer, output_directory)
+
+
+def check(model_impl: str, backend: str, model_path: Path, output_directory: Path, texts: List[str]) -> Dict[str, Any]:
+    """
+    Load the eager and the exported model and compare their outputs on the texts.
+    """
+    compiled_loader = BACKENDS[(model_impl, backend)](model_name_or_path=output_directory)
+    compiled_model = compiled_loader.load()
+    if compiled_model is None:
+        raise RuntimeError(f"Failed to load the exported model at {output_directory}")
+
+    if model_impl == "SequenceTagger":
+        tokenized_texts = SoMaJoTokenizer().tokenize_batch_with_offsets(texts)
+        sentence_keys: List[Tuple[str, ...]] = list(dict.fromkeys(
+            tuple(token.text for token in tokenized_sentence)
+            for tokenized_sentences in tokenized_texts for tokenized_sentence in tokenized_sentences
+        ))
+        return check_tagger_parity(SequenceTaggerLoader(model_name_or_path=model_path).load(), compiled_model, sentence_keys)
+
+    model_loader = MT5ForConditionalGenerationLoader(model_name_or_path=model_path)
+    return check_mt5_parity(model_loader.load(), model_loader.tokenizer, compiled_model, texts)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entity-set", default="codealltag", help="The entity set id.")
+    parser.add_argument("--model", required=True, help="The model id.")
+    parser.add_argument("--backend", required=True, choices=["torchscript", "onnx"], help="The compiled backend.")
+    parser.add_argument("--output-dir", default=None, help="Defaults to the backend directory of the model version.")
+    parser.add_argument("--skip-export", action="store_true", help="Only check an existing export.")
+    parser.add_argument("--check", action="store_true", help="Compare the exported model with the eager model.")
+    parser.add_argument("--texts", default=None, help="Texts to check parity on, one per line, defaults to the sample texts.")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="Maximum absolute difference of scores and states.")
+    args = parser.parse_args()
+
+    app_info = AppInfo.load()
+    entity_set_cfg = app_info.get_entity_set(args.entity_set)
+    if entity_set_cfg is None:
+        raise SystemExit(f"Unknown entity set: {args.entity_set}")
+    model_cfg = next((model for model in entity_set_cfg.supported_models if model.model_id == args.model), None)
+    if model_cfg is None:
+        raise SystemExit(f"Unknown model {args.model} in entity set {args.entity_set}")
+
+    # the config may already point at the compiled impl, export from the eager impl it was derived from
+    model_impl: str = "MT5ForConditionalGeneration" if model_cfg.model_impl.startswith("MT5ForConditionalGeneration") else "SequenceTagger"
+    loader_class = BACKENDS.get((model_impl, args.backend))
+    if loader_class is None:
+        raise SystemExit(f"{model_impl} models cannot be exported to {args.backend}")
+
+    model_path = ROOT_DIR.joinpath(*entity_set_cfg.supported_models_root_dir, *model_cfg.model_directory_name, model_cfg.model_version)
+    output_directory = Path(args.output_dir) if args.output_dir else model_path / loader_class.DIRECTORY_NAME
+
+    if not args.skip_export:
+        export(model_impl, args.backend, model_path, output_directory)
+        print(f"Exported {args.entity_set}/{args.model} to {output_directory}")
+
+    if not args.check:
+        return 0
+    report: Dict[str, Any] = check(model_impl, args.backend, model_path, output_directory,
+                                   load_texts(args.texts, entity_set_cfg.sample_texts))
+    print(json.dumps(report, indent=2))
+    difference: float = report.get("max_abs_emission_difference", report.get("max_abs_encoder_difference", 0.0))
+    mismatches: int = sum(value for key, value in report.items() if key.endswith("mismatches"))
+    if difference > args.tolerance or mismatches:
+        print(f"Parity check failed: max abs difference {difference:.2e} (tolerance {args.tolerance:.0e}), {mismatches} mismatches",
+              file=sys.stderr)
+        return 1
+    print("Parity check passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""
+Serve the API from several worker processes sharing the models, which are loaded and warmed up once in a master process.
+
+    python server.py --host 0.0.0.0 --port 8000 --workers 4
+
+The worker count and the intra-op threads of every worker default to model_server in config/app_info.yml,
+the threads default to the available cores split evenly across the workers. Use benchmarks/prefork_benchmark.py
+to compare startup, memory per worker and throughput with the single-process `uvicorn app:app`, its docstring lists
+the measurements of a run: the workers share the weights, so 2 workers took about the memory of a single process,
+and they started up without warming up the model again. Throughput only scales with the cores available to the workers.
+"""
+from src.infrastructure.services.model_service_impl import ModelServiceImpl
+from src.infrastructure.services.prefork_server import PreforkServer
+from src.utils import AppInfo
+
+import argparse
+import sys
+
+
+def main() -> int:
+    server_cfg = AppInfo.load().model_server
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0", help="The host to listen on.")
+    parser.add_argument("--port", type=int, default=8000, help="The port to listen on.")
+    parser.add_argument("--workers", type=int, default=server_cfg.workers, help="The number of worker processes.")
+    parser.add_argument("--threads-per-worker", type=int, default=server_cfg.threads_per_worker,
+                        help="The intra-op threads of every worker.")
+    parser.add_argument("--log-level", default="info", help="The log level of the workers.")
+    args = parser.parse_args()
+
+    # heavy frameworks are imported lazily, so the master can still set its thread count before they are loaded
+    from app import app
+
+    return PreforkServer(app=app,
+                         model_service=ModelServiceImpl(),
+                         host=args.host,
+                         port=args.port,
+                         workers=args.workers,
+                         threads_per_worker=args.threads_per_worker,
+                         log_level=args.log_level).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
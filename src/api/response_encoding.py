@@ -0,0 +1,107 @@
+from src.domain.exceptions import UnsupportedResponseEncodingError
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import gzip
+import importlib.util
+import orjson
+
+
+def _parse_header_values(header: Optional[str]) -> List[Tuple[str, float]]:
+    """
+    Parse a header like Accept or Accept-Encoding into its values and quality factors, best first.
+    """
+    values: List[Tuple[str, float, int]] = list()
+    for position, part in enumerate((header or "").split(",")):
+        value, _, parameters = part.strip().partition(";")
+        quality: float = 1.0
+        for parameter in parameters.split(";"):
+            name, _, number = parameter.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        if value:
+            values.append((value.strip().lower(), quality, position))
+    return [(value, quality) for value, quality, _ in sorted(values, key=lambda item: (-item[1], item[2]))]
+
+
+class ResponseEncoding(NamedTuple):
+    """
+    How a response of the versioned endpoints is encoded, negotiated from the request headers.
+    media_type is application/json, encoded with orjson, or application/msgpack, the latter only if msgpack is installed.
+    layout is rows, one object per entity as in src/api/schemas, or columns, one list per field of the entities.
+    gzip compresses bodies of at least gzip_min_bytes for clients accepting it.
+    """
+    media_type: str
+    layout: str
+    gzip: bool
+    gzip_min_bytes: int = 1024
+    gzip_level: int = 5
+
+    JSON = "application/json"
+    MSGPACK = "application/msgpack"
+    LAYOUTS = ["rows", "columns"]
+
+    @classmethod
+    def supported_media_types(cls) -> List[str]:
+        """
+        :return: The media types available in this environment, the default first.
+        """
+        if importlib.util.find_spec("msgpack") is None:
+            return [cls.JSON]
+        return [cls.JSON, cls.MSGPACK]
+
+    @classmethod
+    def negotiate(cls,
+                  accept: Optional[str],
+                  accept_encoding: Optional[str],
+                  layout: str = "rows",
+                  gzip_min_bytes: int = 1024,
+                  gzip_level: int = 5) -> "ResponseEncoding":
+        """
+        Choose the encoding of a response.
+        :param accept: The Accept header of the request.
+        :param accept_encoding: The Accept-Encoding header of the request.
+        :param layout: The requested layout of the entities, rows or columns.
+        :param gzip_min_bytes: The size from which on bodies are compressed.
+        :param gzip_level: The gzip compression level.
+        :return: The encoding.
+        :raises UnsupportedResponseEncodingError: If the client accepts none of the available media types.
+        :raises ValueError: If the layout is unknown.
+        """
+        if layout not in cls.LAYOUTS:
+            raise ValueError(f"Invalid layout={layout}, supported values: {cls.LAYOUTS}")
+        supported: List[str] = cls.supported_media_types()
+        aliases: Dict[str, str] = {"application/x-msgpack": cls.MSGPACK, "application/*": cls.JSON, "*/*": cls.JSON}
+        media_type: Optional[str] = cls.JSON if not accept else None
+        for value, quality in _parse_header_values(accept):
+            value = aliases.get(value, value)
+            if quality > 0 and value in supported:
+                media_type = value
+                break
+        if media_type is None:
+            raise UnsupportedResponseEncodingError(accept, supported)
+
+        use_gzip: bool = any(value in ["gzip", "*"] and quality > 0
+                             for value, quality in _parse_header_values(accept_encoding))
+        return cls(media_type=media_type, layout=layout, gzip=use_gzip,
+                   gzip_min_bytes=gzip_min_bytes, gzip_level=gzip_level)
+
+    def encode(self, content: Any) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Encode and, if negotiated and worthwhile, compress a response.
+        :param content: The response content, built of dicts, lists, strings and numbers.
+        :return: The body and the headers describing it.
+        """
+        if self.media_type == self.MSGPACK:
+            import msgpack
+
+            body: bytes = msgpack.packb(content, use_bin_type=True)
+        else:
+            body = orjson.dumps(content)
+        headers: Dict[str, str] = {"Content-Type": self.media_type, "Vary": "Accept, Accept-Encoding"}
+        if self.gzip and len(body) >= self.gzip_min_bytes:
+            body = gzip.compress(body, compresslevel=self.gzip_level)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, NamedTuple
+
+class EntitySpan(NamedTuple):
+    """
+    An entity detected in an input text, with its character offsets in that text.
+    The pseudonym is empty for models that only detect entities.
+    """
+    label: str
+    start: int
+    end: int
+    token: str
+    pseudonym: str = ""
+
+def pseudonymize_text(input_text: str, entity_spans: List[EntitySpan]) -> str:
+    """
+    Replace every entity span of the input text with its pseudonym in a single pass.
+    :param input_text: The input text the spans point into.
+    :param entity_spans: The entity spans in text order, spans overlapping a previous one are skipped.
+    :return: The pseudonymized text.
+    """
+    parts: List[str] = list()
+    cursor: int = 0
+    for entity_span in entity_spans:
+        if entity_span.start < cursor:
+            continue
+        parts.append(input_text[cursor:entity_span.start])
+        parts.append(entity_span.pseudonym)
+        cursor = entity_span.end
+    parts.append(input_text[cursor:])
+    return "".join(parts)
+
+def entity_spans_to_output_dict(entity_spans: List[EntitySpan], with_pseudonym: bool) -> Dict[str, Dict[int, Any]]:
+    """
+    Serialize entity spans to the column-oriented {column: {row index: value}} layout of the /predict output_dict.
+    :param entity_spans: The entity spans, token ids are assigned in list order.
+    :param with_pseudonym: Whether to include the Pseudonym column.
+    :return: The output dict.
+    """
+    output_dict: Dict[str, Dict[int, Any]] = {
+        "Token_ID": {index: 'T' + str(index + 1) for index in range(len(entity_spans))},
+        "Label": {index: entity_span.label for index, entity_span in enumerate(entity_spans)},
+        "Start": {index: entity_span.start for index, entity_span in enumerate(entity_spans)},
+        "End": {index: entity_span.end for index, entity_span in enumerate(entity_spans)},
+        "Token": {index: entity_span.token for index, entity_span in enumerate(entity_spans)}
+    }
+    if with_pseudonym:
+        output_dict["Pseudonym"] = {index: entity_span.pseudonym for index, entity_span in enumerate(entity_spans)}
+    return output_dict
+
+def entity_spans_to_rows(entity_spans: List[EntitySpan], with_pseudonym: bool) -> List[Dict[str, Any]]:
+    """
+    Serialize entity spans to one object per entity, the EntityItem layout of src/api/schemas.
+    :param entity_spans: The entity spans, token ids are assigned in list order.
+    :param with_pseudonym: Whether to include the Pseudonym field.
+    :return: The entity items.
+    """
+    if with_pseudonym:
+        return [
+            {"Token_ID": 'T' + str(index + 1), "Label": entity_span.label, "Start": entity_span.start,
+             "End": entity_span.end, "Token": entity_span.token, "Pseudonym": entity_span.pseudonym}
+            for index, entity_span in enumerate(entity_spans)
+        ]
+    return [
+        {"Token_ID": 'T' + str(index + 1), "Label": entity_span.label, "Start": entity_span.start,
+         "End": entity_span.end, "Token": entity_span.token}
+        for index, entity_span in enumerate(entity_spans)
+    ]
+
+def entity_spans_to_columns(entity_spans: List[EntitySpan], with_pseudonym: bool) -> Dict[str, List[Any]]:
+    """
+    Serialize entity spans to one list per field, the compact columnar layout of the versioned endpoints.
+    :param entity_spans: The entity spans, token ids are assigned in list order.
+    :param with_pseudonym: Whether to include the Pseudonym column.
+    :return: The columns.
+    """
+    columns: Dict[str, List[Any]] = {
+        "Token_ID": ['T' + str(index + 1) for index in range(len(entity_spans))],
+        "Label": [entity_span.label for entity_span in entity_spans],
+        "Start": [entity_span.start for entity_span in entity_spans],
+        "End": [entity_span.end for entity_span in entity_spans],
+        "Token": [entity_span.token for entity_span in entity_spans]
+    }
+    if with_pseudonym:
+        columns["Pseudonym"] = [entity_span.pseudonym for entity_span in entity_spans]
+    return columns
\ No newline at end of file
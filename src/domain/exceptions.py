@@ -30,8 +30,56 @@ class UnsupportedModelImplTypeError(DomainException):
             f"Unsupported model impl type: {model_impl} for model {model_id} in entity set {entity_set_id}"
         )
 
+class UnsupportedModelPrecisionError(DomainException):
+    """
+    Raised when an unsupported model precision mode is encountered
+    """
+    def __init__(self, entity_set_id: str, model_id: str, precision: str):
+        super().__init__(
+            f"Unsupported model precision '{precision}' for model {model_id} in entity set {entity_set_id}"
+        )
+
 class InvalidModelConfigError(DomainException):
     """
     Raised when model configuration is invalid
     """
-    
\ No newline at end of file
+    
+class ModelQueueFullError(DomainException):
+    """
+    Raised when the request queue of a model is full and the request is rejected
+    """
+    def __init__(self, name: str, max_queue_depth: int, retry_after_seconds: int):
+        super().__init__(
+            f"Request queue of {name} is full ({max_queue_depth} waiting requests), retry after {retry_after_seconds}s"
+        )
+        self.retry_after_seconds = retry_after_seconds
+
+class ModelMemoryBudgetExceededError(DomainException):
+    """
+    Raised when a model cannot be loaded within the memory budget, because it is larger than the budget
+    or the other resident models stay in use for too long
+    """
+    def __init__(self, name: str, estimated_bytes: int, memory_budget_bytes: int, retry_after_seconds: int):
+        super().__init__(
+            f"Model {name} ({estimated_bytes} bytes) does not fit the memory budget of {memory_budget_bytes} bytes, "
+            f"retry after {retry_after_seconds}s"
+        )
+        self.retry_after_seconds = retry_after_seconds
+
+class JobNotFoundError(DomainException):
+    """
+    Raised when a batch job is not found in the job queue for the given job id
+    """
+    def __init__(self, job_id: str):
+        super().__init__(
+            f"Job {job_id} not found"
+        )
+
+class UnsupportedResponseEncodingError(DomainException):
+    """
+    Raised when none of the response encodings accepted by a client is available
+    """
+    def __init__(self, accept: str, supported_media_types: list):
+        super().__init__(
+            f"None of the accepted media types '{accept}' is available, supported values: {supported_media_types}"
+        )
@@ -1,36 +1,138 @@
 from abc import abstractmethod
+from pathlib import Path
 from src.infrastructure.frameworks.model_loader import ModelLoader
+from src.infrastructure.frameworks.model_precision import ModelPrecision
 from typing import Any
 
+import gc
+import threading
+import time
+
 
 class CachedModelLoader(ModelLoader):
     """
     Base class ensuring caching across an app run.
+    The cached model can be unloaded again to release its memory, the next load call reloads it.
     """
     _model = None
+    # whether a loaded model can be handed to forked worker processes, models of runtimes owning thread pools cannot
+    fork_safe: bool = True
     
     def __init__(self, 
                  model_name_or_path: str, 
-                 loading_strategy: str = "local_disk_storage"):
+                 loading_strategy: str = "local_disk_storage",
+                 model_precision: ModelPrecision = None):
         """
         :param model_name_or_path: The path or name of the model to load.
         :param loading_strategy: The strategy to use for loading the model (e.g., local_disk_storage).
+        :param model_precision: The inference precision applied at load time, defaults to fp32.
         """
         super().__init__(model_name_or_path, loading_strategy)
+        self.model_precision: ModelPrecision = model_precision or ModelPrecision()
+        self._load_lock = threading.Lock()
+        self.load_seconds: float = None
+        self.load_count: int = 0
+        self.resident_bytes: int = None
 
     def load(self) -> Any:
         """
         Load the model and return the model object if not already loaded.
+        Concurrent callers wait for a single load instead of loading the model once each.
         :return: The loaded model object.
         """
         if self._model is None:
-            self._model = self._load_model()
+            with self._load_lock:
+                if self._model is None:
+                    started_at: float = time.perf_counter()
+                    model = self._load_model()
+                    if model is not None:
+                        self.load_seconds = time.perf_counter() - started_at
+                        self.load_count += 1
+                        self.resident_bytes = self._get_resident_bytes(model)
+                    self._model = model
         return self._model
 
+    def unload(self) -> bool:
+        """
+        Drop the cached model so that its memory can be reclaimed.
+        Callers must make sure no inference is running on the model.
+        :return: True if a loaded model was dropped, False if none was loaded.
+        """
+        with self._load_lock:
+            if self._model is None:
+                return False
+            self._model = None
+            self._unload_model()
+        gc.collect()
+        return True
+
+    @property
+    def is_loaded(self) -> bool:
+        """
+        Whether the model has been loaded.
+        """
+        return self._model is not None
+
+    def estimate_resident_bytes(self) -> int:
+        """
+        Estimate the memory the model takes when loaded.
+        The size measured at the last load is used if there is one, otherwise the size of the model files on disk.
+        :return: The estimated size in bytes.
+        """
+        if self.resident_bytes is not None:
+            return self.resident_bytes
+        model_path = Path(self.model_name_or_path)
+        if model_path.is_file():
+            return model_path.stat().st_size
+        if model_path.is_dir():
+            return self._get_directory_bytes(model_path)
+        return 0
+
     @abstractmethod
     def _load_model(self) -> Any:
         """
         This method should be implemented by subclasses to define how the model is loaded.
         :return: The loaded model object.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def _unload_model(self) -> None:
+        """
+        Release resources loaded alongside the model, subclasses override this if they hold any.
+        """
+        pass
+
+    @staticmethod
+    def _get_resident_bytes(model: Any) -> int:
+        """
+        Get the size of the tensors in the state of a loaded torch model, including the packed weights of quantized layers.
+        :param model: The loaded model object.
+        :return: The size in bytes, 0 if the model is not a torch module.
+        """
+        if not hasattr(model, "state_dict"):
+            return 0
+        pending = list(model.state_dict(keep_vars=True).values())
+        seen = set()
+        resident_bytes: int = 0
+        while pending:
+            value = pending.pop()
+            if isinstance(value, (list, tuple)):
+                pending.extend(value)
+                continue
+            if not hasattr(value, "numel") or not hasattr(value, "element_size") or id(value) in seen:
+                continue
+            seen.add(id(value))
+            resident_bytes += value.numel() * value.element_size()
+        return resident_bytes
+
+    @staticmethod
+    def _get_directory_bytes(directory: Path) -> int:
+        """
+        Get the size of the model files in a directory, skipping hidden entries such as cached conversions.
+        :param directory: The model directory.
+        :return: The size in bytes.
+        """
+        return sum(
+            path.stat().st_size for path in directory.rglob("*")
+            if path.is_file() and not any(part.startswith(".") for part in path.relative_to(directory).parts)
+        )
\ No newline at end of file
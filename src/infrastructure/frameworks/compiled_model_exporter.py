@@ -0,0 +1,458 @@
+from pathlib import Path
+from src.infrastructure.frameworks.compiled_sequence_tagger import CompiledSequenceTagger
+from src.infrastructure.frameworks.mt5_onnx_generator import MT5ONNXGenerator
+from src.infrastructure.frameworks.sequence_tagger_decoder import SequenceTaggerDecoder
+from src.infrastructure.frameworks.sequence_tagger_inference_maker import SequenceTaggerInferenceMaker
+from src.infrastructure.frameworks.sequence_tagger_onnx_loader import SequenceTaggerONNXLoader
+from src.infrastructure.frameworks.sequence_tagger_torchscript_loader import SequenceTaggerTorchScriptLoader
+from torch import nn
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
+from typing import Any, Dict, List, Optional, Tuple
+
+import json
+import torch
+
+# the exporter runs offline and needs torch, flair and transformers, the API only imports the runtime modules
+ONNX_OPSET_VERSION = 14
+
+
+class WordEmbeddingNetwork(nn.Module):
+    """
+    The lookup of Flair WordEmbeddings with its optional layer norm, the word indices are computed outside the network.
+    """
+
+    def __init__(self, embedding: nn.Embedding, layer_norm: Optional[nn.Module]):
+        super().__init__()
+        self.embedding = embedding
+        self.layer_norm = layer_norm
+
+    def forward(self, word_indices: torch.Tensor) -> torch.Tensor:
+        embeddings = self.embedding(word_indices)
+        if self.layer_norm is not None:
+            embeddings = self.layer_norm(embeddings)
+        return embeddings
+
+
+class CharLanguageModelNetwork(nn.Module):
+    """
+    The character language model of Flair FlairEmbeddings, returning its hidden state at the position of every token.
+    Running the whole padded string at once equals Flair's chunked run, which carries the hidden state across chunks.
+    """
+
+    def __init__(self, language_model: nn.Module):
+        super().__init__()
+        self.encoder = language_model.encoder
+        self.rnn = language_model.rnn
+        self.proj = language_model.proj
+
+    def forward(self, char_indices: torch.Tensor, token_positions: torch.Tensor) -> torch.Tensor:
+        output, _ = self.rnn(self.encoder(char_indices))
+        if self.proj is not None:
+            output = self.proj(output)
+        output = output.transpose(0, 1)
+        return torch.gather(output, 1, token_positions.unsqueeze(2).expand(-1, -1, output.size(2)))
+
+
+class SequenceTaggerNetwork(nn.Module):
+    """
+    The forward pass of a Flair SequenceTagger up to the emission scores, for word and Flair embeddings.
+    embedding_order lists (0, i) for the i-th word embedding and (1, i) for the i-th language model in stacking order.
+    """
+
+    def __init__(self,
+                 word_embeddings: List[nn.Module],
+                 char_language_models: List[nn.Module],
+                 embedding_order: List[Tuple[int, int]],
+                 embedding2nn: Optional[nn.Module],
+                 rnn: Optional[nn.Module],
+                 linear: nn.Module):
+        super().__init__()
+        self.word_embeddings = nn.ModuleList(word_embeddings)
+        self.char_language_models = nn.ModuleList(char_language_models)
+        self.embedding_order = embedding_order
+        self.embedding2nn = embedding2nn
+        self.rnn = rnn
+        self.linear = linear
+
+    def forward(self,
+                word_indices: List[torch.Tensor],
+                char_indices: List[torch.Tensor],
+                char_positions: List[torch.Tensor],
+                lengths: torch.Tensor) -> torch.Tensor:
+        word_outputs: List[torch.Tensor] = []
+        for index, word_embedding in enumerate(self.word_embeddings):
+            word_outputs.append(word_embedding(word_indices[index]))
+        char_outputs: List[torch.Tensor] = []
+        for index, char_language_model in enumerate(self.char_language_models):
+            char_outputs.append(char_language_model(char_indices[index], char_positions[index]))
+
+        embeddings: List[torch.Tensor] = []
+        for kind, index in self.embedding_order:
+            embeddings.append(word_outputs[index] if kind == 0 else char_outputs[index])
+        sentence_tensor = torch.cat(embeddings, dim=2)
+
+        if self.embedding2nn is not None:
+            sentence_tensor = self.embedding2nn(sentence_tensor)
+        if self.rnn is not None:
+            packed = pack_padded_sequence(sentence_tensor, lengths, batch_first=True, enforce_sorted=False)
+            rnn_output, _ = self.rnn(packed)
+            sentence_tensor, _ = pad_packed_sequence(rnn_output, batch_first=True, total_length=sentence_tensor.size(1))
+        return self.linear(sentence_tensor)
+
+
+class TransformerTaggerNetwork(nn.Module):
+    """
+    The forward pass of a Flair SequenceTagger with transformer word embeddings up to the emission scores.
+    subtoken_weights maps the subtokens to the tokens of every sentence and implements first, last and mean pooling.
+    """
+
+    def __init__(self,
+                 transformer: nn.Module,
+                 layer_indexes: List[int],
+                 layer_mean: bool,
+                 embedding2nn: Optional[nn.Module],
+                 linear: nn.Module):
+        super().__init__()
+        self.transformer = transformer
+        self.layer_indexes = layer_indexes
+        self.layer_mean = layer_mean
+        self.embedding2nn = embedding2nn
+        self.linear = linear
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor, subtoken_weights: torch.Tensor) -> torch.Tensor:
+        hidden_states = self.transformer(input_ids, attention_mask=attention_mask, output_hidden_states=True, return_dict=False)[-1]
+        layers = [hidden_states[layer_index] for layer_index in self.layer_indexes]
+        subtoken_embeddings = torch.stack(layers).mean(dim=0) if self.layer_mean else torch.cat(layers, dim=2)
+        sentence_tensor = torch.bmm(subtoken_weights, subtoken_embeddings)
+        if self.embedding2nn is not None:
+            sentence_tensor = self.embedding2nn(sentence_tensor)
+        return self.linear(sentence_tensor)
+
+
+class MT5EncoderNetwork(nn.Module):
+    """
+    The MT5 encoder, also returning the cross-attention keys and values of every decoder layer,
+    which stay the same for all decoding steps.
+    """
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.encoder = model.get_encoder()
+        self.cross_attentions = nn.ModuleList([block.layer[1].EncDecAttention for block in model.get_decoder().block])
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> Tuple[torch.Tensor, ...]:
+        encoder_hidden_states = self.encoder(input_ids=input_ids, attention_mask=attention_mask, return_dict=False)[0]
+        batch_size = encoder_hidden_states.size(0)
+        outputs = [encoder_hidden_states]
+        for attention in self.cross_attentions:
+            for projection in (attention.k, attention.v):
+                outputs.append(projection(encoder_hidden_states)
+                               .view(batch_size, -1, attention.n_heads, attention.key_value_proj_dim)
+                               .transpose(1, 2))
+        return tuple(outputs)
+
+
+class MT5DecoderNetwork(nn.Module):
+    """
+    One MT5 decoding step with past key/values: per layer the self-attention keys and values of the previous steps
+    and the cross-attention keys and values from MT5EncoderNetwork. Returns the logits of the next token and the
+    self-attention keys and values including this step.
+    """
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.decoder = model.get_decoder()
+        self.lm_head = model.lm_head
+        self.num_layers = model.config.num_decoder_layers
+        self.output_scale = model.model_dim ** -0.5 if model.config.tie_word_embeddings else 1.0
+
+    def forward(self,
+                decoder_input_ids: torch.Tensor,
+                encoder_hidden_states: torch.Tensor,
+                encoder_attention_mask: torch.Tensor,
+                *past_keys_values: torch.Tensor) -> Tuple[torch.Tensor, ...]:
+        past = tuple(tuple(past_keys_values[4 * layer: 4 * layer + 4]) for layer in range(self.num_layers))
+        sequence_output, presents = self.decoder(input_ids=decoder_input_ids,
+                                                 encoder_hidden_states=encoder_hidden_states,
+                                                 encoder_attention_mask=encoder_attention_mask,
+                                                 past_key_values=past,
+                                                 use_cache=True,
+                                                 return_dict=False)[:2]
+        if self.output_scale != 1.0:
+            sequence_output = sequence_output * self.output_scale
+        outputs = [self.lm_head(sequence_output)]
+        for present in presents:
+            outputs.extend(present[:2])
+        return tuple(outputs)
+
+
+def export_torchscript_tagger(tagger: Any, output_directory: Path) -> None:
+    """
+    Script a Flair SequenceTagger with word and Flair embeddings (e.g. BiLSTM-CRF) and save it with its decoder
+    and the vocabularies needed to compute its inputs.
+    :param tagger: The loaded fp32 Flair SequenceTagger.
+    :param output_directory: The directory to write model.pt, inputs.json and tagger.json to.
+    """
+    tagger.eval()
+    word_embeddings: List[nn.Module] = list()
+    char_language_models: List[nn.Module] = list()
+    embedding_order: List[Tuple[int, int]] = list()
+    input_specs: List[Dict[str, Any]] = list()
+    for embedding in _get_token_embeddings(tagger):
+        embedding_type: str = type(embedding).__name__
+        if embedding_type == "WordEmbeddings":
+            if embedding.__dict__.get("field") is not None:
+                raise ValueError("WordEmbeddings over a label field are not supported by the TorchScript export")
+            embedding_order.append((0, len(word_embeddings)))
+            word_embeddings.append(WordEmbeddingNetwork(embedding.embedding, getattr(embedding, "layer_norm", None)))
+            input_specs.append({"type": "word", "vocab": dict(embedding.vocab)})
+        elif embedding_type == "FlairEmbeddings":
+            if not embedding.__dict__.get("tokenized_lm", True):
+                raise ValueError("FlairEmbeddings with tokenized_lm=False are not supported by the TorchScript export")
+            chars: Dict[str, int] = {
+                char.decode("utf-8") if isinstance(char, bytes) else char: index
+                for char, index in embedding.lm.dictionary.item2idx.items()
+            }
+            embedding_order.append((1, len(char_language_models)))
+            char_language_models.append(CharLanguageModelNetwork(embedding.lm))
+            input_specs.append({
+                "type": "char_lm",
+                "chars": chars,
+                "padding_index": chars.get(" ", 0),
+                "is_forward_lm": embedding.is_forward_lm,
+                "is_lower": embedding.__dict__.get("is_lower", False),
+                "with_whitespace": embedding.__dict__.get("with_whitespace", True),
+                "start_marker": embedding.lm.__dict__.get("document_delimiter", "\n"),
+                "end_marker": " "
+            })
+        else:
+            raise ValueError(f"{embedding_type} is not supported by the TorchScript export, use the ONNX export for transformer embeddings")
+
+    network = SequenceTaggerNetwork(word_embeddings=word_embeddings,
+                                    char_language_models=char_language_models,
+                                    embedding_order=embedding_order,
+                                    embedding2nn=tagger.embedding2nn if tagger.reproject_embeddings else None,
+                                    rnn=tagger.rnn if tagger.use_rnn else None,
+                                    linear=tagger.linear).eval()
+
+    output_directory.mkdir(parents=True, exist_ok=True)
+    torch.jit.script(network).save(str(output_directory / SequenceTaggerTorchScriptLoader.MODEL_FILE_NAME))
+    with open(output_directory / SequenceTaggerTorchScriptLoader.INPUTS_FILE_NAME, "w", encoding="utf-8") as f:
+        json.dump({"embeddings": input_specs}, f)
+    SequenceTaggerDecoder.from_tagger(tagger).save(output_directory)
+
+
+def export_onnx_tagger(tagger: Any, output_directory: Path) -> None:
+    """
+    Export a Flair SequenceTagger with transformer word embeddings (e.g. GELECTRA) to ONNX and save it with its
+    decoder and tokenizer. Sentences longer than the transformer are truncated, where Flair would stride over them.
+    :param tagger: The loaded fp32 Flair SequenceTagger.
+    :param output_directory: The directory to write model.onnx, inputs.json, tagger.json and the tokenizer to.
+    """
+    tagger.eval()
+    token_embeddings: List[Any] = _get_token_embeddings(tagger)
+    embedding: Any = token_embeddings[0]
+    if len(token_embeddings) != 1 or type(embedding).__name__ != "TransformerWordEmbeddings":
+        raise ValueError("The ONNX export supports taggers with a single TransformerWordEmbeddings, use the TorchScript export otherwise")
+    if tagger.use_rnn:
+        raise ValueError("The ONNX export does not support taggers with an RNN, use the TorchScript export")
+    if getattr(embedding, "context_length", 0):
+        raise ValueError("The ONNX export does not support transformer embeddings with use_context")
+    if embedding.subtoken_pooling not in ["first", "last", "mean"]:
+        raise ValueError(f"The ONNX export does not support subtoken pooling {embedding.subtoken_pooling}")
+
+    network = TransformerTaggerNetwork(transformer=embedding.model,
+                                       layer_indexes=list(embedding.layer_indexes),
+                                       layer_mean=embedding.layer_mean,
+                                       embedding2nn=tagger.embedding2nn if tagger.reproject_embeddings else None,
+                                       linear=tagger.linear).eval()
+
+    encoding = embedding.tokenizer("Ein Beispiel", return_tensors="pt")
+    subtoken_weights = torch.zeros((1, 2, encoding["input_ids"].size(1)), dtype=torch.float)
+    subtoken_weights[0, 0, 1] = 1.0
+    subtoken_weights[0, 1, 2] = 1.0
+
+    output_directory.mkdir(parents=True, exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(network,
+                          (encoding["input_ids"], encoding["attention_mask"], subtoken_weights),
+                          str(output_directory / SequenceTaggerONNXLoader.MODEL_FILE_NAME),
+                          input_names=["input_ids", "attention_mask", "subtoken_weights"],
+                          output_names=["emissions"],
+                          dynamic_axes={"input_ids": {0: "batch", 1: "subtokens"},
+                                        "attention_mask": {0: "batch", 1: "subtokens"},
+                                        "subtoken_weights": {0: "batch", 1: "tokens", 2: "subtokens"},
+                                        "emissions": {0: "batch", 1: "tokens"}},
+                          opset_version=ONNX_OPSET_VERSION,
+                          do_constant_folding=True)
+    embedding.tokenizer.save_pretrained(str(output_directory))
+    with open(output_directory / SequenceTaggerONNXLoader.INPUTS_FILE_NAME, "w", encoding="utf-8") as f:
+        json.dump({"subtoken_pooling": embedding.subtoken_pooling,
+                   "max_length": embedding.tokenizer.model_max_length if embedding.truncate else None}, f)
+    SequenceTaggerDecoder.from_tagger(tagger).save(output_directory)
+
+
+def export_onnx_mt5(model: Any, tokenizer: Any, output_directory: Path) -> None:
+    """
+    Export a MT5ForConditionalGeneration model to an ONNX encoder and an ONNX decoder step with past key/values,
+    each in its own directory as their weights exceed the 2GB protobuf limit and are stored as external data.
+    :param model: The loaded fp32 MT5ForConditionalGeneration model.
+    :param tokenizer: Its tokenizer, saved next to the graphs.
+    :param output_directory: The directory to write the graphs, generation.json and the tokenizer to.
+    """
+    model.eval()
+    config = model.config
+    encoder_path: Path = output_directory / MT5ONNXGenerator.ENCODER_FILE_NAME
+    decoder_path: Path = output_directory / MT5ONNXGenerator.DECODER_FILE_NAME
+    encoder_path.parent.mkdir(parents=True, exist_ok=True)
+    decoder_path.parent.mkdir(parents=True, exist_ok=True)
+
+    encoding = tokenizer(["Ein Beispiel"], return_tensors="pt")
+    encoder_network = MT5EncoderNetwork(model).eval()
+    cross_names: List[str] = [f"cross_{kind}_{layer}" for layer in range(config.num_decoder_layers) for kind in ("key", "value")]
+    with torch.no_grad():
+        encoder_outputs = encoder_network(encoding["input_ids"], encoding["attention_mask"])
+        torch.onnx.export(encoder_network,
+                          (encoding["input_ids"], encoding["attention_mask"]),
+                          str(encoder_path),
+                          input_names=["input_ids", "attention_mask"],
+                          output_names=["encoder_hidden_states"] + cross_names,
+                          dynamic_axes={"input_ids": {0: "batch", 1: "encoder_sequence"},
+                                        "attention_mask": {0: "batch", 1: "encoder_sequence"},
+                                        "encoder_hidden_states": {0: "batch", 1: "encoder_sequence"},
+                                        **{name: {0: "batch", 2: "encoder_sequence"} for name in cross_names}},
+                          opset_version=ONNX_OPSET_VERSION,
+                          do_constant_folding=True)
+
+        # trace the decoder with one past step, the past length is a dynamic axis and starts at 0 when generating
+        decoder_network = MT5DecoderNetwork(model).eval()
+        decoder_input_ids = torch.full((1, 1), config.decoder_start_token_id, dtype=torch.long)
+        past_keys_values: List[torch.Tensor] = list()
+        input_names: List[str] = ["decoder_input_ids", "encoder_hidden_states", "encoder_attention_mask"]
+        dynamic_axes: Dict[str, Dict[int, str]] = {"decoder_input_ids": {0: "batch"},
+                                                   "encoder_hidden_states": {0: "batch", 1: "encoder_sequence"},
+                                                   "encoder_attention_mask": {0: "batch", 1: "encoder_sequence"},
+                                                   "logits": {0: "batch"}}
+        output_names: List[str] = ["logits"]
+        for layer in range(config.num_decoder_layers):
+            past_keys_values.extend([torch.zeros((1, config.num_heads, 1, config.d_kv), dtype=torch.float)] * 2)
+            past_keys_values.extend(encoder_outputs[1 + 2 * layer: 3 + 2 * layer])
+            input_names.extend([f"past_key_{layer}", f"past_value_{layer}", f"cross_key_{layer}", f"cross_value_{layer}"])
+            output_names.extend([f"present_key_{layer}", f"present_value_{layer}"])
+            dynamic_axes.update({f"past_key_{layer}": {0: "batch", 2: "past_sequence"},
+                                 f"past_value_{layer}": {0: "batch", 2: "past_sequence"},
+                                 f"cross_key_{layer}": {0: "batch", 2: "encoder_sequence"},
+                                 f"cross_value_{layer}": {0: "batch", 2: "encoder_sequence"},
+                                 f"present_key_{layer}": {0: "batch", 2: "present_sequence"},
+                                 f"present_value_{layer}": {0: "batch", 2: "present_sequence"}})
+        torch.onnx.export(decoder_network,
+                          (decoder_input_ids, encoder_outputs[0], encoding["attention_mask"], *past_keys_values),
+                          str(decoder_path),
+                          input_names=input_names,
+                          output_names=output_names,
+                          dynamic_axes=dynamic_axes,
+                          opset_version=ONNX_OPSET_VERSION,
+                          do_constant_folding=True)
+
+    tokenizer.save_pretrained(str(output_directory))
+    with open(output_directory / MT5ONNXGenerator.CONFIG_FILE_NAME, "w", encoding="utf-8") as f:
+        json.dump({"decoder_start_token_id": config.decoder_start_token_id,
+                   "eos_token_id": config.eos_token_id,
+                   "pad_token_id": config.pad_token_id,
+                   "num_layers": config.num_decoder_layers,
+                   "num_heads": config.num_heads,
+                   "d_kv": config.d_kv}, f)
+
+
+def check_tagger_parity(tagger: Any,
+                        compiled_tagger: CompiledSequenceTagger,
+                        sentence_keys: List[Tuple[str, ...]],
+                        mini_batch_size: int = 32) -> Dict[str, Any]:
+    """
+    Compare a compiled tagger with the eager Flair tagger it was exported from.
+    Emission scores are compared sentence by sentence, labels both per sentence and in padded mini-batches.
+    :param tagger: The eager fp32 Flair SequenceTagger.
+    :param compiled_tagger: The loaded TorchScriptSequenceTagger or ONNXSequenceTagger.
+    :param sentence_keys: The token texts of the sentences to compare on.
+    :param mini_batch_size: The mini-batch size of the batched comparison.
+    :return: The number of sentences, the largest absolute emission difference and the label mismatches.
+    """
+    from flair.data import Sentence
+
+    captured: List[torch.Tensor] = list()
+    hook = tagger.linear.register_forward_hook(lambda module, inputs, output: captured.append(output.detach()))
+    max_emission_difference: float = 0.0
+    eager_labels: List[set] = list()
+    try:
+        with torch.no_grad():
+            for sentence_key in sentence_keys:
+                captured.clear()
+                sentence = Sentence(list(sentence_key))
+                tagger.predict(sentence)
+                eager_emissions = captured[-1][0].float().numpy()
+                compiled_emissions = compiled_tagger.get_emissions([sentence_key])[0]
+                max_emission_difference = max(max_emission_difference, float(abs(eager_emissions - compiled_emissions).max()))
+                eager_labels.append({
+                    (label.value,) + SequenceTaggerInferenceMaker._get_token_indices(label) for label in sentence.get_labels()
+                })
+    finally:
+        hook.remove()
+
+    single_labels = [set(compiled_tagger.predict([sentence_key])[0]) for sentence_key in sentence_keys]
+    batched_labels = [set(labels) for labels in compiled_tagger.predict(sentence_keys, mini_batch_size=mini_batch_size)]
+    return {
+        "sentences": len(sentence_keys),
+        "max_abs_emission_difference": max_emission_difference,
+        "label_mismatches": sum(eager != single for eager, single in zip(eager_labels, single_labels)),
+        "batched_label_mismatches": sum(eager != batched for eager, batched in zip(eager_labels, batched_labels))
+    }
+
+
+def check_mt5_parity(model: Any,
+                     tokenizer: Any,
+                     generator: MT5ONNXGenerator,
+                     texts: List[str],
+                     max_length: int = 512) -> Dict[str, Any]:
+    """
+    Compare the ONNX MT5 generator with the eager model it was exported from, decoding greedily.
+    :param model: The eager fp32 MT5ForConditionalGeneration model.
+    :param tokenizer: Its tokenizer.
+    :param generator: The loaded MT5ONNXGenerator.
+    :param texts: The input texts to compare on.
+    :param max_length: The maximum input and output length.
+    :return: The number of texts, the largest absolute encoder state difference and the differing outputs.
+    """
+    max_encoder_difference: float = 0.0
+    output_mismatches: int = 0
+    for text in texts:
+        encoding = tokenizer([text], max_length=max_length, truncation=True, return_tensors="pt")
+        with torch.no_grad():
+            eager_states = model.get_encoder()(**encoding, return_dict=False)[0].numpy()
+            eager_ids = model.generate(**encoding, max_length=max_length, do_sample=False)
+        compiled_states = generator.encoder.run(["encoder_hidden_states"], {
+            "input_ids": encoding["input_ids"].numpy(),
+            "attention_mask": encoding["attention_mask"].numpy()
+        })[0]
+        compiled_ids = generator.generate(encoding["input_ids"].numpy(), encoding["attention_mask"].numpy(),
+                                          max_length=max_length, do_sample=False)
+        max_encoder_difference = max(max_encoder_difference, float(abs(eager_states - compiled_states).max()))
+        eager_text = tokenizer.batch_decode(eager_ids, skip_special_tokens=True)[0]
+        compiled_text = tokenizer.batch_decode(compiled_ids, skip_special_tokens=True)[0]
+        output_mismatches += eager_text != compiled_text
+    return {
+        "texts": len(texts),
+        "max_abs_encoder_difference": max_encoder_difference,
+        "output_mismatches": output_mismatches
+    }
+
+
+def _get_token_embeddings(tagger: Any) -> List[Any]:
+    """
+    Get the token embeddings of a tagger in stacking order.
+    :param tagger: The Flair SequenceTagger.
+    :return: The embeddings stacked by a StackedEmbeddings, or the single embedding of the tagger.
+    """
+    embeddings = tagger.embeddings
+    if type(embeddings).__name__ == "StackedEmbeddings":
+        return list(embeddings.embeddings)
+    return [embeddings]
\ No newline at end of file
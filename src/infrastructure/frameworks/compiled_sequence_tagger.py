@@ -0,0 +1,52 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from src.infrastructure.frameworks.sequence_tagger_decoder import SentenceLabels, SequenceTaggerDecoder
+from src.utils import timed_stage
+from typing import TYPE_CHECKING, List, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+class CompiledSequenceTagger(ABC):
+    """
+    A SequenceTagger network compiled for a CPU runtime (TorchScript or ONNX Runtime), together with its decoder.
+    Subclasses turn tokenized sentences into the inputs of their runtime and return the emission scores.
+    """
+
+    def __init__(self, decoder: SequenceTaggerDecoder):
+        """
+        :param decoder: The decoder turning emission scores into labels.
+        """
+        self.decoder = decoder
+
+    def predict(self, sentence_keys: List[Tuple[str, ...]], mini_batch_size: int = 32) -> List[SentenceLabels]:
+        """
+        Predict the labels of tokenized sentences, sorted by length so that mini-batches need little padding.
+        :param sentence_keys: The token texts of every sentence.
+        :param mini_batch_size: The number of sentences per forward pass.
+        :return: The labels of every sentence, in the order of sentence_keys.
+        """
+        sentence_labels: List[SentenceLabels] = [tuple() for _ in sentence_keys]
+        sorted_indices: List[int] = sorted(
+            (index for index, sentence_key in enumerate(sentence_keys) if sentence_key),
+            key=lambda index: len(sentence_keys[index]),
+            reverse=True
+        )
+        mini_batch_size = max(mini_batch_size, 1)
+        for start in range(0, len(sorted_indices), mini_batch_size):
+            batch: List[int] = sorted_indices[start: start + mini_batch_size]
+            with timed_stage("model_forward"):
+                emissions_per_sentence: List[np.ndarray] = self.get_emissions([sentence_keys[index] for index in batch])
+            with timed_stage("decode"):
+                for index, emissions in zip(batch, emissions_per_sentence):
+                    sentence_labels[index] = self.decoder.decode(emissions)
+        return sentence_labels
+
+    @abstractmethod
+    def get_emissions(self, sentence_keys: List[Tuple[str, ...]]) -> List[np.ndarray]:
+        """
+        Run the compiled network on a mini-batch of tokenized sentences.
+        :param sentence_keys: The token texts of every sentence, none of them empty.
+        :return: The emission scores of every sentence with shape (number of tokens, number of tags).
+        """
+        pass
\ No newline at end of file
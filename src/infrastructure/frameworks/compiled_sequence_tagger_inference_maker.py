@@ -0,0 +1,34 @@
+from src.domain.entity_span import EntitySpan
+from src.infrastructure.frameworks.sequence_tagger_decoder import SentenceLabels
+from src.infrastructure.frameworks.sequence_tagger_inference_maker import SequenceTaggerInferenceMaker
+from typing import List, Tuple
+
+class CompiledSequenceTaggerInferenceMaker(SequenceTaggerInferenceMaker):
+    """
+    This class implements the infer method with a SequenceTagger compiled to TorchScript or ONNX.
+    Tokenization, the sentence cache and the offset mapping are those of the eager SequenceTaggerInferenceMaker,
+    only the labels are predicted by the CompiledSequenceTagger returned from the model loader,
+    a SequenceTaggerTorchScriptLoader or a SequenceTaggerONNXLoader.
+    """
+
+    def infer_batch(self, input_texts: List[str], **kwargs) -> List[List[EntitySpan]]:
+        """
+        Make inference for a batch of input texts using the compiled SequenceTagger.
+        Compiled taggers do not build Flair Sentence objects, so the result are the entity spans of every input text.
+        :param input_texts: The input texts for which inference is to be made.
+        :param **kwargs: Additional keyword arguments for inference.
+                         mini_batch_size sets the number of sentences per forward pass (defaults to 32).
+        :return: The detected entities as a list of EntitySpan for every input text.
+        """
+        return self.infer_entity_spans(input_texts, **kwargs)
+
+    def _predict_labels(self, sentence_keys: List[Tuple[str, ...]], **kwargs) -> List[SentenceLabels]:
+        """
+        Predict the labels of tokenized sentences with the compiled SequenceTagger.
+        :param sentence_keys: The token texts of every sentence.
+        :param **kwargs: Additional keyword arguments for inference, see infer_batch.
+        :return: The labels of every sentence, in the order of sentence_keys.
+        """
+        if not sentence_keys:
+            return []
+        return self.model_loader.load().predict(sentence_keys, mini_batch_size=kwargs.get("mini_batch_size", 32))
\ No newline at end of file
@@ -0,0 +1,335 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Hashable, List, Tuple, Union
+
+import json
+import pickle
+import struct
+import time
+
+if TYPE_CHECKING:
+    import torch
+
+
+class MappedModelArtifact:
+    """
+    A model stored for memory-mapped loading, written by scripts/convert_mapped_models.py.
+    The weights are kept in one file of the safetensors format, which the loader maps into memory instead of reading it:
+    tensors are views into the mapped file, pages are only read on first access and processes mapping the same file
+    share its pages through the page cache. A manifest describes the artifact. Models without a configuration to
+    rebuild them from, like Flair taggers, are stored with a skeleton: the pickled model in which every tensor of the
+    weights file is replaced by a reference to it.
+    """
+    DIRECTORY_NAME = "mapped"
+    TENSORS_FILE_NAME = "model.safetensors"
+    SKELETON_FILE_NAME = "skeleton.pkl"
+    MANIFEST_FILE_NAME = "manifest.json"
+    FORMAT_VERSION = 1
+    # the data section starts at this alignment, the tensors are ordered so that each of them is aligned to its dtype
+    ALIGNMENT = 64
+    DTYPE_NAMES: Dict[str, str] = {
+        "float64": "F64", "float32": "F32", "float16": "F16", "bfloat16": "BF16",
+        "int64": "I64", "int32": "I32", "int16": "I16", "int8": "I8", "uint8": "U8", "bool": "BOOL"
+    }
+
+    @classmethod
+    def save_module(cls, module: Any, directory: Union[str, Path], model_impl: str) -> Dict[str, Any]:
+        """
+        Store a model as its weights and the skeleton referencing them.
+        :param module: The loaded torch model.
+        :param directory: The directory of the artifact.
+        :param model_impl: The model_impl type of the model, recorded in the manifest.
+        :return: The manifest.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        tensors, aliases = cls._collect_tensors(module)
+        names_by_key: Dict[Hashable, str] = {cls._get_tensor_key(tensor): name for name, tensor in tensors.items()}
+        temporary_path: Path = directory / f"{cls.SKELETON_FILE_NAME}.tmp"
+        with open(temporary_path, "wb") as f:
+            _SkeletonPickler(f, names_by_key).dump(module)
+        temporary_path.replace(directory / cls.SKELETON_FILE_NAME)
+        return cls._save(directory, tensors, aliases, model_impl, cls.SKELETON_FILE_NAME)
+
+    @classmethod
+    def load_module(cls, directory: Union[str, Path], model_impl: str) -> Any:
+        """
+        Load a model stored with save_module, its weights mapped from the weights file.
+        :param directory: The directory of the artifact.
+        :param model_impl: The expected model_impl type of the model.
+        :return: The model object.
+        """
+        directory = Path(directory)
+        manifest: Dict[str, Any] = cls.load_manifest(directory, model_impl)
+        tensors: Dict[str, torch.Tensor] = cls.map_tensors(directory / manifest["tensors_file"])
+        with open(directory / manifest["skeleton_file"], "rb") as f:
+            return _SkeletonUnpickler(f, tensors).load()
+
+    @classmethod
+    def save_state_dict(cls, module: Any, directory: Union[str, Path], model_impl: str) -> Dict[str, Any]:
+        """
+        Store the weights of a model which is rebuilt from its configuration, e.g. a transformers model.
+        :param module: The loaded torch model.
+        :param directory: The directory of the artifact, the caller stores the configuration next to the weights.
+        :param model_impl: The model_impl type of the model, recorded in the manifest.
+        :return: The manifest.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        tensors, aliases = cls._collect_tensors(module)
+        return cls._save(directory, tensors, aliases, model_impl, None)
+
+    @classmethod
+    def load_state_dict(cls, directory: Union[str, Path], model_impl: str) -> Dict[str, torch.Tensor]:
+        """
+        Map the weights stored with save_state_dict, tensors shared in the model are shared again.
+        :param directory: The directory of the artifact.
+        :param model_impl: The expected model_impl type of the model.
+        :return: The state dict of the model, to be loaded with assign=True to keep the mapped tensors.
+        """
+        directory = Path(directory)
+        manifest: Dict[str, Any] = cls.load_manifest(directory, model_impl)
+        tensors: Dict[str, torch.Tensor] = cls.map_tensors(directory / manifest["tensors_file"])
+        for alias, name in manifest["aliases"].items():
+            tensors[alias] = tensors[name]
+        return tensors
+
+    @classmethod
+    def load_manifest(cls, directory: Union[str, Path], model_impl: str) -> Dict[str, Any]:
+        """
+        Read the manifest of an artifact and check that it can be loaded.
+        :param directory: The directory of the artifact.
+        :param model_impl: The expected model_impl type of the model.
+        :return: The manifest.
+        """
+        with open(Path(directory) / cls.MANIFEST_FILE_NAME, encoding="utf-8") as f:
+            manifest: Dict[str, Any] = json.load(f)
+        if manifest["format_version"] != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported mapped artifact format version {manifest['format_version']} in {directory}")
+        if manifest["model_impl"] != model_impl:
+            raise ValueError(f"The mapped artifact in {directory} holds a {manifest['model_impl']} model, not a {model_impl} model")
+        return manifest
+
+    @classmethod
+    def write_tensors(cls, tensors: Dict[str, torch.Tensor], path: Union[str, Path]) -> int:
+        """
+        Write tensors to a file of the safetensors format: the length of the JSON header as 8 bytes little endian,
+        the header with the dtype, shape and data offsets of every tensor, then the raw data of the tensors.
+        :param tensors: The tensors by name.
+        :param path: The path of the file.
+        :return: The size of the tensor data in bytes.
+        """
+        import torch
+
+        entries: List[Tuple[str, torch.Tensor]] = sorted(tensors.items(), key=lambda item: (-item[1].element_size(), item[0]))
+        header: Dict[str, Any] = dict()
+        offset: int = 0
+        for name, tensor in entries:
+            nbytes: int = tensor.numel() * tensor.element_size()
+            header[name] = {"dtype": cls.DTYPE_NAMES[str(tensor.dtype).replace("torch.", "")],
+                            "shape": list(tensor.shape),
+                            "data_offsets": [offset, offset + nbytes]}
+            offset += nbytes
+        header_bytes: bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        # the format allows trailing spaces in the header, they align the start of the data
+        header_bytes += b" " * (-(8 + len(header_bytes)) % cls.ALIGNMENT)
+
+        path = Path(path)
+        temporary_path: Path = path.with_name(f"{path.name}.tmp")
+        with open(temporary_path, "wb") as f:
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            for _, tensor in entries:
+                cls._write_tensor_data(f, tensor)
+        temporary_path.replace(path)
+        return offset
+
+    @classmethod
+    def map_tensors(cls, path: Union[str, Path]) -> Dict[str, torch.Tensor]:
+        """
+        Map a file of the safetensors format into memory and return its tensors as views into the mapping.
+        The mapping is private, so a write to a tensor copies the written page instead of changing the file.
+        Tensors not aligned to their dtype, which other writers may produce, are copied instead.
+        :param path: The path of the file.
+        :return: The tensors by name.
+        """
+        import torch
+
+        path = Path(path)
+        with open(path, "rb") as f:
+            header_length: int = struct.unpack("<Q", f.read(8))[0]
+            header: Dict[str, Any] = json.loads(f.read(header_length))
+        data_start: int = 8 + header_length
+        storage = torch.UntypedStorage.from_file(str(path), shared=False, nbytes=path.stat().st_size)
+        dtypes: Dict[str, torch.dtype] = {name: getattr(torch, dtype) for dtype, name in cls.DTYPE_NAMES.items()}
+
+        tensors: Dict[str, torch.Tensor] = dict()
+        for name, entry in header.items():
+            if name == "__metadata__":
+                continue
+            dtype: torch.dtype = dtypes[entry["dtype"]]
+            shape: List[int] = entry["shape"]
+            begin, end = entry["data_offsets"]
+            tensor = torch.empty((0,), dtype=dtype)
+            element_size: int = tensor.element_size()
+            if (data_start + begin) % element_size == 0:
+                tensors[name] = tensor.set_(storage, (data_start + begin) // element_size, shape, cls._get_contiguous_strides(shape))
+            else:
+                data = torch.empty((0,), dtype=torch.uint8).set_(storage, data_start + begin, [end - begin], [1])
+                tensors[name] = data.clone().view(dtype).reshape(shape)
+        return tensors
+
+    @classmethod
+    def _save(cls,
+              directory: Path,
+              tensors: Dict[str, torch.Tensor],
+              aliases: Dict[str, str],
+              model_impl: str,
+              skeleton_file: str) -> Dict[str, Any]:
+        """
+        Write the weights file and then the manifest, whose presence marks the artifact complete.
+        :return: The manifest.
+        """
+        import torch
+
+        tensor_bytes: int = cls.write_tensors(tensors, directory / cls.TENSORS_FILE_NAME)
+        manifest: Dict[str, Any] = {
+            "format_version": cls.FORMAT_VERSION,
+            "model_impl": model_impl,
+            "tensors_file": cls.TENSORS_FILE_NAME,
+            "skeleton_file": skeleton_file,
+            "tensor_count": len(tensors),
+            "tensor_bytes": tensor_bytes,
+            "aliases": aliases,
+            "torch_version": torch.__version__,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        }
+        with open(directory / cls.MANIFEST_FILE_NAME, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    @classmethod
+    def _collect_tensors(cls, module: Any) -> Tuple[Dict[str, torch.Tensor], Dict[str, str]]:
+        """
+        Collect the parameters and persistent buffers of a model, storing tensors shared under several names once.
+        :param module: The loaded torch model.
+        :return: The tensors by name and the names of shared tensors mapped to the name they are stored under.
+        """
+        tensors: Dict[str, torch.Tensor] = dict()
+        aliases: Dict[str, str] = dict()
+        names_by_key: Dict[Hashable, str] = dict()
+        for name, tensor in module.state_dict(keep_vars=True).items():
+            key: Hashable = cls._get_tensor_key(tensor)
+            if key in names_by_key:
+                aliases[name] = names_by_key[key]
+                continue
+            names_by_key[key] = name
+            tensors[name] = tensor.detach()
+        return tensors, aliases
+
+    @staticmethod
+    def _get_tensor_key(tensor: torch.Tensor) -> Hashable:
+        """
+        Identify a tensor by the memory it views, so that detached copies referencing the same data are recognized.
+        """
+        return tensor.data_ptr(), tensor.dtype, tuple(tensor.shape), tuple(tensor.stride())
+
+    @staticmethod
+    def _get_contiguous_strides(shape: List[int]) -> List[int]:
+        """
+        Get the strides of a contiguous tensor of the given shape.
+        """
+        strides: List[int] = list()
+        stride: int = 1
+        for size in reversed(shape):
+            strides.insert(0, stride)
+            stride *= size
+        return strides
+
+    @staticmethod
+    def _write_tensor_data(f: BinaryIO, tensor: torch.Tensor) -> None:
+        """
+        Write the raw data of a tensor in row-major order.
+        """
+        import torch
+
+        data = tensor.detach().cpu().contiguous().reshape(-1)
+        if data.numel():
+            f.write(data.view(torch.uint8).numpy().data)
+
+
+def _new_object(cls: type) -> Any:
+    """
+    Create an object of a class without calling its constructor, used by the skeleton.
+    """
+    return cls.__new__(cls)
+
+
+def _set_object_state(obj: Any, state: Dict[str, Any]) -> Any:
+    """
+    Restore the attributes of an object without calling its __setstate__, used by the skeleton.
+    """
+    obj.__dict__.update(state)
+    return obj
+
+
+def _rebuilds_on_unpickle(cls: type) -> bool:
+    """
+    Whether a Flair class customizes its pickling, such as the transformer embeddings and language models, which pickle
+    their weights as a state dict and rebuild themselves on unpickling, reading the transformer from flair_cache_root.
+    """
+    return any(
+        ("__getstate__" in vars(klass) or "__setstate__" in vars(klass)) and klass.__module__.split(".")[0] == "flair"
+        for klass in cls.__mro__
+    )
+
+
+class _SkeletonPickler(pickle.Pickler):
+    """
+    Pickles a model with every tensor of the weights file replaced by a reference to it.
+    Flair modules which rebuild themselves on unpickling are pickled by their attributes as they are, so that loading
+    the skeleton neither rebuilds them nor copies their weights.
+    """
+
+    def __init__(self, file: BinaryIO, names_by_key: Dict[Hashable, str]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._names_by_key = names_by_key
+
+    def persistent_id(self, obj: Any) -> Any:
+        import torch
+
+        if isinstance(obj, torch.Tensor):
+            name: str = self._names_by_key.get(MappedModelArtifact._get_tensor_key(obj))
+            if name is not None:
+                if isinstance(obj, torch.nn.Parameter):
+                    return "parameter", name, obj.requires_grad
+                return "tensor", name
+        return None
+
+    def reducer_override(self, obj: Any) -> Any:
+        import torch
+
+        if isinstance(obj, torch.nn.Module) and _rebuilds_on_unpickle(type(obj)):
+            return _new_object, (type(obj),), dict(obj.__dict__), None, None, _set_object_state
+        return NotImplemented
+
+
+class _SkeletonUnpickler(pickle.Unpickler):
+    """
+    Unpickles a skeleton, resolving the tensor references to the mapped tensors.
+    """
+
+    def __init__(self, file: BinaryIO, tensors: Dict[str, torch.Tensor]):
+        super().__init__(file)
+        self._tensors = tensors
+        self._parameters: Dict[str, torch.nn.Parameter] = dict()
+
+    def persistent_load(self, pid: Any) -> Any:
+        import torch
+
+        if pid[0] == "parameter":
+            # a parameter referenced several times, e.g. by an LSTM's flat weights, stays a single object
+            if pid[1] not in self._parameters:
+                self._parameters[pid[1]] = torch.nn.Parameter(self._tensors[pid[1]], requires_grad=pid[2])
+            return self._parameters[pid[1]]
+        return self._tensors[pid[1]]
\ No newline at end of file
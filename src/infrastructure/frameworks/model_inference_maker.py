@@ -1,14 +1,16 @@
 from abc import ABC, abstractmethod
 
 from src.infrastructure.frameworks.model_loader import ModelLoader
-from typing import Any
+from typing import Any, List
 
 class ModelInferenceMaker(ABC):
     """
     Interface for model inference makers.
     This interface defines the contract for making inferences using loaded models.
     Each inference maker should implement the infer method to return the inference result.
+    Inference makers whose results depend only on the input text set deterministic to True, which allows caching them.
     """
+    deterministic: bool = False
 
     def __init__(self, model_loader: ModelLoader):
         """
@@ -24,4 +26,24 @@ class ModelInferenceMaker(ABC):
         :param **kwargs: Additional keyword arguments for inference.
         :return: The inference result.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def infer_batch(self, input_texts: List[str], **kwargs) -> List[Any]:
+        """
+        Make inference for a batch of input texts using the loaded model.
+        Implementations that can share a forward pass across inputs should override this method,
+        the default falls back to calling infer for every input text.
+        :param input_texts: The input texts for which inference is to be made.
+        :param **kwargs: Additional keyword arguments for inference.
+        :return: The inference results, one per input text and in the same order.
+        """
+        return [self.infer(input_text, **kwargs) for input_text in input_texts]
+
+    def warm_up(self, sample_texts: List[str]) -> None:
+        """
+        Run a throwaway inference so that allocator and kernel caches are primed before the first request.
+        Implementations whose serving path differs from infer_batch should override this method.
+        :param sample_texts: The sample texts to make inference for.
+        """
+        if sample_texts:
+            self.infer_batch(sample_texts)
\ No newline at end of file
@@ -0,0 +1,149 @@
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, ContextManager, List, Optional, Union
+
+import hashlib
+
+
+class ModelPrecision:
+    """
+    Inference precision of a model on CPU.
+    fp32 keeps the model as loaded, int8 applies dynamic quantization to its Linear and LSTM layers at load time
+    and bf16 keeps fp32 weights but runs the forward passes under bfloat16 autocast.
+    The quantized weights of models which can be rebuilt from their configuration are cached on disk next to the source
+    weights as a state dict, so later loads skip reading the fp32 weights and assign the cached ones to a quantized
+    skeleton instead.
+    """
+    FP32 = "fp32"
+    INT8 = "int8"
+    BF16 = "bf16"
+    MODES: List[str] = [FP32, INT8, BF16]
+
+    def __init__(self,
+                 mode: str = FP32,
+                 source_path: Optional[Union[str, Path]] = None,
+                 cache_dir: Optional[Union[str, Path]] = None,
+                 loading_strategy: str = "local_disk_storage"):
+        """
+        :param mode: The precision mode, one of fp32, int8 and bf16.
+        :param source_path: The path of the source weights, used to key and place the cached conversion.
+        :param cache_dir: The directory of the cached conversions, defaults to .precision_cache in the source path.
+        :param loading_strategy: The loading strategy of the fp32 model, which builds a different module per strategy.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported precision mode: {mode}, supported values: {self.MODES}")
+        self.mode = mode
+        self.loading_strategy = loading_strategy
+        # whether the last load served the cached conversion
+        self.cache_hit: bool = False
+        self._source_path: Optional[Path] = Path(source_path) if source_path else None
+        if cache_dir:
+            self._cache_dir: Optional[Path] = Path(cache_dir)
+        elif self._source_path is not None:
+            self._cache_dir = (self._source_path if self._source_path.is_dir() else self._source_path.parent) / ".precision_cache"
+        else:
+            self._cache_dir = None
+
+    def load(self, load_fp32_model: Callable[[], Any], build_fp32_skeleton: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Load a model in this precision, reusing the cached conversion if there is one.
+        For int8 a cache hit quantizes an empty skeleton of the model and assigns the cached weights to it, so neither
+        the fp32 weights are read nor the model is initialized. Models without a skeleton are converted on every load.
+        :param load_fp32_model: Loads the model as stored, in fp32.
+        :param build_fp32_skeleton: Builds the model on the meta device without weights, None if it cannot be rebuilt
+                                    without loading it, like Flair taggers, in which case the conversion is not cached.
+        :return: The model object ready for inference in this precision.
+        """
+        self.cache_hit = False
+        if self.mode != self.INT8:
+            return load_fp32_model()
+
+        import torch
+
+        cache_path: Optional[Path] = self._get_cache_path() if build_fp32_skeleton is not None else None
+        if cache_path is not None and cache_path.exists():
+            try:
+                model = self._build_quantized_skeleton(build_fp32_skeleton)
+                # the packed weights of quantized layers are script objects, which the weights_only unpickler rejects
+                model.load_state_dict(torch.load(cache_path, map_location="cpu", weights_only=False), assign=True)
+                self.cache_hit = True
+                print(f"Loaded {self.mode} weights from {cache_path}")
+                return model.eval()
+            except Exception as e:
+                print(f"Failed to load cached {self.mode} weights from {cache_path}, converting again: {e}")
+
+        model = load_fp32_model()
+        if model is None:
+            return None
+        model = self.convert(model)
+        if cache_path is not None:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                temporary_path: Path = cache_path.with_suffix(".tmp")
+                torch.save(model.state_dict(), temporary_path)
+                temporary_path.replace(cache_path)
+                print(f"Cached {self.mode} weights at {cache_path}")
+            except Exception as e:
+                print(f"Failed to cache {self.mode} weights at {cache_path}: {e}")
+        return model
+
+    def _build_quantized_skeleton(self, build_fp32_skeleton: Callable[[], Any]) -> Any:
+        """
+        Build the quantized model without weights, its layers are quantized the same way as by convert.
+        :param build_fp32_skeleton: Builds the model on the meta device.
+        :return: The quantized model, to which the cached state dict is assigned.
+        """
+        import torch
+
+        skeleton = build_fp32_skeleton().to_empty(device="cpu")
+        # quantization observes the weights, uninitialized memory may hold values it rejects
+        with torch.no_grad():
+            for tensor in list(skeleton.parameters()) + list(skeleton.buffers()):
+                tensor.zero_()
+        return self.convert(skeleton)
+
+    def convert(self, model: Any) -> Any:
+        """
+        Convert a loaded fp32 model to this precision.
+        :param model: The fp32 model object.
+        :return: The converted model object, the model itself for fp32 and bf16.
+        """
+        if self.mode != self.INT8:
+            return model
+
+        import torch
+
+        model.eval()
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8)
+
+    def autocast(self) -> ContextManager:
+        """
+        Get the context to run forward passes in, bfloat16 autocast for bf16 and a no-op otherwise.
+        :return: The context manager to run inference in.
+        """
+        if self.mode != self.BF16:
+            return nullcontext()
+
+        import torch
+
+        return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+
+    def _get_cache_path(self) -> Optional[Path]:
+        """
+        Get the path of the cached conversion, keyed by the precision mode, the loading strategy, the torch version
+        and the source weights.
+        :return: The path of the cached conversion, None if there is no source path to key it by.
+        """
+        if self._source_path is None or self._cache_dir is None or not self._source_path.exists():
+            return None
+
+        import torch
+
+        source_files: List[Path] = [self._source_path] if self._source_path.is_file() else sorted(
+            path for path in self._source_path.rglob("*") if path.is_file() and self._cache_dir not in path.parents
+        )
+        digest = hashlib.sha256(f"{self.mode}|{self.loading_strategy}|{torch.__version__}".encode("utf-8"))
+        for path in source_files:
+            stat = path.stat()
+            digest.update(f"|{path.relative_to(self._source_path.parent)}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8"))
+        return self._cache_dir / f"state_dict-{self.mode}-{digest.hexdigest()[:16]}.pt"
\ No newline at end of file
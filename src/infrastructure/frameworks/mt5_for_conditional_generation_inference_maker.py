@@ -1,53 +1,192 @@
 from src.infrastructure.frameworks.model_inference_maker import ModelInferenceMaker
 from src.infrastructure.frameworks.mt5_for_conditional_generation_loader import MT5ForConditionalGenerationLoader
-from typing import Any, Dict, List
+from src.infrastructure.frameworks.somajo_tokenizer import SoMaJoTokenizer
+from src.infrastructure.frameworks.text_chunker import TextChunk, TextChunker
+from src.utils import record_quantity, timed_stage
+from typing import Any, Dict, List, NamedTuple
+
+class ChunkedGeneration(NamedTuple):
+    """
+    The generation result for one input text that was split into chunks.
+    samples[r][c] is the predicted text of chunks[c] in repeat sample r.
+    """
+    chunks: List[TextChunk]
+    samples: List[List[str]]
 
 class MT5ForConditionalGenerationInferenceMaker(ModelInferenceMaker):
     """
     This class implements the infer method to return the inference result with a MT5ForConditionalGeneration model.
     """
-    def __init__(self, model_loader: MT5ForConditionalGenerationLoader):
+    _somajo_tokenizer: SoMaJoTokenizer = None
+    # the tensor type the padded inputs are passed to generate with, "np" for the ONNX Runtime generator
+    _return_tensors: str = "pt"
+
+    def __init__(self,
+                 model_loader: MT5ForConditionalGenerationLoader,
+                 somajo_parallel: int = 1,
+                 somajo_cache_size: int = 4096):
         """
         :param model_loader: The MT5ForConditionalGenerationLoader instance with the model object.
+        :param somajo_parallel: The number of processes used by the SoMaJo tokenizer that finds chunk boundaries.
+        :param somajo_cache_size: The number of tokenized texts memoized by the SoMaJo tokenizer.
         """
         super().__init__(model_loader)
+        self._somajo_parallel = somajo_parallel
+        self._somajo_cache_size = somajo_cache_size
 
     def infer(self, input_text: str, **kwargs) -> List[str]:
         """
-        Make inference using the loaded SequenceTagger model.
+        Make inference using the loaded MT5ForConditionalGeneration model.
         :param input_text: The input text for which inference is to be made.
         :param **kwargs: Additional keyword arguments for inference.
-        :return: The inference result as a list of output str.
+        :return: The inference result as a list of output str, one per repeat.
+        """
+        return self.infer_batch([input_text], **kwargs)[0]
+
+    def infer_batch(self, input_texts: List[str], **kwargs) -> List[List[str]]:
+        """
+        Make inference for a batch of input texts using the loaded MT5ForConditionalGeneration model.
+        Inputs are grouped into buckets of similar token length, every bucket is encoded once
+        and all repeat samples of its inputs are drawn within a single generate call.
+        :param input_texts: The input texts for which inference is to be made.
+        :param **kwargs: Additional keyword arguments for inference.
+        :return: The inference result as a list of output str (one per repeat) for every input text.
         """
+        if not input_texts:
+            return []
+
         model = self.model_loader.load()
         tokenizer = self.model_loader.tokenizer
-        
-        # extract tokenization kwargs
+
+        # extract tokenization kwargs, padding="longest" pads each bucket only to its longest input
         max_length: int = kwargs.get("max_length", 512)
         padding: str = kwargs.get("padding", "max_length")
         truncation: bool = kwargs.get("truncation", True)
 
-        inputs: Dict[str, Any] = tokenizer(input_text,
-                                           return_tensors="pt",
-                                           max_length=max_length,
-                                           padding=padding,
-                                           truncation=truncation)
+        # extract bucketing kwarg
+        max_batch_size: int = max(kwargs.get("max_batch_size", 8), 1)
+
         # extract repeat_count kwarg
-        repeat_count: int = kwargs.get("repeat_count", 1)
-        
+        repeat_count: int = max(kwargs.get("repeat_count", 1), 1)
+
         # extract generate kwargs
-        max_length: int = kwargs.get("max_length", 512)
         temperature: float = kwargs.get("temperature", 0.8)
         do_sample: bool = kwargs.get("do_sample", True)
         top_k: int = kwargs.get("top_k", 100)
 
-        output_texts: List[str] = list()
-        for _ in range(1, repeat_count+1):
-            outputs = model.generate(**inputs,
-                                     max_length=max_length,
-                                     temperature=temperature,
-                                     do_sample=do_sample,
-                                     top_k=top_k)
-            output_texts.append(tokenizer.decode(outputs[0], skip_special_tokens=True))
-        
-        return output_texts
\ No newline at end of file
+        # greedy decoding yields the same sequence for every repeat, so it is generated only once
+        num_return_sequences: int = repeat_count if do_sample else 1
+
+        # tokenize once without padding, buckets are padded separately below
+        with timed_stage("subword_tokenize"):
+            encodings: Dict[str, List[List[int]]] = tokenizer(input_texts,
+                                                              max_length=max_length,
+                                                              truncation=truncation)
+        input_ids: List[List[int]] = encodings["input_ids"]
+        attention_mask: List[List[int]] = encodings["attention_mask"]
+
+        output_texts: List[List[str]] = [list() for _ in input_texts]
+        for bucket in self._get_length_buckets([len(ids) for ids in input_ids], max_batch_size):
+            with timed_stage("subword_tokenize"):
+                inputs: Dict[str, Any] = tokenizer.pad({"input_ids": [input_ids[index] for index in bucket],
+                                                        "attention_mask": [attention_mask[index] for index in bucket]},
+                                                       padding=padding,
+                                                       max_length=max_length,
+                                                       return_tensors=self._return_tensors)
+
+            # generate returns the samples of an input next to each other,
+            # i.e. outputs[i * num_return_sequences + r] is sample r of the i-th input in the bucket
+            with timed_stage("model_forward"), self.model_loader.model_precision.autocast():
+                outputs = model.generate(**inputs,
+                                         max_length=max_length,
+                                         temperature=temperature,
+                                         do_sample=do_sample,
+                                         top_k=top_k,
+                                         num_return_sequences=num_return_sequences)
+            with timed_stage("decode"):
+                decoded_texts: List[str] = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+            # the padding after finished sequences is not generated, the decoder start token is the padding token
+            record_quantity("output_tokens", int((outputs != tokenizer.pad_token_id).sum()))
+
+            for position, index in enumerate(bucket):
+                samples = decoded_texts[position * num_return_sequences: (position + 1) * num_return_sequences]
+                output_texts[index] = samples if do_sample else samples * repeat_count
+
+        return output_texts
+
+    def infer_chunked(self, input_texts: List[str], **kwargs) -> List[ChunkedGeneration]:
+        """
+        Make inference for a batch of input texts, splitting texts that exceed the token budget into
+        sentence-aligned chunks. The chunks of all input texts are generated together as one batch.
+        :param input_texts: The input texts for which inference is to be made.
+        :param **kwargs: Additional keyword arguments for inference, see infer_batch.
+                         chunk_max_length sets the window size in tokens (defaults to max_length).
+        :return: A ChunkedGeneration for every input text.
+        """
+        if not input_texts:
+            return []
+
+        self.model_loader.load()
+        max_length: int = kwargs.get("max_length", 512)
+        chunk_max_length: int = min(kwargs.get("chunk_max_length", max_length), max_length)
+        repeat_count: int = max(kwargs.get("repeat_count", 1), 1)
+
+        # reserve one position for the end of sequence token appended by the tokenizer
+        text_chunker = TextChunker(somajo_tokenizer=self._get_somajo_tokenizer(),
+                                   count_tokens=self._count_tokens,
+                                   max_tokens=chunk_max_length - 1)
+        chunks_per_text: List[List[TextChunk]] = [text_chunker.chunk(input_text) for input_text in input_texts]
+
+        chunk_outputs: List[List[str]] = self.infer_batch(
+            [chunk.text for chunks in chunks_per_text for chunk in chunks], **kwargs
+        )
+
+        chunked_generations: List[ChunkedGeneration] = list()
+        cursor: int = 0
+        for chunks in chunks_per_text:
+            outputs: List[List[str]] = chunk_outputs[cursor: cursor + len(chunks)]
+            cursor += len(chunks)
+            chunked_generations.append(ChunkedGeneration(
+                chunks=chunks,
+                samples=[[output[r] for output in outputs] for r in range(repeat_count)]
+            ))
+        return chunked_generations
+
+    def warm_up(self, sample_texts: List[str]) -> None:
+        """
+        Run the chunked generation the API uses on the sample texts, decoding greedily to keep the warm-up short.
+        :param sample_texts: The sample texts to make inference for.
+        """
+        if sample_texts:
+            self.infer_chunked(sample_texts, max_length=512, padding="longest", truncation=True, do_sample=False)
+
+    def _count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Count the model tokens of the given texts without special tokens.
+        :param texts: The texts to count the tokens of.
+        :return: The number of tokens for every text.
+        """
+        encodings = self.model_loader.tokenizer(texts, add_special_tokens=False)
+        return [len(ids) for ids in encodings["input_ids"]]
+
+    def _get_somajo_tokenizer(self) -> SoMaJoTokenizer:
+        """
+        Get the SoMaJo tokenizer used to find chunk boundaries, creating it on first use.
+        """
+        if self._somajo_tokenizer is None:
+            self._somajo_tokenizer = SoMaJoTokenizer(parallel=self._somajo_parallel, cache_size=self._somajo_cache_size)
+        return self._somajo_tokenizer
+
+    @staticmethod
+    def _get_length_buckets(lengths: List[int], max_batch_size: int) -> List[List[int]]:
+        """
+        Group input indices into buckets of similar length.
+        :param lengths: The token length of every input.
+        :param max_batch_size: The maximum number of inputs per bucket.
+        :return: A list of buckets, each a list of indices into lengths.
+        """
+        sorted_indices: List[int] = sorted(range(len(lengths)), key=lambda index: lengths[index])
+        return [
+            sorted_indices[start: start + max_batch_size]
+            for start in range(0, len(sorted_indices), max_batch_size)
+        ]
\ No newline at end of file
@@ -1,33 +1,79 @@
+from __future__ import annotations
+from pathlib import Path
 from src.infrastructure.frameworks.cached_model_loader import CachedModelLoader
-from transformers import MT5ForConditionalGeneration, MT5TokenizerFast
+from src.infrastructure.frameworks.mapped_model_artifact import MappedModelArtifact
+from src.infrastructure.frameworks.model_precision import ModelPrecision
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from transformers import MT5ForConditionalGeneration, MT5TokenizerFast
 
 class MT5ForConditionalGenerationLoader(CachedModelLoader):
     """
     Responsible for loading MT5 model and tokenizer.
+    With the memory_mapped loading strategy both are loaded from the mapped artifact in the model path instead.
     """
     def __init__(self, 
                  model_name_or_path: str,
-                 loading_strategy: str = "local_disk_storage"):
+                 loading_strategy: str = "local_disk_storage",
+                 model_precision: ModelPrecision = None):
         """
         :param model_name_or_path: The path or name of the MT5 model to load.
-        :param loading_strategy: The strategy to use for loading the model (e.g., local_disk_storage).
+        :param loading_strategy: The strategy to use for loading the model (local_disk_storage or memory_mapped).
+        :param model_precision: The inference precision applied at load time, defaults to fp32.
         """
-        super().__init__(model_name_or_path, loading_strategy)
+        super().__init__(model_name_or_path, loading_strategy, model_precision)
         self._tokenizer: MT5TokenizerFast = None
 
     def _load_model(self) -> MT5ForConditionalGeneration:
         """
         Load the MT5ForConditionalGeneration model and return the model object.
         :return: The loaded MT5ForConditionalGeneration model object."""
+        # transformers imports torch, deferred until a model is actually loaded
+        from transformers import MT5ForConditionalGeneration, MT5TokenizerFast
+
         try:
             if self.loading_strategy == "local_disk_storage":
                 self._tokenizer = MT5TokenizerFast.from_pretrained(self.model_name_or_path)
-                return MT5ForConditionalGeneration.from_pretrained(self.model_name_or_path)
+                return self.model_precision.load(lambda: MT5ForConditionalGeneration.from_pretrained(self.model_name_or_path),
+                                                 lambda: self._build_skeleton(self.model_name_or_path))
+            elif self.loading_strategy == "memory_mapped":
+                mapped_directory = Path(self.model_name_or_path) / MappedModelArtifact.DIRECTORY_NAME
+                self._tokenizer = MT5TokenizerFast.from_pretrained(mapped_directory)
+                return self.model_precision.load(lambda: self._load_mapped_model(mapped_directory),
+                                                 lambda: self._build_skeleton(mapped_directory))
             else:
                 raise ValueError(f"Unsupported loading strategy: {self.loading_strategy} for model at {self._model_name_or_path}")
         except Exception as e:
             print(f"Failed to load MT5 model for {self._model_name_or_path}: {e}")
     
+    @staticmethod
+    def _build_skeleton(model_directory: Path) -> MT5ForConditionalGeneration:
+        """
+        Build the model from its configuration on the meta device, without allocating or initializing weights.
+        :param model_directory: The directory of the model configuration.
+        :return: The MT5ForConditionalGeneration model object without weights.
+        """
+        import torch
+        from transformers import MT5Config, MT5ForConditionalGeneration
+
+        config = MT5Config.from_pretrained(model_directory)
+        with torch.device("meta"):
+            return MT5ForConditionalGeneration(config)
+
+    @classmethod
+    def _load_mapped_model(cls, mapped_directory: Path) -> MT5ForConditionalGeneration:
+        """
+        Build the model from its configuration without allocating weights and assign the mapped weights to it.
+        :param mapped_directory: The directory of the mapped artifact.
+        :return: The loaded MT5ForConditionalGeneration model object.
+        """
+        model = cls._build_skeleton(mapped_directory)
+        model.load_state_dict(MappedModelArtifact.load_state_dict(mapped_directory, "MT5ForConditionalGeneration"), assign=True)
+        if any(tensor.is_meta for tensor in list(model.parameters()) + list(model.buffers())):
+            raise ValueError(f"The mapped artifact in {mapped_directory} does not hold every weight of the model")
+        return model.eval()
+
     @property
     def tokenizer(self) -> MT5TokenizerFast:
         """
@@ -0,0 +1,9 @@
+from src.infrastructure.frameworks.mt5_for_conditional_generation_inference_maker import MT5ForConditionalGenerationInferenceMaker
+
+class MT5ForConditionalGenerationONNXInferenceMaker(MT5ForConditionalGenerationInferenceMaker):
+    """
+    This class implements the infer method with a MT5ForConditionalGeneration model exported to ONNX.
+    Bucketing, chunking and decoding are those of the eager MT5ForConditionalGenerationInferenceMaker, generation runs
+    on the MT5ONNXGenerator returned from the MT5ForConditionalGenerationONNXLoader, which takes numpy inputs.
+    """
+    _return_tensors: str = "np"
\ No newline at end of file
@@ -0,0 +1,51 @@
+from __future__ import annotations
+from pathlib import Path
+from src.infrastructure.frameworks.model_precision import ModelPrecision
+from src.infrastructure.frameworks.mt5_for_conditional_generation_loader import MT5ForConditionalGenerationLoader
+from src.infrastructure.frameworks.mt5_onnx_generator import MT5ONNXGenerator
+from typing import Any
+
+
+class MT5ForConditionalGenerationONNXLoader(MT5ForConditionalGenerationLoader):
+    """
+    Responsible for loading a MT5 model exported to ONNX by scripts/export_compiled_models.py, and its tokenizer.
+    """
+    DIRECTORY_NAME = "onnx"
+    # the intra-op thread pool of an ONNX Runtime session does not survive a fork
+    fork_safe = False
+
+    def __init__(self,
+                 model_name_or_path: str,
+                 loading_strategy: str = "local_disk_storage",
+                 model_precision: ModelPrecision = None):
+        """
+        :param model_name_or_path: The directory of the exported ONNX model.
+        :param loading_strategy: The strategy to use for loading the model (e.g., local_disk_storage).
+        :param model_precision: The inference precision, only fp32 is supported by compiled models.
+        """
+        super().__init__(model_name_or_path, loading_strategy, model_precision)
+
+    def _load_model(self) -> MT5ONNXGenerator:
+        """
+        Load the ONNX encoder and decoder graphs and return the generator.
+        :return: The loaded MT5ONNXGenerator object.
+        """
+        # onnxruntime and transformers are deferred until a model is actually loaded
+        from transformers import MT5TokenizerFast
+
+        try:
+            if self.loading_strategy == "local_disk_storage":
+                self._tokenizer = MT5TokenizerFast.from_pretrained(self.model_name_or_path)
+                return MT5ONNXGenerator.load(self.model_name_or_path)
+            else:
+                raise ValueError(f"Unsupported loading strategy: {self.loading_strategy} for model at {self._model_name_or_path}")
+        except Exception as e:
+            print(f"Failed to load ONNX MT5 model for {self._model_name_or_path}: {e}")
+
+    def _get_resident_bytes(self, model: Any) -> int:
+        """
+        Get the size of the exported model files, which the ONNX Runtime sessions take when loaded.
+        :param model: The loaded MT5ONNXGenerator object.
+        :return: The size in bytes.
+        """
+        return self._get_directory_bytes(Path(self.model_name_or_path))
\ No newline at end of file
@@ -0,0 +1,142 @@
+from __future__ import annotations
+from pathlib import Path
+from src.infrastructure.frameworks.onnx_runtime_session import create_inference_session
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+import json
+
+if TYPE_CHECKING:
+    import numpy as np
+    from onnxruntime import InferenceSession
+
+
+class MT5ONNXGenerator:
+    """
+    Text generation with an MT5ForConditionalGeneration model exported to ONNX as two graphs.
+    The encoder graph returns the encoder states and the cross-attention keys and values of every decoder layer,
+    the decoder graph runs one step with the self-attention keys and values of the previous steps (past key/values),
+    so every step only processes the newest token. The decoding loop mirrors the greedy search and the sampling
+    (temperature, then top-k) of transformers' generate, with numpy in place of torch.
+    """
+    ENCODER_FILE_NAME = "encoder/model.onnx"
+    DECODER_FILE_NAME = "decoder/model.onnx"
+    CONFIG_FILE_NAME = "generation.json"
+
+    def __init__(self, encoder: InferenceSession, decoder: InferenceSession, config: Dict[str, Any]):
+        """
+        :param encoder: The ONNX Runtime session of the encoder graph.
+        :param decoder: The ONNX Runtime session of the decoder graph.
+        :param config: The decoder_start_token_id, eos_token_id and pad_token_id and the num_layers, num_heads and
+                       d_kv of the decoder, as written by the exporter.
+        """
+        self.encoder = encoder
+        self.decoder = decoder
+        self.config = config
+        # the exporter may prune inputs the graph does not depend on, only the remaining ones are fed
+        self._decoder_input_names = {decoder_input.name for decoder_input in decoder.get_inputs()}
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> MT5ONNXGenerator:
+        """
+        Load the exported graphs and their generation config.
+        :param directory: The directory of the exported model.
+        :return: The generator.
+        """
+        directory = Path(directory)
+        with open(directory / cls.CONFIG_FILE_NAME, encoding="utf-8") as f:
+            config: Dict[str, Any] = json.load(f)
+        return cls(encoder=create_inference_session(directory / cls.ENCODER_FILE_NAME),
+                   decoder=create_inference_session(directory / cls.DECODER_FILE_NAME),
+                   config=config)
+
+    def generate(self,
+                 input_ids: np.ndarray,
+                 attention_mask: np.ndarray,
+                 max_length: int = 20,
+                 temperature: float = 1.0,
+                 do_sample: bool = False,
+                 top_k: int = 50,
+                 num_return_sequences: int = 1,
+                 seed: Optional[int] = None) -> np.ndarray:
+        """
+        Generate output token ids for a padded batch of inputs.
+        :param input_ids: The token ids of the inputs with shape (batch size, sequence length).
+        :param attention_mask: The attention mask of the inputs with the same shape.
+        :param max_length: The maximum length of the generated sequences, including the decoder start token.
+        :param temperature: The temperature applied to the logits before sampling.
+        :param do_sample: Whether to sample the next token, greedy decoding otherwise.
+        :param top_k: The number of most likely tokens to sample from.
+        :param num_return_sequences: The number of sequences generated for every input, consecutive in the output.
+        :param seed: The seed of the sampling random generator, None for a random seed.
+        :return: The generated token ids with shape (batch size * num_return_sequences, generated length).
+        """
+        import numpy as np
+
+        input_ids = np.asarray(input_ids, dtype=np.int64)
+        attention_mask = np.asarray(attention_mask, dtype=np.int64)
+        encoder_outputs: List[np.ndarray] = self.encoder.run(None, {"input_ids": input_ids, "attention_mask": attention_mask})
+        if num_return_sequences > 1:
+            encoder_outputs = [np.repeat(output, num_return_sequences, axis=0) for output in encoder_outputs]
+            attention_mask = np.repeat(attention_mask, num_return_sequences, axis=0)
+        encoder_hidden_states, cross_keys_values = encoder_outputs[0], encoder_outputs[1:]
+
+        batch_size: int = encoder_hidden_states.shape[0]
+        num_layers: int = self.config["num_layers"]
+        eos_token_id: int = self.config["eos_token_id"]
+        pad_token_id: int = self.config["pad_token_id"]
+        past_keys_values: List[np.ndarray] = [
+            np.zeros((batch_size, self.config["num_heads"], 0, self.config["d_kv"]), dtype=encoder_hidden_states.dtype)
+            for _ in range(2 * num_layers)
+        ]
+        random_generator = np.random.default_rng(seed) if do_sample else None
+
+        sequences = np.full((batch_size, 1), self.config["decoder_start_token_id"], dtype=np.int64)
+        unfinished = np.ones(batch_size, dtype=bool)
+        while sequences.shape[1] < max_length:
+            decoder_inputs: Dict[str, np.ndarray] = {
+                "decoder_input_ids": sequences[:, -1:],
+                "encoder_hidden_states": encoder_hidden_states,
+                "encoder_attention_mask": attention_mask
+            }
+            for layer in range(num_layers):
+                decoder_inputs[f"past_key_{layer}"] = past_keys_values[2 * layer]
+                decoder_inputs[f"past_value_{layer}"] = past_keys_values[2 * layer + 1]
+                decoder_inputs[f"cross_key_{layer}"] = cross_keys_values[2 * layer]
+                decoder_inputs[f"cross_value_{layer}"] = cross_keys_values[2 * layer + 1]
+            decoder_outputs: List[np.ndarray] = self.decoder.run(None, {
+                name: value for name, value in decoder_inputs.items() if name in self._decoder_input_names
+            })
+            logits, past_keys_values = decoder_outputs[0][:, -1, :], decoder_outputs[1:]
+
+            if do_sample:
+                next_tokens = self._sample(logits, temperature, top_k, random_generator)
+            else:
+                next_tokens = logits.argmax(axis=-1)
+            next_tokens = np.where(unfinished, next_tokens, pad_token_id)
+            sequences = np.concatenate([sequences, next_tokens[:, np.newaxis]], axis=1)
+            unfinished &= next_tokens != eos_token_id
+            if not unfinished.any():
+                break
+        return sequences
+
+    @staticmethod
+    def _sample(logits: np.ndarray, temperature: float, top_k: int, random_generator: np.random.Generator) -> np.ndarray:
+        """
+        Sample the next token of every sequence from the logits scaled by the temperature and limited to the top-k tokens.
+        :param logits: The logits of the next token with shape (batch size, vocabulary size).
+        :param temperature: The temperature applied to the logits.
+        :param top_k: The number of most likely tokens to sample from, 0 to sample from all tokens.
+        :param random_generator: The random generator to sample with.
+        :return: The sampled token ids with shape (batch size,).
+        """
+        import numpy as np
+
+        scores = logits.astype(np.float64) / temperature
+        if 0 < top_k < scores.shape[-1]:
+            kth_scores = np.partition(scores, -top_k, axis=-1)[:, -top_k][:, np.newaxis]
+            scores = np.where(scores < kth_scores, -np.inf, scores)
+        probabilities = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        probabilities /= probabilities.sum(axis=-1, keepdims=True)
+        cumulative = probabilities.cumsum(axis=-1)
+        draws = random_generator.random((scores.shape[0], 1)) * cumulative[:, -1:]
+        return np.minimum((cumulative < draws).sum(axis=-1), scores.shape[-1] - 1)
\ No newline at end of file
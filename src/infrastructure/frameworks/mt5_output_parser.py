@@ -0,0 +1,122 @@
+from src.domain.entity_span import EntitySpan
+from src.infrastructure.frameworks.text_chunker import TextChunk
+from src.utils import timed_stage
+from typing import List, Pattern
+
+import re
+
+class MT5OutputStream:
+    """
+    Incremental parser state for the output generated for one input text.
+    Generated text can be fed in pieces, items are parsed as soon as their terminating delimiter arrives.
+    """
+
+    def __init__(self, parser: "MT5OutputParser", input_text: str):
+        """
+        :param parser: The MT5OutputParser holding the compiled patterns.
+        :param input_text: The input text the generated output refers to.
+        """
+        self._parser = parser
+        self._input_text = input_text
+        self._cursor = 0
+        self._pending = ""
+
+    def feed(self, generated_text: str) -> List[EntitySpan]:
+        """
+        Feed the next piece of generated text.
+        :param generated_text: The next piece of generated text.
+        :return: The entity spans of all items completed by this piece.
+        """
+        self._pending += generated_text
+        last_delimiter: int = self._pending.rfind(MT5OutputParser.ITEM_DELIMITER)
+        if last_delimiter == -1:
+            return []
+        complete, self._pending = self._pending[:last_delimiter + 1], self._pending[last_delimiter + 1:]
+        return self._parse(complete)
+
+    def close(self) -> List[EntitySpan]:
+        """
+        Parse the remaining, unterminated item.
+        :return: The entity spans of the remaining item.
+        """
+        remaining, self._pending = self._pending, ""
+        return self._parse(remaining)
+
+    def _parse(self, generated_text: str) -> List[EntitySpan]:
+        """
+        Parse complete items and locate their tokens in the input text, walking a cursor forward.
+        """
+        entity_spans: List[EntitySpan] = list()
+        input_text: str = self._input_text
+        for item in self._parser.item_pattern.finditer(generated_text):
+            label: str = item.group("label")
+            value: str = item.group("value").strip()
+            value_match = self._parser.value_pattern.match(value)
+            if value_match:
+                token, pseudonym = value_match.group("token"), value_match.group("pseudonym")
+            else:
+                token, pseudonym = value, ""
+
+            if not token.strip():
+                continue
+
+            start: int = input_text.find(token, self._cursor)
+            if start == -1 and " " in token:
+                token = token.replace(" ", "")
+                start = input_text.find(token, self._cursor)
+            if start == -1:
+                continue
+
+            end: int = start + len(token)
+            self._cursor = end
+            entity_spans.append(EntitySpan(label, start, end, input_text[start:end], pseudonym))
+        return entity_spans
+
+class MT5OutputParser:
+    """
+    Parser for the `LABEL: token **pseudonym**; ...` output generated by the pseudonymization mT5 model.
+    A single alternation pattern over the labels of the entity set finds all items in one pass.
+    """
+    ITEM_DELIMITER = ";"
+
+    def __init__(self, labels: List[str]):
+        """
+        :param labels: The fine-grained labels of the entity set.
+        """
+        alternation: str = "|".join(re.escape(label) for label in sorted(set(labels), key=len, reverse=True))
+        self.item_pattern: Pattern = re.compile(r"\b(?P<label>" + alternation + r")\b:(?P<value>[^;]*)")
+        self.value_pattern: Pattern = re.compile(r"(?P<token>.*?)\s*\*\*(?P<pseudonym>.*?)\*\*")
+
+    def start_stream(self, input_text: str) -> MT5OutputStream:
+        """
+        Start parsing generated output for an input text incrementally.
+        :param input_text: The input text the generated output refers to.
+        :return: The MT5OutputStream to feed the generated text into.
+        """
+        return MT5OutputStream(self, input_text)
+
+    def parse(self, input_text: str, generated_text: str) -> List[EntitySpan]:
+        """
+        Parse the complete output generated for an input text.
+        :param input_text: The input text the generated output refers to.
+        :param generated_text: The generated output.
+        :return: The entity spans in input text order.
+        """
+        stream: MT5OutputStream = self.start_stream(input_text)
+        return stream.feed(generated_text) + stream.close()
+
+    def parse_chunks(self, input_text: str, chunks: List[TextChunk], generated_texts: List[str]) -> List[EntitySpan]:
+        """
+        Parse the outputs generated for the chunks of an input text, rebasing the offsets onto the input text.
+        :param input_text: The input text the chunks were taken from.
+        :param chunks: The chunks of the input text.
+        :param generated_texts: The output generated for every chunk.
+        :return: The entity spans in input text order.
+        """
+        entity_spans: List[EntitySpan] = list()
+        with timed_stage("align"):
+            for chunk, generated_text in zip(chunks, generated_texts):
+                for entity_span in self.parse(chunk.text, generated_text):
+                    entity_spans.append(entity_span._replace(start=entity_span.start + chunk.start,
+                                                             end=entity_span.end + chunk.start))
+        return entity_spans
\ No newline at end of file
@@ -0,0 +1,28 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import TYPE_CHECKING, Union
+
+import os
+
+if TYPE_CHECKING:
+    from onnxruntime import InferenceSession
+
+
+def create_inference_session(model_path: Union[str, Path]) -> InferenceSession:
+    """
+    Create an ONNX Runtime session on CPU with all graph optimizations enabled.
+    The intra-op threads follow OMP_NUM_THREADS like torch does, ONNX Runtime uses every core otherwise.
+    onnxruntime is an optional dependency, it is only imported when an ONNX model is loaded.
+    :param model_path: The path of the .onnx file, external weights are expected next to it.
+    :return: The inference session.
+    """
+    import onnxruntime
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    intra_op_num_threads: str = os.environ.get("OMP_NUM_THREADS", "")
+    if intra_op_num_threads.isdigit():
+        session_options.intra_op_num_threads = int(intra_op_num_threads)
+    return onnxruntime.InferenceSession(str(model_path),
+                                        sess_options=session_options,
+                                        providers=["CPUExecutionProvider"])
\ No newline at end of file
@@ -0,0 +1,157 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+import json
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# the labels predicted for a sentence as (label value, first token index, last token index)
+SentenceLabels = Tuple[Tuple[str, int, int], ...]
+
+class SequenceTaggerDecoder:
+    """
+    Turns the emission scores of a compiled SequenceTagger network into labels, the way Flair does after its forward pass.
+    CRF taggers are decoded with Viterbi over the exported transitions, other taggers take the best tag per token,
+    and BIOES tags are merged into spans with the rules of flair.models.sequence_tagger_utils.bioes.get_spans_from_bio.
+    """
+    FILE_NAME = "tagger.json"
+
+    def __init__(self,
+                 tags: List[str],
+                 use_crf: bool,
+                 predict_spans: bool,
+                 transitions: Optional[List[List[float]]] = None,
+                 start_tag: Optional[int] = None,
+                 stop_tag: Optional[int] = None):
+        """
+        :param tags: The tag of every output index of the network.
+        :param use_crf: Whether the tagger decodes with a CRF.
+        :param predict_spans: Whether the tags are BIOES tags to be merged into spans.
+        :param transitions: The CRF transition scores indexed [to tag, from tag], required with use_crf.
+        :param start_tag: The index of the CRF start tag, required with use_crf.
+        :param stop_tag: The index of the CRF stop tag, required with use_crf.
+        """
+        if use_crf and (transitions is None or start_tag is None or stop_tag is None):
+            raise ValueError("CRF decoding requires the transitions and the start and stop tags")
+        self.tags = tags
+        self.use_crf = use_crf
+        self.predict_spans = predict_spans
+        self.transitions = transitions
+        self.start_tag = start_tag
+        self.stop_tag = stop_tag
+        self._transitions_array = None
+
+    @classmethod
+    def from_tagger(cls, tagger: Any) -> SequenceTaggerDecoder:
+        """
+        Create the decoder of a loaded Flair SequenceTagger.
+        :param tagger: The Flair SequenceTagger.
+        :return: The decoder with the tags and, for CRF taggers, the transitions of the tagger.
+        """
+        tags: List[str] = [tag.decode("utf-8") if isinstance(tag, bytes) else tag for tag in tagger.label_dictionary.idx2item]
+        if not tagger.use_crf:
+            return cls(tags=tags, use_crf=False, predict_spans=tagger.predict_spans)
+        return cls(tags=tags,
+                   use_crf=True,
+                   predict_spans=tagger.predict_spans,
+                   transitions=tagger.crf.transitions.detach().cpu().tolist(),
+                   start_tag=tagger.label_dictionary.get_idx_for_item("<START>"),
+                   stop_tag=tagger.label_dictionary.get_idx_for_item("<STOP>"))
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> SequenceTaggerDecoder:
+        """
+        Load a decoder saved next to a compiled network.
+        :param directory: The directory of the compiled model.
+        :return: The decoder.
+        """
+        with open(Path(directory) / cls.FILE_NAME, encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """
+        Save the decoder next to a compiled network.
+        :param directory: The directory of the compiled model.
+        """
+        with open(Path(directory) / self.FILE_NAME, "w", encoding="utf-8") as f:
+            json.dump({
+                "tags": self.tags,
+                "use_crf": self.use_crf,
+                "predict_spans": self.predict_spans,
+                "transitions": self.transitions,
+                "start_tag": self.start_tag,
+                "stop_tag": self.stop_tag
+            }, f)
+
+    def decode(self, emissions: np.ndarray) -> SentenceLabels:
+        """
+        Decode the emission scores of one sentence.
+        :param emissions: The scores of the sentence with shape (number of tokens, number of tags).
+        :return: The labels of the sentence in token order.
+        """
+        if len(emissions) == 0:
+            return tuple()
+        tag_indices: List[int] = self._viterbi(emissions) if self.use_crf else emissions.argmax(axis=1).tolist()
+        tags: List[str] = [self.tags[tag_index] for tag_index in tag_indices]
+        if self.predict_spans:
+            return tuple((value, span[0], span[-1]) for span, value in self._get_spans_from_bioes(tags))
+        return tuple((tag, index, index) for index, tag in enumerate(tags) if tag not in ["O", "_"])
+
+    def _viterbi(self, emissions: np.ndarray) -> List[int]:
+        """
+        Find the most likely tag sequence of one sentence, scoring transitions from the start tag and to the stop tag.
+        :param emissions: The scores of the sentence with shape (number of tokens, number of tags).
+        :return: The tag index of every token.
+        """
+        import numpy as np
+
+        if self._transitions_array is None:
+            self._transitions_array = np.asarray(self.transitions, dtype=np.float32)
+        transitions = self._transitions_array
+        tag_range = np.arange(transitions.shape[0])
+
+        scores = emissions[0] + transitions[:, self.start_tag]
+        backpointers: List[np.ndarray] = list()
+        for emission in emissions[1:]:
+            candidates = transitions + scores[np.newaxis, :]
+            best_previous = candidates.argmax(axis=1)
+            scores = candidates[tag_range, best_previous] + emission
+            backpointers.append(best_previous)
+
+        best_tag: int = int((scores + transitions[self.stop_tag]).argmax())
+        tag_indices: List[int] = [best_tag]
+        for best_previous in reversed(backpointers):
+            best_tag = int(best_previous[best_tag])
+            tag_indices.append(best_tag)
+        tag_indices.reverse()
+        return tag_indices
+
+    @staticmethod
+    def _get_spans_from_bioes(tags: List[str]) -> List[Tuple[List[int], str]]:
+        """
+        Merge BIOES (or BIO) tags into spans, a port of Flair's get_spans_from_bio without the scores.
+        :param tags: The tag of every token.
+        :return: The token indices and the value of every span.
+        """
+        spans: List[Tuple[List[int], str]] = list()
+        tag_weights: Dict[str, float] = dict()
+        span: List[int] = list()
+        previous_tag: str = "O-"
+        for index, tag in enumerate(tags + ["O"]):
+            if tag in ["", "O", "_"]:
+                tag = "O-"
+            in_span: bool = tag != "O-"
+            starts_new_span: bool = tag[0:2] in ["B-", "S-"] or (tag[0:2] == "I-" and previous_tag[2:] != tag[2:])
+
+            if (starts_new_span or not in_span) and span:
+                spans.append((span, sorted(tag_weights.items(), key=lambda item: item[1], reverse=True)[0][0]))
+                span = list()
+                tag_weights = dict()
+
+            if in_span:
+                span.append(index)
+                tag_weights[tag[2:]] = tag_weights.get(tag[2:], 0.0) + (1.1 if starts_new_span else 1.0)
+            previous_tag = tag
+        return spans
\ No newline at end of file
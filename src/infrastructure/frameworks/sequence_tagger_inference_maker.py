@@ -1,21 +1,36 @@
-from flair.data import Sentence
+from __future__ import annotations
+from src.domain.entity_span import EntitySpan
 from src.infrastructure.frameworks.model_inference_maker import ModelInferenceMaker
+from src.infrastructure.frameworks.sequence_tagger_decoder import SentenceLabels
 from src.infrastructure.frameworks.sequence_tagger_loader import SequenceTaggerLoader
-from src.infrastructure.frameworks.somajo_tokenizer import SoMaJoTokenizer
-from typing import Any, List
+from src.infrastructure.frameworks.somajo_tokenizer import SoMaJoToken, SoMaJoTokenizer
+from src.utils import LRUCache, record_quantity, timed_stage
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from flair.data import Label, Sentence
 
 class SequenceTaggerInferenceMaker(ModelInferenceMaker):
     """
     This class implements the infer method to return the inference result with a Flair SequenceTagger model.
     """
+    deterministic: bool = True
     _somajo_tokenizer: SoMaJoTokenizer = None
 
-    def __init__(self, model_loader: SequenceTaggerLoader):
+    def __init__(self,
+                 model_loader: SequenceTaggerLoader,
+                 somajo_parallel: int = 1,
+                 somajo_cache_size: int = 4096,
+                 sentence_cache_size: int = 0):
         """
         :param model_loader: The SequenceTaggerLoader instance with the model object.
+        :param somajo_parallel: The number of processes used by the SoMaJo tokenizer for batches.
+        :param somajo_cache_size: The number of tokenized texts memoized by the SoMaJo tokenizer.
+        :param sentence_cache_size: The number of tokenized sentences whose predicted labels are memoized, 0 disables the cache.
         """
         super().__init__(model_loader)
-        self._load_somajo_tokenizer()
+        self._load_somajo_tokenizer(somajo_parallel, somajo_cache_size)
+        self._sentence_cache: Optional[LRUCache] = LRUCache(max_entries=sentence_cache_size) if sentence_cache_size > 0 else None
 
     def infer(self, input_text: str, **kwargs) -> List[Sentence]:
         """
@@ -24,20 +39,188 @@ class SequenceTaggerInferenceMaker(ModelInferenceMaker):
         :param **kwargs: Additional keyword arguments for inference.
         :return: The inference result as a list of Flair Sentence objects.
         """
+        return self.infer_batch([input_text], **kwargs)[0]
+
+    def infer_batch(self, input_texts: List[str], **kwargs) -> List[List[Sentence]]:
+        """
+        Make inference for a batch of input texts using the loaded SequenceTagger model.
+        The sentences of all input texts are predicted together, sorted by length, and regrouped per input text.
+        :param input_texts: The input texts for which inference is to be made.
+        :param **kwargs: Additional keyword arguments for inference.
+                         mini_batch_size sets the number of sentences per forward pass (defaults to 32).
+        :return: The inference result as a list of Flair Sentence objects for every input text.
+        """
+        tokenized_texts: List[List[List[SoMaJoToken]]] = self._somajo_tokenizer.tokenize_batch_with_offsets(input_texts)
+        return self._predict(tokenized_texts, **kwargs)
+
+    def infer_entity_spans(self, input_texts: List[str], **kwargs) -> List[List[EntitySpan]]:
+        """
+        Make inference for a batch of input texts and map the predicted labels back to the input texts.
+        The character offsets of the SoMaJo tokens are carried through prediction, so every span points
+        exactly at its text in the input without searching for it.
+        With the sentence cache enabled, only sentences not seen before are predicted, the labels of cached
+        sentences are re-attached through the offsets of the sentence at hand.
+        :param input_texts: The input texts for which inference is to be made.
+        :param **kwargs: Additional keyword arguments for inference, see infer_batch.
+        :return: The detected entities as a list of EntitySpan for every input text.
+        """
+        tokenized_texts: List[List[List[SoMaJoToken]]] = self._somajo_tokenizer.tokenize_batch_with_offsets(input_texts)
+        # a tagger labels every token of the input
+        record_quantity("output_tokens", sum(len(tokenized_sentence)
+                                             for tokenized_sentences in tokenized_texts for tokenized_sentence in tokenized_sentences))
+        labels_per_sentence: Dict[Tuple[str, ...], SentenceLabels] = self._predict_sentence_labels(
+            [self._get_sentence_key(tokenized_sentence)
+             for tokenized_sentences in tokenized_texts for tokenized_sentence in tokenized_sentences],
+            **kwargs
+        )
+
+        entity_spans_per_text: List[List[EntitySpan]] = list()
+        with timed_stage("align"):
+            for input_text, tokenized_sentences in zip(input_texts, tokenized_texts):
+                entity_spans: List[EntitySpan] = list()
+                for tokenized_sentence in tokenized_sentences:
+                    for value, first, last in labels_per_sentence[self._get_sentence_key(tokenized_sentence)]:
+                        start, end = tokenized_sentence[first].start, tokenized_sentence[last].end
+                        entity_spans.append(EntitySpan(value, start, end, input_text[start:end]))
+                entity_spans_per_text.append(entity_spans)
+        return entity_spans_per_text
+
+    def sentence_cache_stats(self) -> Dict[str, int]:
+        """
+        Get the counters of the sentence cache.
+        :return: A dictionary with hit, miss and eviction counters, empty if the cache is disabled.
+        """
+        return self._sentence_cache.stats() if self._sentence_cache is not None else dict()
+
+    def _predict(self, tokenized_texts: List[List[List[SoMaJoToken]]], **kwargs) -> List[List[Sentence]]:
+        """
+        Predict the sentences of all tokenized texts together, sorted by length.
+        :param tokenized_texts: For every input text, its tokenized sentences.
+        :param **kwargs: Additional keyword arguments for inference, see infer_batch.
+        :return: The predicted Flair Sentence objects for every input text.
+        """
+        from flair.data import Sentence
+
+        sentences_per_text: List[List[Sentence]] = [
+            [Sentence([token.text for token in tokenized_sentence]) for tokenized_sentence in tokenized_sentences]
+            for tokenized_sentences in tokenized_texts
+        ]
+        self._predict_sentences([sentence for sentences in sentences_per_text for sentence in sentences], **kwargs)
+        return sentences_per_text
+
+    def _predict_sentence_labels(self,
+                                 sentence_keys: List[Tuple[str, ...]],
+                                 **kwargs) -> Dict[Tuple[str, ...], SentenceLabels]:
+        """
+        Get the labels of tokenized sentences, predicting only the sentences missing from the sentence cache.
+        Recurring sentences such as greetings, signatures and footers are predicted once per batch at most.
+        :param sentence_keys: The token texts of every sentence.
+        :param **kwargs: Additional keyword arguments for inference, see infer_batch.
+        :return: The labels for every distinct sentence.
+        """
+        sentence_cache: Optional[LRUCache] = self._sentence_cache
+        if sentence_cache is not None and self._uses_cross_sentence_context(self.model_loader.load()):
+            sentence_cache = None
+
+        labels_per_sentence: Dict[Tuple[str, ...], SentenceLabels] = dict()
+        missing_keys: Dict[Tuple[str, ...], None] = dict()
+        for sentence_key in sentence_keys:
+            if sentence_key in labels_per_sentence or sentence_key in missing_keys:
+                continue
+            cached_labels: Optional[SentenceLabels] = sentence_cache.get(sentence_key) if sentence_cache is not None else None
+            if cached_labels is not None:
+                labels_per_sentence[sentence_key] = cached_labels
+            else:
+                missing_keys[sentence_key] = None
+
+        if sentence_cache is not None:
+            record_quantity("cache_hits", len(labels_per_sentence), cache="sentence")
+            record_quantity("cache_misses", len(missing_keys), cache="sentence")
+        for sentence_key, sentence_labels in zip(missing_keys, self._predict_labels(list(missing_keys), **kwargs)):
+            labels_per_sentence[sentence_key] = sentence_labels
+            if sentence_cache is not None:
+                sentence_cache.put(sentence_key, sentence_labels)
+        return labels_per_sentence
+
+    def _predict_labels(self, sentence_keys: List[Tuple[str, ...]], **kwargs) -> List[SentenceLabels]:
+        """
+        Predict the labels of tokenized sentences with the Flair SequenceTagger.
+        Compiled backends override this method and keep tokenization, caching and offset mapping as they are.
+        :param sentence_keys: The token texts of every sentence.
+        :param **kwargs: Additional keyword arguments for inference, see infer_batch.
+        :return: The labels of every sentence, in the order of sentence_keys.
+        """
+        from flair.data import Sentence
+
+        sentences: List[Sentence] = [Sentence(list(sentence_key)) for sentence_key in sentence_keys]
+        self._predict_sentences(sentences, **kwargs)
+        with timed_stage("decode"):
+            return [
+                tuple((label.value,) + self._get_token_indices(label) for label in sentence.get_labels())
+                for sentence in sentences
+            ]
+
+    def _predict_sentences(self, sentences: List[Sentence], **kwargs):
+        """
+        Predict Flair sentences in place, sorted by length so that mini-batches need little padding.
+        :param sentences: The sentences to predict.
+        :param **kwargs: Additional keyword arguments for inference, see infer_batch.
+        """
+        if not sentences:
+            return
         tagger = self.model_loader.load()
-        sentences: List[Sentence] = self._get_somajo_tokenized_flair_sentences(input_text)
-        tagger.predict(sentences)
-        return sentences
-    
-    def _get_somajo_tokenized_flair_sentences(self, text: str) -> List[Sentence]:
-        sentences: List[Sentence] = list()
-        for tokenized_sentence in self._somajo_tokenizer.tokenize(text):
-            sentences.append(Sentence(tokenized_sentence))
-        return sentences
+
+        # extract predict kwargs
+        mini_batch_size: int = kwargs.get("mini_batch_size", 32)
+
+        # the forward pass of a Flair tagger includes its Viterbi decoding
+        with timed_stage("model_forward"), self.model_loader.model_precision.autocast():
+            tagger.predict(sorted(sentences, key=len, reverse=True), mini_batch_size=mini_batch_size)
+
+    @staticmethod
+    def _get_sentence_key(tokenized_sentence: List[SoMaJoToken]) -> Tuple[str, ...]:
+        """
+        Get the key of a tokenized sentence, its token texts independent of where the sentence occurs.
+        :param tokenized_sentence: The tokens of the sentence.
+        :return: The token texts of the sentence.
+        """
+        return tuple(token.text for token in tokenized_sentence)
+
+    @staticmethod
+    def _uses_cross_sentence_context(tagger: Any) -> bool:
+        """
+        Check whether the embeddings of a tagger look beyond the sentence, which makes the labels of a
+        sentence depend on its neighbours, e.g. transformer embeddings with use_context.
+        :param tagger: The loaded SequenceTagger.
+        :return: True if any of the embeddings uses a context window across sentences.
+        """
+        pending: List[Any] = [getattr(tagger, "embeddings", None)]
+        while pending:
+            embeddings = pending.pop()
+            if embeddings is None:
+                continue
+            if getattr(embeddings, "context_length", 0):
+                return True
+            stacked_embeddings = getattr(embeddings, "embeddings", None)
+            if isinstance(stacked_embeddings, (list, tuple)):
+                pending.extend(stacked_embeddings)
+        return False
+
+    @staticmethod
+    def _get_token_indices(label: Label) -> Tuple[int, int]:
+        """
+        Get the indices of the first and the last token a label is attached to.
+        :param label: A label predicted for a span (or a single token) of a sentence.
+        :return: The 0-based (first, last) token indices within the sentence.
+        """
+        tokens = getattr(label.data_point, "tokens", [label.data_point])
+        return tokens[0].idx - 1, tokens[-1].idx - 1
     
-    def _load_somajo_tokenizer(self):
+    def _load_somajo_tokenizer(self, parallel: int, cache_size: int):
         """
         Load the SoMaJo tokenizer.
+        :param parallel: The number of processes used for batches.
+        :param cache_size: The number of tokenized texts memoized.
         """
         if self._somajo_tokenizer is None:
-            self._somajo_tokenizer = SoMaJoTokenizer()
\ No newline at end of file
+            self._somajo_tokenizer = SoMaJoTokenizer(parallel=parallel, cache_size=cache_size)
\ No newline at end of file
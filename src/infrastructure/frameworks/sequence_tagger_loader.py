@@ -1,22 +1,29 @@
-from flair.models import SequenceTagger
+from __future__ import annotations
 from pathlib import Path
 from src.infrastructure.frameworks.cached_model_loader import CachedModelLoader
+from src.infrastructure.frameworks.mapped_model_artifact import MappedModelArtifact
+from src.infrastructure.frameworks.model_precision import ModelPrecision
+from typing import TYPE_CHECKING
 
-import flair
+if TYPE_CHECKING:
+    from flair.models import SequenceTagger
 
 
 class SequenceTaggerLoader(CachedModelLoader):
     """
     Responsible for loading a Flair SequenceTagger model - given a model_path.
+    With the memory_mapped loading strategy the tagger is loaded from the mapped artifact in the model path instead.
     """
     def __init__(self, 
                  model_name_or_path: str, 
-                 loading_strategy: str = "local_disk_storage"):
+                 loading_strategy: str = "local_disk_storage",
+                 model_precision: ModelPrecision = None):
         """
         :param model_name_or_path: The path or name of the Flair model to load.
-        :param loading_strategy: The strategy to use for loading the model (e.g., local_disk_storage).
+        :param loading_strategy: The strategy to use for loading the model (local_disk_storage or memory_mapped).
+        :param model_precision: The inference precision applied at load time, defaults to fp32.
         """
-        super().__init__(model_name_or_path, loading_strategy)
+        super().__init__(model_name_or_path, loading_strategy, model_precision)
         self._cache_root: Path = Path("/app/flair_cache_root")
 
     def _load_model(self) -> SequenceTagger:
@@ -24,10 +31,18 @@ class SequenceTaggerLoader(CachedModelLoader):
         Load the Flair SequenceTagger model and return the model object.
         :return: The loaded SequenceTagger model object.
         """
+        # flair imports torch and its embeddings stack, deferred until a model is actually loaded
+        import flair
+        from flair.models import SequenceTagger
+
         flair.cache_root = self._cache_root
         try:
             if self.loading_strategy == "local_disk_storage":
-                return SequenceTagger.load(self.model_name_or_path / "model.pt")
+                return self.model_precision.load(lambda: SequenceTagger.load(self.model_name_or_path / "model.pt"))
+            elif self.loading_strategy == "memory_mapped":
+                return self.model_precision.load(lambda: MappedModelArtifact.load_module(
+                    self.model_name_or_path / MappedModelArtifact.DIRECTORY_NAME, "SequenceTagger"
+                ).eval())
             else:
                 raise ValueError(f"Unsupported loading strategy: {self.loading_strategy} for model at {self.model_name_or_path}")
         except Exception as e:
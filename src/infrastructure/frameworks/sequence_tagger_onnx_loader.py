@@ -0,0 +1,132 @@
+from __future__ import annotations
+from pathlib import Path
+from src.infrastructure.frameworks.cached_model_loader import CachedModelLoader
+from src.infrastructure.frameworks.compiled_sequence_tagger import CompiledSequenceTagger
+from src.infrastructure.frameworks.model_precision import ModelPrecision
+from src.infrastructure.frameworks.onnx_runtime_session import create_inference_session
+from src.infrastructure.frameworks.sequence_tagger_decoder import SequenceTaggerDecoder
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import json
+
+if TYPE_CHECKING:
+    import numpy as np
+    from onnxruntime import InferenceSession
+    from transformers import PreTrainedTokenizerFast
+
+
+class ONNXSequenceTagger(CompiledSequenceTagger):
+    """
+    A Flair SequenceTagger with transformer word embeddings (e.g. GELECTRA), exported to ONNX.
+    The graph takes the subtokens of a mini-batch and a pooling matrix mapping subtokens to tokens,
+    which is built here from the word ids of the fast tokenizer, following the subtoken pooling of the embeddings.
+    """
+
+    def __init__(self,
+                 session: InferenceSession,
+                 tokenizer: PreTrainedTokenizerFast,
+                 decoder: SequenceTaggerDecoder,
+                 subtoken_pooling: str,
+                 max_length: Optional[int]):
+        """
+        :param session: The ONNX Runtime session of the exported graph.
+        :param tokenizer: The fast tokenizer of the transformer.
+        :param decoder: The decoder turning emission scores into labels.
+        :param subtoken_pooling: How the subtokens of a token are pooled, one of first, last and mean.
+        :param max_length: The maximum number of subtokens per sentence, longer sentences are truncated.
+        """
+        super().__init__(decoder)
+        self.session = session
+        self.tokenizer = tokenizer
+        self.subtoken_pooling = subtoken_pooling
+        self.max_length = max_length
+
+    def get_emissions(self, sentence_keys: List[Tuple[str, ...]]) -> List[np.ndarray]:
+        """
+        Run the ONNX graph on a mini-batch of tokenized sentences.
+        Tokens without subtokens, and tokens cut off by truncation, get zero embeddings as in Flair.
+        :param sentence_keys: The token texts of every sentence, none of them empty.
+        :return: The emission scores of every sentence with shape (number of tokens, number of tags).
+        """
+        import numpy as np
+
+        encoding = self.tokenizer([list(sentence_key) for sentence_key in sentence_keys],
+                                  is_split_into_words=True,
+                                  truncation=self.max_length is not None,
+                                  max_length=self.max_length,
+                                  padding=True,
+                                  return_tensors="np")
+        max_tokens: int = max(len(sentence_key) for sentence_key in sentence_keys)
+        subtoken_weights = np.zeros((len(sentence_keys), max_tokens, encoding["input_ids"].shape[1]), dtype=np.float32)
+        for batch_index in range(len(sentence_keys)):
+            subtoken_positions: Dict[int, List[int]] = dict()
+            for position, word_id in enumerate(encoding.word_ids(batch_index)):
+                if word_id is not None:
+                    subtoken_positions.setdefault(word_id, list()).append(position)
+            for word_id, positions in subtoken_positions.items():
+                if self.subtoken_pooling == "first":
+                    subtoken_weights[batch_index, word_id, positions[0]] = 1.0
+                elif self.subtoken_pooling == "last":
+                    subtoken_weights[batch_index, word_id, positions[-1]] = 1.0
+                else:
+                    subtoken_weights[batch_index, word_id, positions] = 1.0 / len(positions)
+
+        emissions = self.session.run(["emissions"], {
+            "input_ids": encoding["input_ids"].astype(np.int64),
+            "attention_mask": encoding["attention_mask"].astype(np.int64),
+            "subtoken_weights": subtoken_weights
+        })[0]
+        return [emissions[index, :len(sentence_key)] for index, sentence_key in enumerate(sentence_keys)]
+
+
+class SequenceTaggerONNXLoader(CachedModelLoader):
+    """
+    Responsible for loading a SequenceTagger exported to ONNX by scripts/export_compiled_models.py - given its directory.
+    """
+    DIRECTORY_NAME = "onnx"
+    MODEL_FILE_NAME = "model.onnx"
+    INPUTS_FILE_NAME = "inputs.json"
+    # the intra-op thread pool of an ONNX Runtime session does not survive a fork
+    fork_safe = False
+
+    def __init__(self,
+                 model_name_or_path: str,
+                 loading_strategy: str = "local_disk_storage",
+                 model_precision: ModelPrecision = None):
+        """
+        :param model_name_or_path: The directory of the exported ONNX model.
+        :param loading_strategy: The strategy to use for loading the model (e.g., local_disk_storage).
+        :param model_precision: The inference precision, only fp32 is supported by compiled models.
+        """
+        super().__init__(model_name_or_path, loading_strategy, model_precision)
+
+    def _load_model(self) -> ONNXSequenceTagger:
+        """
+        Load the ONNX graph with its tokenizer, decoder and input description.
+        :return: The loaded ONNXSequenceTagger object.
+        """
+        # onnxruntime and transformers are deferred until a model is actually loaded
+        from transformers import AutoTokenizer
+
+        try:
+            if self.loading_strategy == "local_disk_storage":
+                model_directory = Path(self.model_name_or_path)
+                with open(model_directory / self.INPUTS_FILE_NAME, encoding="utf-8") as f:
+                    input_spec: Dict[str, Any] = json.load(f)
+                return ONNXSequenceTagger(session=create_inference_session(model_directory / self.MODEL_FILE_NAME),
+                                          tokenizer=AutoTokenizer.from_pretrained(model_directory, use_fast=True),
+                                          decoder=SequenceTaggerDecoder.load(model_directory),
+                                          subtoken_pooling=input_spec["subtoken_pooling"],
+                                          max_length=input_spec["max_length"])
+            else:
+                raise ValueError(f"Unsupported loading strategy: {self.loading_strategy} for model at {self.model_name_or_path}")
+        except Exception as e:
+            print(f"Failed to load ONNX model for {self._model_name_or_path}: {e}")
+
+    def _get_resident_bytes(self, model: Any) -> int:
+        """
+        Get the size of the exported model files, which the ONNX Runtime session takes when loaded.
+        :param model: The loaded ONNXSequenceTagger object.
+        :return: The size in bytes.
+        """
+        return self._get_directory_bytes(Path(self.model_name_or_path))
\ No newline at end of file
@@ -0,0 +1,170 @@
+from __future__ import annotations
+from functools import lru_cache
+from pathlib import Path
+from src.infrastructure.frameworks.cached_model_loader import CachedModelLoader
+from src.infrastructure.frameworks.compiled_sequence_tagger import CompiledSequenceTagger
+from src.infrastructure.frameworks.model_precision import ModelPrecision
+from src.infrastructure.frameworks.sequence_tagger_decoder import SequenceTaggerDecoder
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
+
+import json
+import re
+
+if TYPE_CHECKING:
+    import numpy as np
+    import torch
+
+
+class TorchScriptSequenceTagger(CompiledSequenceTagger):
+    """
+    A Flair SequenceTagger with word and Flair (character language model) embeddings, compiled to TorchScript.
+    The network takes word indices, character indices and the character positions of every token, which are computed
+    here from the token texts exactly as WordEmbeddings and FlairEmbeddings compute them.
+    """
+
+    def __init__(self, network: torch.jit.ScriptModule, decoder: SequenceTaggerDecoder, input_specs: List[Dict[str, Any]]):
+        """
+        :param network: The scripted network returning the emission scores.
+        :param decoder: The decoder turning emission scores into labels.
+        :param input_specs: The input description of every embedding in the order of the network, see compiled_model_exporter.
+        """
+        super().__init__(decoder)
+        self.network = network
+        self._word_specs: List[Dict[str, Any]] = [spec for spec in input_specs if spec["type"] == "word"]
+        self._char_lm_specs: List[Dict[str, Any]] = [spec for spec in input_specs if spec["type"] == "char_lm"]
+        self._word_index_lookups: List[Callable[[str], int]] = [
+            lru_cache(maxsize=100000)(self._create_word_index_lookup(spec["vocab"])) for spec in self._word_specs
+        ]
+
+    def get_emissions(self, sentence_keys: List[Tuple[str, ...]]) -> List[np.ndarray]:
+        """
+        Run the scripted network on a mini-batch of tokenized sentences.
+        :param sentence_keys: The token texts of every sentence, none of them empty.
+        :return: The emission scores of every sentence with shape (number of tokens, number of tags).
+        """
+        import torch
+
+        lengths: List[int] = [len(sentence_key) for sentence_key in sentence_keys]
+        max_length: int = max(lengths)
+
+        word_indices: List[torch.Tensor] = [
+            torch.tensor([[get_word_index(token) for token in sentence_key] + [0] * (max_length - len(sentence_key))
+                          for sentence_key in sentence_keys], dtype=torch.long)
+            for get_word_index in self._word_index_lookups
+        ]
+        char_indices: List[torch.Tensor] = list()
+        char_positions: List[torch.Tensor] = list()
+        for spec in self._char_lm_specs:
+            indices, positions = self._get_char_lm_inputs(spec, sentence_keys, max_length)
+            char_indices.append(torch.tensor(indices, dtype=torch.long).t())
+            char_positions.append(torch.tensor(positions, dtype=torch.long))
+
+        with torch.inference_mode():
+            emissions = self.network(word_indices, char_indices, char_positions, torch.tensor(lengths, dtype=torch.long))
+        emissions = emissions.float().numpy()
+        return [emissions[index, :length] for index, length in enumerate(lengths)]
+
+    @staticmethod
+    def _create_word_index_lookup(vocab: Dict[str, int]) -> Callable[[str], int]:
+        """
+        Create the vocabulary lookup of WordEmbeddings: the word, its lowercase form, then digits replaced by # and by 0.
+        :param vocab: The vocabulary of the word embeddings.
+        :return: A function mapping a token text to its embedding index, len(vocab) for unknown words.
+        """
+        def get_word_index(word: str) -> int:
+            lowercase_word: str = word.lower()
+            for candidate in (word, lowercase_word, re.sub(r"\d", "#", lowercase_word), re.sub(r"\d", "0", lowercase_word)):
+                if candidate in vocab:
+                    return vocab[candidate]
+            return len(vocab)
+        return get_word_index
+
+    @staticmethod
+    def _get_char_lm_inputs(spec: Dict[str, Any],
+                            sentence_keys: List[Tuple[str, ...]],
+                            max_length: int) -> Tuple[List[List[int]], List[List[int]]]:
+        """
+        Build the character inputs of a Flair language model and the position of every token in its output,
+        following FlairEmbeddings and LanguageModel.get_representation.
+        :param spec: The input description of the language model.
+        :param sentence_keys: The token texts of every sentence.
+        :param max_length: The number of tokens of the longest sentence.
+        :return: The padded character indices and the padded token positions of every sentence.
+        """
+        strings: List[str] = list()
+        positions: List[List[int]] = list()
+        for sentence_key in sentence_keys:
+            sentence_text: str = " ".join(sentence_key)
+            lm_text: str = sentence_text.lower() if spec["is_lower"] else sentence_text
+            if not spec["is_forward_lm"]:
+                lm_text = lm_text[::-1]
+            strings.append(f"{spec['start_marker']}{lm_text}{spec['end_marker']}")
+
+            offset_forward: int = len(spec["start_marker"])
+            offset_backward: int = len(sentence_text) + len(spec["start_marker"])
+            token_positions: List[int] = list()
+            for token in sentence_key:
+                offset_forward += len(token)
+                offset: int = offset_forward if spec["is_forward_lm"] else offset_backward
+                token_positions.append(offset if spec["with_whitespace"] else offset - 1)
+                offset_forward += 1
+                offset_backward -= 1 + len(token)
+            positions.append(token_positions + [0] * (max_length - len(sentence_key)))
+
+        chars: Dict[str, int] = spec["chars"]
+        padding_index: int = spec["padding_index"]
+        longest: int = max(len(string) for string in strings)
+        indices: List[List[int]] = [
+            [chars.get(char, 0) for char in string] + [padding_index] * (longest - len(string))
+            for string in strings
+        ]
+        return indices, positions
+
+
+class SequenceTaggerTorchScriptLoader(CachedModelLoader):
+    """
+    Responsible for loading a SequenceTagger compiled to TorchScript by scripts/export_compiled_models.py - given its directory.
+    """
+    DIRECTORY_NAME = "torchscript"
+    MODEL_FILE_NAME = "model.pt"
+    INPUTS_FILE_NAME = "inputs.json"
+
+    def __init__(self,
+                 model_name_or_path: str,
+                 loading_strategy: str = "local_disk_storage",
+                 model_precision: ModelPrecision = None):
+        """
+        :param model_name_or_path: The directory of the exported TorchScript model.
+        :param loading_strategy: The strategy to use for loading the model (e.g., local_disk_storage).
+        :param model_precision: The inference precision, only fp32 is supported by compiled models.
+        """
+        super().__init__(model_name_or_path, loading_strategy, model_precision)
+
+    def _load_model(self) -> TorchScriptSequenceTagger:
+        """
+        Load the scripted network with its decoder and input description.
+        :return: The loaded TorchScriptSequenceTagger object.
+        """
+        # torch is deferred until a model is actually loaded
+        import torch
+
+        try:
+            if self.loading_strategy == "local_disk_storage":
+                model_directory = Path(self.model_name_or_path)
+                network = torch.jit.load(str(model_directory / self.MODEL_FILE_NAME), map_location="cpu")
+                network.eval()
+                with open(model_directory / self.INPUTS_FILE_NAME, encoding="utf-8") as f:
+                    input_specs: List[Dict[str, Any]] = json.load(f)["embeddings"]
+                return TorchScriptSequenceTagger(network, SequenceTaggerDecoder.load(model_directory), input_specs)
+            else:
+                raise ValueError(f"Unsupported loading strategy: {self.loading_strategy} for model at {self.model_name_or_path}")
+        except Exception as e:
+            print(f"Failed to load TorchScript model for {self._model_name_or_path}: {e}")
+
+    def _get_resident_bytes(self, model: Any) -> int:
+        """
+        Get the size of the exported model files, which the scripted network and the vocabularies take when loaded.
+        :param model: The loaded TorchScriptSequenceTagger object.
+        :return: The size in bytes.
+        """
+        return self._get_directory_bytes(Path(self.model_name_or_path))
\ No newline at end of file
@@ -1,20 +1,47 @@
-from somajo import SoMaJo
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from src.utils import LRUCache, timed_stage
+from typing import Dict, List, NamedTuple, Tuple
+
+import threading
+
+class SoMaJoToken(NamedTuple):
+    """
+    A token together with its character offsets in the tokenized text.
+    """
+    text: str
+    start: int
+    end: int
+
+TokenizedText = Tuple[Tuple[SoMaJoToken, ...], ...]
 
 class SoMaJoTokenizer:
     """
     This class provides methods to tokenize text using the SoMaJo tokenizer.
+    Tokenized texts are memoized in a bounded LRU cache and, for batches, cache misses can be spread across a process pool.
+    Every text is tokenized as a whole, so its sentences are the ones SoMaJo finds in the full text.
     """
 
-    def __init__(self, 
-                 language: str = "de_CMC", 
-                 split_camel_case: bool = False):
+    def __init__(self,
+                 language: str = "de_CMC",
+                 split_camel_case: bool = False,
+                 parallel: int = 1,
+                 cache_size: int = 4096):
         """
         Initialize the SoMaJo tokenizer.
         :param language: The language model to use for tokenization.
         :param split_camel_case: Whether to split camel case words.
+        :param parallel: The number of processes used to tokenize batches of texts.
+        :param cache_size: The number of tokenized texts kept in memory, 0 disables the cache.
         """
+        self._language = language
+        self._split_camel_case = split_camel_case
+        from somajo import SoMaJo
+
         self._tokenizer = SoMaJo(language, split_camel_case=split_camel_case)
+        self._parallel = max(parallel, 1)
+        self._text_cache = LRUCache(max_entries=cache_size)
+        self._process_pool: ProcessPoolExecutor = None
+        self._process_pool_lock = threading.Lock()
 
     def tokenize(self, text: str) -> List[List[str]]:
         """
@@ -22,7 +49,122 @@ class SoMaJoTokenizer:
         :param text: The input text to tokenize.
         :return: A list of tokenized sentences.
         """
-        tokenized_sentences: List[List[str]] = list()
+        return [[token.text for token in sentence] for sentence in self.tokenize_with_offsets(text)]
+
+    def tokenize_with_offsets(self, text: str) -> List[List[SoMaJoToken]]:
+        """
+        Tokenize the input text into sentences, keeping the character offsets of every token.
+        :param text: The input text to tokenize.
+        :return: A list of tokenized sentences, each a list of SoMaJoToken.
+        """
+        return self.tokenize_batch_with_offsets([text])[0]
+
+    def tokenize_batch_with_offsets(self, texts: List[str]) -> List[List[List[SoMaJoToken]]]:
+        """
+        Tokenize a batch of input texts into sentences, keeping the character offsets of every token.
+        Texts seen before are served from the cache, the others are tokenized, in parallel if configured.
+        :param texts: The input texts to tokenize.
+        :return: For every input text, a list of tokenized sentences, each a list of SoMaJoToken.
+        """
+        with timed_stage("somajo_tokenize"):
+            tokenized_texts: Dict[str, TokenizedText] = {}
+            misses: List[str] = list()
+            for text in texts:
+                if text in tokenized_texts:
+                    continue
+                cached: TokenizedText = self._text_cache.get(text)
+                if cached is None:
+                    misses.append(text)
+                    tokenized_texts[text] = None
+                else:
+                    tokenized_texts[text] = cached
+
+            for text, tokenized_text in zip(misses, self._tokenize_texts(misses)):
+                tokenized_texts[text] = tokenized_text
+                self._text_cache.put(text, tokenized_text)
+
+            return [[list(sentence) for sentence in tokenized_texts[text]] for text in texts]
+
+    def close(self) -> None:
+        """
+        Shut down the process pool, if one was started.
+        """
+        with self._process_pool_lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False)
+                self._process_pool = None
+
+    def _tokenize_texts(self, texts: List[str]) -> List[TokenizedText]:
+        """
+        Tokenize texts, spreading them across the process pool if there are enough of them.
+        :param texts: The texts to tokenize.
+        :return: The tokenized texts in the same order.
+        """
+        if self._parallel > 1 and len(texts) > 1:
+            chunksize: int = max(len(texts) // (self._parallel * 4), 1)
+            return list(self._get_process_pool().map(_tokenize_text_in_worker, texts, chunksize=chunksize))
+        return [self._tokenize_text(text) for text in texts]
+
+    def _tokenize_text(self, text: str) -> TokenizedText:
+        """
+        Tokenize a single text into sentences with offsets.
+        :param text: The text to tokenize.
+        :return: The tokenized sentences of the text.
+        """
+        tokenized_sentences: List[Tuple[SoMaJoToken, ...]] = list()
+        cursor: int = 0
         for sentence in self._tokenizer.tokenize_text([text]):
-            tokenized_sentences.append([token.text for token in sentence])
-        return tokenized_sentences
\ No newline at end of file
+            tokenized_sentence: List[SoMaJoToken] = list()
+            for token in sentence:
+                start, end = self._align(text, token.original_spelling or token.text, cursor)
+                tokenized_sentence.append(SoMaJoToken(token.text, start, end))
+                cursor = end
+            tokenized_sentences.append(tuple(tokenized_sentence))
+        return tuple(tokenized_sentences)
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """
+        Get the process pool used for parallel tokenization, starting it on first use.
+        """
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self._parallel,
+                                                         initializer=_init_worker_tokenizer,
+                                                         initargs=(self._language, self._split_camel_case))
+            return self._process_pool
+
+    @staticmethod
+    def _align(text: str, surface: str, cursor: int) -> Tuple[int, int]:
+        """
+        Find the character offsets of the next token in the text.
+        SoMaJo keeps tokens in text order, so the token is expected right after the whitespace following the cursor.
+        :param text: The tokenized text.
+        :param surface: The original spelling of the token.
+        :param cursor: The end offset of the previous token.
+        :return: The (start, end) offsets of the token.
+        """
+        start: int = cursor
+        text_length: int = len(text)
+        while start < text_length and text[start].isspace():
+            start += 1
+        if not text.startswith(surface, start):
+            found: int = text.find(surface, cursor)
+            if found != -1:
+                start = found
+        return start, min(start + len(surface), text_length)
+
+
+_worker_tokenizer: SoMaJoTokenizer = None
+
+def _init_worker_tokenizer(language: str, split_camel_case: bool) -> None:
+    """
+    Create the SoMaJoTokenizer of a process pool worker.
+    """
+    global _worker_tokenizer
+    _worker_tokenizer = SoMaJoTokenizer(language=language, split_camel_case=split_camel_case, cache_size=0)
+
+def _tokenize_text_in_worker(text: str) -> TokenizedText:
+    """
+    Tokenize a text in a process pool worker.
+    """
+    return _worker_tokenizer._tokenize_text(text)
\ No newline at end of file
@@ -0,0 +1,97 @@
+from src.infrastructure.frameworks.somajo_tokenizer import SoMaJoToken, SoMaJoTokenizer
+from typing import Callable, List, NamedTuple, Tuple
+
+class TextChunk(NamedTuple):
+    """
+    A window of a text together with its character offsets in that text.
+    """
+    text: str
+    start: int
+    end: int
+
+class TextChunker:
+    """
+    This class splits texts that exceed the token budget of a model into windows along sentence boundaries.
+    Sentences longer than the budget on their own are split along SoMaJo token boundaries.
+    """
+
+    def __init__(self,
+                 somajo_tokenizer: SoMaJoTokenizer,
+                 count_tokens: Callable[[List[str]], List[int]],
+                 max_tokens: int):
+        """
+        :param somajo_tokenizer: The SoMaJoTokenizer used to find sentence and token boundaries.
+        :param count_tokens: A function returning the number of model tokens for each of the given texts.
+        :param max_tokens: The maximum number of model tokens per window.
+        """
+        self._somajo_tokenizer = somajo_tokenizer
+        self._count_tokens = count_tokens
+        self._max_tokens = max(max_tokens, 1)
+
+    def chunk(self, text: str) -> List[TextChunk]:
+        """
+        Split the text into windows of at most max_tokens model tokens.
+        :param text: The text to split.
+        :return: A list of TextChunk in text order, a single chunk spanning the whole text if it fits.
+        """
+        if self._count_tokens([text])[0] <= self._max_tokens:
+            return [TextChunk(text, 0, len(text))]
+
+        windows: List[Tuple[int, int, int]] = self._pack(text, self._get_segments(text))
+        return [TextChunk(text[start:end], start, end) for start, end, _ in windows]
+
+    def _pack(self, text: str, pieces: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """
+        Join consecutive pieces of the text into windows of at most max_tokens model tokens.
+        Windows are packed by the sum of the token counts of their pieces, then the joined windows are measured,
+        since the subword tokenization of joined pieces may differ from that of the pieces on their own.
+        Windows exceeding the budget are split in halves until they fit or consist of a single piece.
+        :param text: The text the pieces belong to.
+        :param pieces: The (start, end, token count) of the pieces in text order.
+        :return: A list of (start, end, token count) windows in text order, with the measured token counts.
+        """
+        groups: List[List[Tuple[int, int, int]]] = list()
+        group_tokens: int = 0
+        for piece in pieces:
+            if groups and group_tokens + piece[2] <= self._max_tokens:
+                groups[-1].append(piece)
+                group_tokens += piece[2]
+            else:
+                groups.append([piece])
+                group_tokens = piece[2]
+
+        windows: List[Tuple[int, int, int]] = list()
+        while groups:
+            window_token_counts: List[int] = self._count_tokens([text[group[0][0]:group[-1][1]] for group in groups])
+            oversized_groups: List[List[Tuple[int, int, int]]] = list()
+            for group, window_tokens in zip(groups, window_token_counts):
+                if window_tokens <= self._max_tokens or len(group) == 1:
+                    windows.append((group[0][0], group[-1][1], window_tokens))
+                else:
+                    oversized_groups.extend([group[:len(group) // 2], group[len(group) // 2:]])
+            groups = oversized_groups
+
+        return sorted(windows)
+
+    def _get_segments(self, text: str) -> List[Tuple[int, int, int]]:
+        """
+        Get the sentences of the text as (start, end, token count) segments,
+        splitting sentences that exceed max_tokens on their own into smaller segments.
+        :param text: The text to segment.
+        :return: A list of (start, end, token count) tuples in text order.
+        """
+        sentences: List[List[SoMaJoToken]] = [s for s in self._somajo_tokenizer.tokenize_with_offsets(text) if s]
+        sentence_token_counts: List[int] = self._count_tokens([text[s[0].start:s[-1].end] for s in sentences])
+
+        segments: List[Tuple[int, int, int]] = list()
+        for sentence, sentence_tokens in zip(sentences, sentence_token_counts):
+            if sentence_tokens <= self._max_tokens:
+                segments.append((sentence[0].start, sentence[-1].end, sentence_tokens))
+                continue
+
+            # the sentence alone exceeds the budget, fall back to SoMaJo token boundaries
+            word_token_counts: List[int] = self._count_tokens([token.text for token in sentence])
+            segments.extend(self._pack(text, [(token.start, token.end, tokens)
+                                              for token, tokens in zip(sentence, word_token_counts)]))
+
+        return segments
\ No newline at end of file
@@ -0,0 +1,86 @@
+from src.domain.entity_span import EntitySpan
+from src.infrastructure.frameworks.model_inference_maker import ModelInferenceMaker
+from src.infrastructure.services.inference_result_cache import InferenceResultCache
+from src.utils import record_quantity
+from typing import Any, Dict, List
+
+import json
+
+
+class CachingInferenceMaker(ModelInferenceMaker):
+    """
+    Decorator for a deterministic ModelInferenceMaker that serves entity spans of texts seen before from an InferenceResultCache.
+    Results are keyed by entity set id, model id, model version and input text, only cache misses reach the model.
+    All other methods are delegated to the wrapped inference maker.
+    """
+
+    def __init__(self,
+                 model_inference_maker: ModelInferenceMaker,
+                 inference_result_cache: InferenceResultCache,
+                 entity_set_id: str,
+                 model_id: str,
+                 model_version: str):
+        """
+        :param model_inference_maker: The deterministic ModelInferenceMaker to wrap.
+        :param inference_result_cache: The cache to store the results in.
+        :param entity_set_id: The ID of the entity set of the model.
+        :param model_id: The ID of the model.
+        :param model_version: The version of the model.
+        """
+        super().__init__(model_inference_maker.model_loader)
+        self._model_inference_maker = model_inference_maker
+        self._inference_result_cache = inference_result_cache
+        self._key_parts = ("infer_entity_spans", entity_set_id, model_id, model_version)
+
+    def infer(self, input_text: str, **kwargs) -> Any:
+        return self._model_inference_maker.infer(input_text, **kwargs)
+
+    def infer_batch(self, input_texts: List[str], **kwargs) -> List[Any]:
+        return self._model_inference_maker.infer_batch(input_texts, **kwargs)
+
+    def infer_entity_spans(self, input_texts: List[str], **kwargs) -> List[List[EntitySpan]]:
+        """
+        Get the entity spans for a batch of input texts, running only the uncached texts through the model.
+        :param input_texts: The input texts for which inference is to be made.
+        :param **kwargs: Additional keyword arguments for inference.
+        :return: The detected entities as a list of EntitySpan for every input text.
+        """
+        keys: List[str] = [self._inference_result_cache.make_key(*self._key_parts, input_text) for input_text in input_texts]
+        results: List[List[EntitySpan]] = [None] * len(input_texts)
+        missed: Dict[str, List[int]] = {}
+        for index, key in enumerate(keys):
+            if key in missed:
+                missed[key].append(index)
+                continue
+            cached: bytes = self._inference_result_cache.get(key)
+            if cached is None:
+                missed[key] = [index]
+            else:
+                results[index] = self._decode(cached)
+
+        # repeats of a missed text are misses as well, they are not served from the cache but by the single inference of the text
+        missed_texts: int = sum(len(indices) for indices in missed.values())
+        record_quantity("cache_hits", len(input_texts) - missed_texts, cache="inference_result")
+        record_quantity("cache_misses", missed_texts, cache="inference_result")
+        if missed:
+            missed_indices: List[int] = [indices[0] for indices in missed.values()]
+            computed: List[List[EntitySpan]] = self._model_inference_maker.infer_entity_spans(
+                [input_texts[index] for index in missed_indices], **kwargs
+            )
+            for (key, indices), entity_spans in zip(missed.items(), computed):
+                self._inference_result_cache.put(key, self._encode(entity_spans))
+                for index in indices:
+                    results[index] = entity_spans
+
+        return results
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._model_inference_maker, name)
+
+    @staticmethod
+    def _encode(entity_spans: List[EntitySpan]) -> bytes:
+        return json.dumps([list(entity_span) for entity_span in entity_spans], ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    def _decode(value: bytes) -> List[EntitySpan]:
+        return [EntitySpan(*fields) for fields in json.loads(value)]
\ No newline at end of file
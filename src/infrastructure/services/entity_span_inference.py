@@ -0,0 +1,68 @@
+from src.domain.entity_span import EntitySpan, entity_spans_to_output_dict, pseudonymize_text
+from src.infrastructure.frameworks.mt5_for_conditional_generation_inference_maker import ChunkedGeneration
+from src.infrastructure.frameworks.mt5_output_parser import MT5OutputParser
+from src.utils import timed_stage
+from typing import Any, Callable, Dict, List, Optional
+
+# the generation parameters of the pseudonymizing mT5 models
+MT5_GENERATION_KWARGS: Dict[str, Any] = {
+    "max_length": 512,
+    "padding": "longest",
+    "truncation": True,
+    "max_batch_size": 8,
+    "temperature": 0.8,
+    "do_sample": True,
+    "top_k": 100
+}
+
+# the mini batch size of the sequence taggers
+TAGGER_MINI_BATCH_SIZE = 32
+
+
+def infer_entity_spans(infer: Callable[..., List[Any]],
+                       input_texts: List[str],
+                       repeat: int,
+                       mt5_output_parser: Optional[MT5OutputParser] = None) -> List[List[List[EntitySpan]]]:
+    """
+    Run a model on a batch of input texts and get the entity spans of every sample of every input text.
+    :param infer: Calls a batch method of the ModelInferenceMaker by name with input_texts and keyword arguments,
+                  e.g. MicroBatcher.infer.
+    :param input_texts: The input texts.
+    :param repeat: The number of samples per input text of an mT5 model.
+    :param mt5_output_parser: The parser of the generated texts of an mT5 model, None for a sequence tagger.
+    :return: For every input text, the entity spans of every sample. A sequence tagger has a single sample per input text.
+    """
+    if mt5_output_parser is None:
+        entity_spans_per_input: List[List[EntitySpan]] = infer("infer_entity_spans",
+                                                                input_texts=input_texts,
+                                                                mini_batch_size=TAGGER_MINI_BATCH_SIZE)
+        return [[entity_spans] for entity_spans in entity_spans_per_input]
+
+    chunked_generations: List[ChunkedGeneration] = infer("infer_chunked",
+                                                         input_texts=input_texts,
+                                                         repeat_count=repeat,
+                                                         **MT5_GENERATION_KWARGS)
+    return [
+        [mt5_output_parser.parse_chunks(input_text, chunked_generation.chunks, predicted_texts)
+         for predicted_texts in chunked_generation.samples]
+        for input_text, chunked_generation in zip(input_texts, chunked_generations)
+    ]
+
+
+def to_output_items(input_texts: List[str],
+                    entity_spans_per_input: List[List[List[EntitySpan]]],
+                    with_pseudonym: bool) -> List[List[Dict[str, Any]]]:
+    """
+    Serialize the entity spans of every sample of every input text to the DataItem layout of /predict.
+    :param input_texts: The input texts the spans point into.
+    :param entity_spans_per_input: For every input text, the entity spans of every sample.
+    :param with_pseudonym: Whether the model generates pseudonyms, otherwise output_text is not available.
+    :return: For every input text, one {"output_dict": ..., "output_text": ...} dict per sample.
+    """
+    with timed_stage("serialize"):
+        return [
+            [{"output_dict": entity_spans_to_output_dict(entity_spans, with_pseudonym=with_pseudonym),
+              "output_text": pseudonymize_text(input_text, entity_spans) if with_pseudonym else "not_available"}
+             for entity_spans in entity_spans_per_sample]
+            for input_text, entity_spans_per_sample in zip(input_texts, entity_spans_per_input)
+        ]
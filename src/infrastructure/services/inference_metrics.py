@@ -0,0 +1,168 @@
+from src.utils import add_quantity_listener, add_stage_listener, remove_quantity_listener, remove_stage_listener
+from typing import Dict, List, Tuple
+
+import bisect
+import math
+import threading
+
+LabelValues = Tuple[str, ...]
+
+
+class _Histogram:
+    """
+    A Prometheus histogram family, one series per combination of label values.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: List[str], buckets: List[float]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = sorted(buckets)
+        # per series: the count of every bucket (not cumulative, the last one is +Inf), the sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, label_values: LabelValues, value: float) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines: List[str] = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, (bucket_counts, total) in sorted(self._series.items()):
+            labels: str = _format_labels(self.label_names, label_values)
+            cumulative: int = 0
+            for upper_bound, count in zip(self.buckets + [math.inf], bucket_counts):
+                cumulative += count
+                le: str = "+Inf" if upper_bound == math.inf else repr(float(upper_bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names + ['le'], label_values + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {total[0]!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Counter:
+    """
+    A Prometheus counter family, one series per combination of label values.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: List[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._series: Dict[LabelValues, float] = {}
+
+    def inc(self, label_values: LabelValues, value: float = 1.0) -> None:
+        self._series[label_values] = self._series.get(label_values, 0.0) + value
+
+    def render(self) -> List[str]:
+        lines: List[str] = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, total in sorted(self._series.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {float(total)!r}")
+        return lines
+
+
+def _format_labels(label_names: List[str], label_values: LabelValues) -> str:
+    escaped = [value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in label_values]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(label_names, escaped)) + "}"
+
+
+class InferenceMetrics:
+    """
+    Per entity set and model metrics of the inference pipeline, rendered in the Prometheus text exposition format.
+    The metrics are fed by the stage and quantity listeners of src.utils, so every timed_stage and record_quantity
+    labelled with an entity_set_id and a model_id (see stage_labels) is counted. Unlabelled events, e.g. the
+    warm up at start up, are ignored.
+
+    Every process keeps its own metrics, with the prefork server a scrape reports the worker that answered it.
+    """
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    PREFIX = "redakto"
+    STAGE_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+    CHARS_BUCKETS = [64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 65536]
+    TOKENS_BUCKETS = [16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384]
+    BATCH_TEXTS_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+
+    def __init__(self):
+        model_labels: List[str] = ["entity_set_id", "model_id"]
+        self._lock = threading.Lock()
+        self._stage_seconds = _Histogram(f"{self.PREFIX}_stage_duration_seconds",
+                                         "Time spent per processing stage.",
+                                         model_labels + ["stage"], self.STAGE_BUCKETS)
+        self._input_chars = _Histogram(f"{self.PREFIX}_input_chars",
+                                       "Characters per input text.",
+                                       model_labels, self.CHARS_BUCKETS)
+        self._output_tokens = _Counter(f"{self.PREFIX}_output_tokens_total",
+                                       "Generated tokens, or labelled tokens of taggers.",
+                                       model_labels)
+        self._batch_texts = _Histogram(f"{self.PREFIX}_batch_texts",
+                                       "Texts per batched inference call.",
+                                       model_labels, self.BATCH_TEXTS_BUCKETS)
+        self._batch_tokens = _Histogram(f"{self.PREFIX}_batch_tokens",
+                                        "Estimated tokens per batched inference call.",
+                                        model_labels, self.TOKENS_BUCKETS)
+        self._cache_requests = _Counter(f"{self.PREFIX}_cache_requests_total",
+                                        "Cache lookups by cache and result.",
+                                        model_labels + ["cache", "result"])
+        self._families = [self._stage_seconds, self._input_chars, self._output_tokens,
+                          self._batch_texts, self._batch_tokens, self._cache_requests]
+
+    def install(self) -> None:
+        """
+        Start collecting the stages and quantities reported in this process.
+        """
+        add_stage_listener(self.observe_stage)
+        add_quantity_listener(self.observe_quantity)
+
+    def uninstall(self) -> None:
+        """
+        Stop collecting.
+        """
+        remove_stage_listener(self.observe_stage)
+        remove_quantity_listener(self.observe_quantity)
+
+    def observe_stage(self, stage: str, elapsed: float, labels: Dict[str, str]) -> None:
+        """
+        Stage listener, see src.utils.add_stage_listener.
+        """
+        model_label_values: LabelValues = self._get_model_label_values(labels)
+        if model_label_values is None:
+            return
+        with self._lock:
+            self._stage_seconds.observe(model_label_values + (stage,), elapsed)
+
+    def observe_quantity(self, quantity: str, value: float, labels: Dict[str, str]) -> None:
+        """
+        Quantity listener, see src.utils.add_quantity_listener.
+        """
+        model_label_values: LabelValues = self._get_model_label_values(labels)
+        if model_label_values is None:
+            return
+        with self._lock:
+            if quantity == "input_chars":
+                self._input_chars.observe(model_label_values, value)
+            elif quantity == "output_tokens":
+                self._output_tokens.inc(model_label_values, value)
+            elif quantity == "batch_texts":
+                self._batch_texts.observe(model_label_values, value)
+            elif quantity == "batch_tokens":
+                self._batch_tokens.observe(model_label_values, value)
+            elif quantity in ["cache_hits", "cache_misses"]:
+                result: str = "hit" if quantity == "cache_hits" else "miss"
+                self._cache_requests.inc(model_label_values + (labels.get("cache", ""), result), value)
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+        :return: The exposition, served with CONTENT_TYPE.
+        """
+        with self._lock:
+            lines: List[str] = [line for family in self._families for line in family.render()]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _get_model_label_values(labels: Dict[str, str]) -> LabelValues:
+        if not labels.get("entity_set_id") or not labels.get("model_id"):
+            return None
+        return labels["entity_set_id"], labels["model_id"]
\ No newline at end of file
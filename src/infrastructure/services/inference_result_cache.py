@@ -0,0 +1,196 @@
+from pathlib import Path
+from src.utils import LRUCache
+from typing import Dict, List, Optional, Tuple, Union
+
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+class InferenceResultCache:
+    """
+    Content-addressed cache for serialized inference results.
+    Results are kept in an in-memory LRU tier bounded by bytes and, optionally, in a SQLite tier that survives restarts.
+    Entries found only on disk are promoted to memory on access, keeping the time they were created.
+    Both tiers are bounded by age, the disk tier also by bytes, its oldest entries are evicted first.
+    Results contain the entities found in the input texts, i.e. personal data, so the disk tier is opt-in:
+    its database must be stored, protected and deleted like the input texts themselves.
+    """
+    # how often expired disk entries are purged while results are put
+    PURGE_INTERVAL_SECONDS = 60.0
+
+    def __init__(self,
+                 max_memory_bytes: int = 64 * 1024 * 1024,
+                 sqlite_path: Optional[Union[str, Path]] = None,
+                 max_disk_bytes: int = 1024 * 1024 * 1024,
+                 max_age_seconds: Optional[float] = 7 * 24 * 3600):
+        """
+        :param max_memory_bytes: The maximum total size of the results kept in memory.
+        :param sqlite_path: The path of the SQLite database of the disk tier, None disables the disk tier.
+        :param max_disk_bytes: The maximum total size of the results kept on disk.
+        :param max_age_seconds: How long results are cached, None keeps them until they are evicted by size.
+        """
+        # memory entries are (created_at, value) tuples, their size is the size of the value
+        self._memory = LRUCache(max_entries=2 ** 31, max_size=max_memory_bytes, get_size=lambda entry: len(entry[1]))
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection = None
+        self._sqlite_path: Optional[Union[str, Path]] = sqlite_path
+        self._max_disk_bytes = max(max_disk_bytes, 0)
+        self._max_age_seconds = max_age_seconds
+        # the size of the disk tier as seen by this process, other processes sharing the database add to it as well
+        self._disk_bytes = 0
+        self._purged_at = 0.0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        self.open()
+
+    def open(self) -> None:
+        """
+        Open the disk tier if one is configured and it is not open yet.
+        SQLite connections must not be carried across a fork, a forked process closes the tier before and reopens it after.
+        """
+        with self._lock:
+            if not self._sqlite_path or self._connection is not None:
+                return
+            Path(self._sqlite_path).parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self._sqlite_path), check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS inference_results (key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL, "
+                "size INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns: List[str] = [row[1] for row in self._connection.execute("PRAGMA table_info(inference_results)")]
+            if "size" not in columns:
+                # databases written before the disk tier was bounded
+                self._connection.execute("ALTER TABLE inference_results ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                self._connection.execute("UPDATE inference_results SET size = length(value)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS inference_results_created_at ON inference_results (created_at)")
+            self._connection.commit()
+            self._evict_disk(time.time())
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """
+        Build a content-addressed key from its parts, e.g. entity set id, model id, model version and input text.
+        :param *parts: The parts identifying the result.
+        :return: The hex digest of the parts.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            encoded: bytes = part.encode("utf-8")
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Look up a serialized result.
+        :param key: The key of the result.
+        :return: The serialized result, or None if it is not cached.
+        """
+        expired_before: float = self._get_expired_before(time.time())
+        entry: Optional[Tuple[float, bytes]] = self._memory.get(key)
+        if entry is not None and entry[0] >= expired_before:
+            with self._lock:
+                self.memory_hits += 1
+            return entry[1]
+
+        if self._connection is not None:
+            with self._lock:
+                row = self._connection.execute("SELECT value, created_at FROM inference_results WHERE key = ? AND created_at >= ?",
+                                               (key, expired_before)).fetchone()
+            if row is not None:
+                value: bytes = bytes(row[0])
+                self._memory.put(key, (row[1], value))
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: bytes) -> None:
+        """
+        Cache a serialized result in all tiers, evicting the oldest disk entries once the disk tier is full.
+        :param key: The key of the result.
+        :param value: The serialized result.
+        """
+        now: float = time.time()
+        self._memory.put(key, (now, value))
+        if self._connection is not None:
+            with self._lock:
+                if self._connection is None or len(value) > self._max_disk_bytes:
+                    return
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO inference_results (key, value, created_at, size) VALUES (?, ?, ?, ?)",
+                    (key, value, now, len(value))
+                )
+                self._connection.commit()
+                self._disk_bytes += len(value)
+                if self._disk_bytes > self._max_disk_bytes or now - self._purged_at >= self.PURGE_INTERVAL_SECONDS:
+                    self._evict_disk(now)
+
+    def _get_expired_before(self, now: float) -> float:
+        """
+        :return: The creation time before which entries are expired.
+        """
+        return now - self._max_age_seconds if self._max_age_seconds is not None else float("-inf")
+
+    def _evict_disk(self, now: float) -> None:
+        """
+        Delete the expired disk entries, then the oldest ones until the disk tier is within max_disk_bytes.
+        The size is measured in the database, since processes sharing it each only see their own writes.
+        The oldest entries are evicted down to nine tenths of the budget, so that the size is not measured on every put.
+        Must be called with the lock held and the disk tier open.
+        """
+        with self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            evicted: int = self._connection.execute("DELETE FROM inference_results WHERE created_at < ?",
+                                                    (self._get_expired_before(now),)).rowcount
+            disk_bytes: int = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM inference_results").fetchone()[0]
+            if disk_bytes > self._max_disk_bytes:
+                target_bytes: int = self._max_disk_bytes * 9 // 10
+                keys: List[str] = list()
+                for key, size in self._connection.execute("SELECT key, size FROM inference_results ORDER BY created_at"):
+                    if disk_bytes <= target_bytes:
+                        break
+                    keys.append(key)
+                    disk_bytes -= size
+                self._connection.executemany("DELETE FROM inference_results WHERE key = ?", ((key,) for key in keys))
+                evicted += len(keys)
+        self._disk_bytes = disk_bytes
+        self._purged_at = now
+        self.disk_evictions += evicted
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the counters of the cache.
+        :return: A dictionary with hit, miss and eviction counters and the tier sizes.
+                 evictions counts the entries evicted from either tier, by size or by age.
+        """
+        memory_stats: Dict[str, int] = self._memory.stats()
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": memory_stats["evictions"] + self.disk_evictions,
+                "memory_evictions": memory_stats["evictions"],
+                "disk_evictions": self.disk_evictions,
+                "memory_entries": memory_stats["entries"],
+                "memory_bytes": memory_stats["size"],
+                "disk_bytes": self._disk_bytes
+            }
+
+    def close(self) -> None:
+        """
+        Close the disk tier.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
\ No newline at end of file
@@ -0,0 +1,251 @@
+from pathlib import Path
+from src.domain.exceptions import JobNotFoundError
+from typing import Any, List, NamedTuple, Optional, Tuple, Union
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class Job(NamedTuple):
+    """
+    The state and progress of a batch job.
+    state is one of queued, running, completed and failed, completed_texts counts the texts with stored results.
+    """
+    job_id: str
+    entity_set_id: str
+    model_id: str
+    repeat: int
+    state: str
+    total_texts: int
+    completed_texts: int
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    error: Optional[str]
+
+
+class JobQueue:
+    """
+    Persistent queue of batch jobs in a local SQLite database, shared by all processes of the server.
+    The input texts and the results of a job are stored per text, so a job interrupted by a restart or a crashed
+    worker continues with its first text without a result once its lease has expired.
+    Running jobs hold a lease which their runner renews with every stored chunk of results. Only the runner holding
+    the lease may store results or finish the job, a runner whose lease has been taken over stops after its current chunk.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    def __init__(self, sqlite_path: Union[str, Path], lease_seconds: float = 300.0):
+        """
+        :param sqlite_path: The path of the SQLite database.
+        :param lease_seconds: How long a running job stays claimed without progress before another runner may take it over.
+        """
+        self._sqlite_path = sqlite_path
+        self._lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection = None
+        self.open()
+
+    def open(self) -> None:
+        """
+        Open the database if it is not open yet.
+        SQLite connections must not be carried across a fork, a forked process closes the queue before and reopens it after.
+        """
+        with self._lock:
+            if self._connection is not None:
+                return
+            Path(self._sqlite_path).parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self._sqlite_path), check_same_thread=False, isolation_level=None,
+                                               timeout=30.0)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, entity_set_id TEXT NOT NULL, "
+                "model_id TEXT NOT NULL, repeat INTEGER NOT NULL, state TEXT NOT NULL, total_texts INTEGER NOT NULL, "
+                "completed_texts INTEGER NOT NULL, created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+                "lease_expires_at REAL, lease_owner TEXT, error TEXT)"
+            )
+            columns: List[str] = [row[1] for row in self._connection.execute("PRAGMA table_info(jobs)")]
+            if "lease_owner" not in columns:
+                # databases written before leases had an owner
+                self._connection.execute("ALTER TABLE jobs ADD COLUMN lease_owner TEXT")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS job_texts (job_id TEXT NOT NULL, text_index INTEGER NOT NULL, "
+                "input_text TEXT NOT NULL, output TEXT, PRIMARY KEY (job_id, text_index))"
+            )
+
+    def close(self) -> None:
+        """
+        Close the database.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def submit(self, entity_set_id: str, model_id: str, repeat: int, input_texts: List[str]) -> Job:
+        """
+        Queue a batch job.
+        :param entity_set_id: The ID of the entity set of the model.
+        :param model_id: The ID of the model.
+        :param repeat: The repeat of the prediction, see ApiRequest.
+        :param input_texts: The texts to predict.
+        :return: The queued job.
+        """
+        job_id: str = uuid.uuid4().hex
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.execute(
+                "INSERT INTO jobs (job_id, entity_set_id, model_id, repeat, state, total_texts, completed_texts, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                (job_id, entity_set_id, model_id, repeat, self.QUEUED, len(input_texts), time.time())
+            )
+            self._connection.executemany(
+                "INSERT INTO job_texts (job_id, text_index, input_text) VALUES (?, ?, ?)",
+                ((job_id, text_index, input_text) for text_index, input_text in enumerate(input_texts))
+            )
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Job:
+        """
+        Get the state and progress of a job.
+        :param job_id: The ID of the job.
+        :return: The job.
+        :raises JobNotFoundError: If there is no such job.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT job_id, entity_set_id, model_id, repeat, state, total_texts, completed_texts, created_at, "
+                "started_at, finished_at, error FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            raise JobNotFoundError(job_id)
+        return Job(*row)
+
+    def get_results(self, job_id: str, offset: int, limit: int) -> List[Any]:
+        """
+        Get a page of the results of a job, results are stored in the order of the input texts.
+        :param job_id: The ID of the job.
+        :param offset: The index of the first input text.
+        :param limit: The maximum number of results.
+        :return: The results of the input texts from offset on which have one, at most limit of them.
+        :raises JobNotFoundError: If there is no such job.
+        """
+        self.get_job(job_id)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT output FROM job_texts WHERE job_id = ? AND text_index >= ? AND output IS NOT NULL "
+                "ORDER BY text_index LIMIT ?", (job_id, offset, limit)
+            ).fetchall()
+        return [json.loads(output) for output, in rows]
+
+    def delete(self, job_id: str) -> None:
+        """
+        Delete a job with its texts and results, a runner working on it stops after its current chunk.
+        :param job_id: The ID of the job.
+        :raises JobNotFoundError: If there is no such job.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            deleted: int = self._connection.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,)).rowcount
+            self._connection.execute("DELETE FROM job_texts WHERE job_id = ?", (job_id,))
+        if not deleted:
+            raise JobNotFoundError(job_id)
+
+    def claim(self, lease_owner: str) -> Optional[Job]:
+        """
+        Claim the oldest queued job, or a running job whose lease has expired, for the calling runner.
+        :param lease_owner: The ID of the calling runner, which it stores the results and finishes the job with.
+        :return: The claimed job, or None if there is none.
+        """
+        now: float = time.time()
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            row = self._connection.execute(
+                "SELECT job_id FROM jobs WHERE state = ? OR (state = ? AND lease_expires_at < ?) "
+                "ORDER BY created_at LIMIT 1", (self.QUEUED, self.RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE jobs SET state = ?, started_at = COALESCE(started_at, ?), lease_expires_at = ?, lease_owner = ? "
+                "WHERE job_id = ?", (self.RUNNING, now, now + self._lease_seconds, lease_owner, row[0])
+            )
+        return self.get_job(row[0])
+
+    def get_pending_texts(self, job_id: str, limit: int) -> List[Tuple[int, str]]:
+        """
+        Get the next input texts of a job without a result.
+        :param job_id: The ID of the job.
+        :param limit: The maximum number of texts.
+        :return: The index and the input text of each of them.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT text_index, input_text FROM job_texts WHERE job_id = ? AND output IS NULL "
+                "ORDER BY text_index LIMIT ?", (job_id, limit)
+            ).fetchall()
+
+    def store_results(self, job_id: str, lease_owner: str, results: List[Tuple[int, Any]]) -> bool:
+        """
+        Store the results of input texts of a running job and renew its lease.
+        Texts which have a result already keep it and are not counted again.
+        :param job_id: The ID of the job.
+        :param lease_owner: The ID of the runner the job was claimed by.
+        :param results: The index of the input text and its result, which is stored as JSON.
+        :return: False if the job has been deleted or its lease taken over meanwhile, True otherwise.
+        """
+        now: float = time.time()
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            owned = self._connection.execute(
+                "SELECT 1 FROM jobs WHERE job_id = ? AND state = ? AND lease_owner = ?", (job_id, self.RUNNING, lease_owner)
+            ).fetchone()
+            if owned is None:
+                return False
+            stored: int = self._connection.executemany(
+                "UPDATE job_texts SET output = ? WHERE job_id = ? AND text_index = ? AND output IS NULL",
+                ((json.dumps(result, ensure_ascii=False), job_id, text_index) for text_index, result in results)
+            ).rowcount
+            self._connection.execute(
+                "UPDATE jobs SET completed_texts = completed_texts + ?, lease_expires_at = ? WHERE job_id = ?",
+                (stored, now + self._lease_seconds, job_id)
+            )
+        return True
+
+    def finish(self, job_id: str, lease_owner: str, error: Optional[str] = None) -> None:
+        """
+        Mark a running job as completed, or as failed with an error, unless its lease has been taken over meanwhile.
+        :param job_id: The ID of the job.
+        :param lease_owner: The ID of the runner the job was claimed by.
+        :param error: The error the job failed with, None if it completed.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, lease_expires_at = NULL, lease_owner = NULL, error = ? "
+                "WHERE job_id = ? AND state = ? AND lease_owner = ?",
+                (self.FAILED if error else self.COMPLETED, time.time(), error, job_id, self.RUNNING, lease_owner)
+            )
+
+    def delete_finished(self, older_than_seconds: float) -> int:
+        """
+        Delete the completed and failed jobs which finished more than older_than_seconds ago.
+        :param older_than_seconds: The retention of finished jobs.
+        :return: The number of deleted jobs.
+        """
+        finished_before: float = time.time() - older_than_seconds
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            job_ids: List[str] = [job_id for job_id, in self._connection.execute(
+                "SELECT job_id FROM jobs WHERE state IN (?, ?) AND finished_at < ?",
+                (self.COMPLETED, self.FAILED, finished_before)
+            ).fetchall()]
+            for job_id in job_ids:
+                self._connection.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+                self._connection.execute("DELETE FROM job_texts WHERE job_id = ?", (job_id,))
+        return len(job_ids)
@@ -0,0 +1,118 @@
+from src.infrastructure.services.job_queue import Job, JobQueue
+from src.infrastructure.services.model_service import ModelService
+from typing import Any, Callable, List, Tuple
+
+import threading
+import time
+import uuid
+
+# (entity_set_id, model_id, repeat, input_texts) -> the result of every input text
+ProcessTexts = Callable[[str, str, int, List[str]], List[Any]]
+
+
+class JobRunner:
+    """
+    In-process worker pool running the batch jobs of a JobQueue in chunks of texts.
+    Jobs run at a lower priority than interactive requests: a chunk is only started while the ModelExecutor
+    of the model of the job has no requests in flight, or once it has been deferred for max_defer_seconds,
+    so that a steady stream of requests cannot starve the jobs.
+    """
+
+    def __init__(self,
+                 job_queue: JobQueue,
+                 model_service: ModelService,
+                 process_texts: ProcessTexts,
+                 workers: int = 1,
+                 chunk_size: int = 16,
+                 max_defer_seconds: float = 5.0,
+                 poll_seconds: float = 1.0,
+                 retention_seconds: float = 7 * 24 * 3600,
+                 name: str = "job-runner"):
+        """
+        :param job_queue: The queue to take the jobs from.
+        :param model_service: The model service, whose model executors tell whether interactive requests are in flight.
+        :param process_texts: The function predicting a chunk of texts the way /predict does.
+        :param workers: The number of worker threads, each running one job at a time.
+        :param chunk_size: The number of texts predicted and stored at a time.
+        :param max_defer_seconds: How long a chunk waits at most for the interactive requests to finish.
+        :param poll_seconds: How long an idle worker waits before looking for a job again.
+        :param retention_seconds: How long the results of finished jobs are kept.
+        :param name: The name of the executor, used as thread name prefix.
+        """
+        self._job_queue = job_queue
+        self._model_service = model_service
+        self._process_texts = process_texts
+        self._workers = max(workers, 1)
+        self._chunk_size = max(chunk_size, 1)
+        self._max_defer_seconds = max_defer_seconds
+        self._poll_seconds = poll_seconds
+        self._retention_seconds = retention_seconds
+        self._name = name
+        self._threads: List[threading.Thread] = list()
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        """
+        Start the worker threads.
+        """
+        self._stopping.clear()
+        for worker_index in range(self._workers):
+            thread = threading.Thread(target=self._run, name=f"{self._name}-{worker_index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Stop the worker threads after their current chunk, the interrupted jobs continue once their lease expires.
+        :param timeout: How long to wait for every thread.
+        """
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def _run(self) -> None:
+        # identifies the leases of this worker thread, across the processes sharing the queue
+        lease_owner: str = uuid.uuid4().hex
+        while not self._stopping.is_set():
+            try:
+                job: Job = self._job_queue.claim(lease_owner)
+                if job is None:
+                    self._job_queue.delete_finished(self._retention_seconds)
+                    self._stopping.wait(self._poll_seconds)
+                    continue
+                self._run_job(job, lease_owner)
+            except Exception as e:
+                print(f"{self._name} failed: {str(e)}")
+                self._stopping.wait(self._poll_seconds)
+
+    def _run_job(self, job: Job, lease_owner: str) -> None:
+        """
+        Predict the texts of a job without a result chunk by chunk, storing the results of every chunk.
+        Stops once the job has been deleted or its lease has been taken over by another runner.
+        """
+        while not self._stopping.is_set():
+            pending_texts: List[Tuple[int, str]] = self._job_queue.get_pending_texts(job.job_id, self._chunk_size)
+            if not pending_texts:
+                self._job_queue.finish(job.job_id, lease_owner)
+                return
+            self._yield_to_requests(job)
+            try:
+                results: List[Any] = self._process_texts(job.entity_set_id, job.model_id, job.repeat,
+                                                         [input_text for _, input_text in pending_texts])
+            except Exception as e:
+                print(f"{self._name} failed job {job.job_id}: {str(e)}")
+                self._job_queue.finish(job.job_id, lease_owner, error=str(e))
+                return
+            if not self._job_queue.store_results(job.job_id, lease_owner, [(text_index, result) for (text_index, _), result
+                                                                           in zip(pending_texts, results)]):
+                return
+
+    def _yield_to_requests(self, job: Job) -> None:
+        """
+        Wait while interactive requests for the model of the job are in flight, at most max_defer_seconds.
+        """
+        model_executor = self._model_service.get_model_executor(job.entity_set_id, job.model_id)
+        deadline: float = time.monotonic() + self._max_defer_seconds
+        while model_executor.in_flight > 0 and time.monotonic() < deadline and not self._stopping.is_set():
+            time.sleep(0.01)
@@ -0,0 +1,218 @@
+from collections import deque
+from concurrent.futures import Future
+from src.infrastructure.frameworks.model_inference_maker import ModelInferenceMaker
+from src.utils import collect_stage_timings, current_stage_labels, merge_stage_timings, record_quantity, stage_labels
+from typing import Any, Deque, Dict, Hashable, List
+
+import math
+import threading
+import time
+
+
+class _PendingRequest:
+    """
+    A request waiting in the MicroBatcher queue.
+    """
+    __slots__ = ("batch_key", "method", "input_texts", "kwargs", "estimated_tokens", "enqueued_at", "future", "stage_timings", "labels")
+
+    def __init__(self, batch_key: Hashable, method: str, input_texts: List[str], kwargs: Dict[str, Any]):
+        self.batch_key = batch_key
+        self.method = method
+        self.input_texts = input_texts
+        self.kwargs = kwargs
+        self.estimated_tokens = sum(MicroBatcher.estimate_tokens(text) for text in input_texts)
+        self.enqueued_at = time.monotonic()
+        self.future: Future = Future()
+        self.stage_timings: Dict[str, float] = {}
+        self.labels: Dict[str, str] = current_stage_labels()
+
+
+class MicroBatcher:
+    """
+    Batching scheduler in front of a ModelInferenceMaker.
+    Requests submitted concurrently are collected for up to max_wait_ms, or until max_batch_tokens is reached,
+    and run through a single batched inference call whose results are scattered back to the waiting callers.
+    Only requests for the same inference method with the same keyword arguments share a batch.
+    """
+
+    def __init__(self,
+                 model_inference_maker: ModelInferenceMaker,
+                 max_wait_ms: float = 10.0,
+                 max_batch_tokens: int = 8192,
+                 enabled: bool = True,
+                 name: str = "micro-batcher"):
+        """
+        :param model_inference_maker: The ModelInferenceMaker to run the batches with.
+        :param max_wait_ms: How long the first request of a batch waits for others to join.
+        :param max_batch_tokens: The (estimated) token budget of a batch.
+        :param enabled: If False, requests are run directly in the calling thread.
+        :param name: The name of the worker thread.
+        """
+        self._model_inference_maker = model_inference_maker
+        self._max_wait_s = max(max_wait_ms, 0.0) / 1000.0
+        self._max_batch_tokens = max(max_batch_tokens, 1)
+        self._enabled = enabled
+        self._name = name
+        self._queue: Deque[_PendingRequest] = deque()
+        self._condition = threading.Condition()
+        self._worker: threading.Thread = None
+        self._closed = False
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """
+        Cheap estimate of the number of subword tokens of a text (about four characters per token).
+        :param text: The text to estimate the tokens of.
+        :return: The estimated number of tokens.
+        """
+        return max(math.ceil(len(text) / 4), 1)
+
+    def submit(self, method: str, input_texts: List[str], **kwargs) -> Future:
+        """
+        Queue input texts for a batched call of the given inference method.
+        :param method: The batch method of the ModelInferenceMaker to call, e.g. infer_batch.
+        :param input_texts: The input texts of this request.
+        :param **kwargs: Additional keyword arguments for inference.
+        :return: A Future resolving to the list of results for input_texts.
+        """
+        return self._enqueue(method, input_texts, kwargs).future
+
+    def infer(self, method: str, input_texts: List[str], **kwargs) -> List[Any]:
+        """
+        Queue input texts for a batched call and wait for their results.
+        :param method: The batch method of the ModelInferenceMaker to call, e.g. infer_batch.
+        :param input_texts: The input texts of this request.
+        :param **kwargs: Additional keyword arguments for inference.
+        :return: The list of results for input_texts.
+        """
+        request: _PendingRequest = self._enqueue(method, input_texts, kwargs)
+        results: List[Any] = request.future.result()
+        # the stage timings of the shared batch are reported to every request of the batch
+        merge_stage_timings(request.stage_timings)
+        return results
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker thread once the queued requests are processed.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._worker is not None:
+            self._worker.join()
+
+    def _enqueue(self, method: str, input_texts: List[str], kwargs: Dict[str, Any]) -> _PendingRequest:
+        request = _PendingRequest(self._get_batch_key(method, kwargs), method, list(input_texts), kwargs)
+        if not self._enabled:
+            record_quantity("batch_texts", len(request.input_texts))
+            record_quantity("batch_tokens", request.estimated_tokens)
+            try:
+                request.future.set_result(getattr(self._model_inference_maker, method)(request.input_texts, **kwargs))
+            except Exception as e:
+                request.future.set_exception(e)
+            return request
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(f"{self._name} is shut down")
+            self._ensure_worker()
+            self._queue.append(request)
+            self._condition.notify()
+        return request
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._worker.start()
+
+    @staticmethod
+    def _get_batch_key(method: str, kwargs: Dict[str, Any]) -> Hashable:
+        try:
+            return method, tuple(sorted(kwargs.items()))
+        except TypeError:
+            return method, repr(sorted(kwargs.items()))
+
+    def _run(self) -> None:
+        # the worker serves every later request of the model, so it must outlive any failure of a batch,
+        # a failure only fails the requests taken from the queue for the batch, the queued ones wait for the next
+        while True:
+            batch: List[_PendingRequest] = list()
+            try:
+                if not self._next_batch(batch):
+                    return
+            except Exception as e:
+                print(f"{self._name} failed to collect a batch: {str(e)}")
+                self._fail(batch, e)
+                continue
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                print(f"{self._name} failed: {str(e)}")
+                self._fail(batch, e)
+
+    @staticmethod
+    def _fail(batch: List[_PendingRequest], e: Exception) -> None:
+        for request in batch:
+            if not request.future.done():
+                request.future.set_exception(e)
+
+    def _next_batch(self, batch: List[_PendingRequest]) -> bool:
+        """
+        Wait for the first request, then collect compatible requests until the window closes or the budget is used up.
+        Every request is added to batch as soon as it is taken from the queue, so a failure can fail exactly those.
+        :param batch: The empty list to collect the requests of the next batch in.
+        :return: False once shut down with an empty queue, True otherwise.
+        """
+        with self._condition:
+            while not self._queue:
+                if self._closed:
+                    return False
+                self._condition.wait()
+
+            first: _PendingRequest = self._queue.popleft()
+            batch.append(first)
+            batch_tokens: int = first.estimated_tokens
+            deadline: float = first.enqueued_at + self._max_wait_s
+
+            while batch_tokens < self._max_batch_tokens:
+                joined = False
+                for request in list(self._queue):
+                    if request.batch_key != first.batch_key:
+                        continue
+                    if batch_tokens + request.estimated_tokens > self._max_batch_tokens:
+                        continue
+                    self._queue.remove(request)
+                    batch.append(request)
+                    batch_tokens += request.estimated_tokens
+                    joined = True
+
+                remaining: float = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    break
+                if not joined:
+                    self._condition.wait(remaining)
+
+            return True
+
+    def _run_batch(self, batch: List[_PendingRequest]) -> None:
+        """
+        Run one batched inference call and scatter the results to the futures of the requests.
+        """
+        first: _PendingRequest = batch[0]
+        input_texts: List[str] = [text for request in batch for text in request.input_texts]
+        # the stages of the batch run in the worker thread, under the labels of the request that opened it
+        with stage_labels(**first.labels), collect_stage_timings() as stage_timings:
+            record_quantity("batch_texts", len(input_texts))
+            record_quantity("batch_tokens", sum(request.estimated_tokens for request in batch))
+            try:
+                results: List[Any] = getattr(self._model_inference_maker, first.method)(input_texts, **first.kwargs)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                return
+
+        cursor: int = 0
+        for request in batch:
+            request.stage_timings = stage_timings
+            request.future.set_result(results[cursor: cursor + len(request.input_texts)])
+            cursor += len(request.input_texts)
\ No newline at end of file
@@ -0,0 +1,107 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from src.domain.exceptions import ModelQueueFullError
+from src.utils import collect_stage_timings
+from typing import Any, Callable, Dict, NamedTuple
+
+import threading
+import time
+
+
+class ExecutionTiming(NamedTuple):
+    """
+    Time a task spent waiting for a worker and running on it, in milliseconds,
+    with the compute time of the timed stages run by the task.
+    """
+    queue_wait_ms: float
+    compute_ms: float
+    stage_ms: Dict[str, float]
+
+
+class TimedResult(NamedTuple):
+    """
+    The result of a task run by a ModelExecutor together with its timing.
+    """
+    result: Any
+    timing: ExecutionTiming
+
+
+class ModelExecutor:
+    """
+    Bounded executor dedicated to one model.
+    At most max_workers tasks run at a time and at most max_queue_depth further tasks wait for a worker,
+    tasks submitted beyond that are rejected immediately with a ModelQueueFullError.
+    """
+
+    def __init__(self,
+                 max_workers: int = 4,
+                 max_queue_depth: int = 16,
+                 retry_after_seconds: int = 1,
+                 name: str = "model-executor"):
+        """
+        :param max_workers: The number of worker threads.
+        :param max_queue_depth: The number of tasks allowed to wait for a worker.
+        :param retry_after_seconds: The retry hint given to rejected callers.
+        :param name: The name of the executor, used as thread name prefix.
+        """
+        self._max_workers = max(max_workers, 1)
+        self._max_queue_depth = max(max_queue_depth, 0)
+        self._retry_after_seconds = retry_after_seconds
+        self._name = name
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self._max_workers + self._max_queue_depth)
+        self._in_flight_lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """
+        The number of tasks submitted and not finished yet, running or waiting for a worker.
+        """
+        return self._in_flight
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Submit a task if there is room for it.
+        :param fn: The callable to run.
+        :param *args: Positional arguments for fn.
+        :param **kwargs: Keyword arguments for fn.
+        :return: A Future resolving to a TimedResult.
+        :raises ModelQueueFullError: If all workers are busy and the queue is full.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ModelQueueFullError(self._name, self._max_queue_depth, self._retry_after_seconds)
+        with self._in_flight_lock:
+            self._in_flight += 1
+
+        submitted_at: float = time.perf_counter()
+
+        def run() -> TimedResult:
+            started_at: float = time.perf_counter()
+            try:
+                with collect_stage_timings() as stage_timings:
+                    result = fn(*args, **kwargs)
+            finally:
+                with self._in_flight_lock:
+                    self._in_flight -= 1
+                self._slots.release()
+            finished_at: float = time.perf_counter()
+            return TimedResult(result, ExecutionTiming(
+                queue_wait_ms=(started_at - submitted_at) * 1000.0,
+                compute_ms=(finished_at - started_at) * 1000.0,
+                stage_ms={stage: elapsed * 1000.0 for stage, elapsed in stage_timings.items()}
+            ))
+
+        try:
+            return self._executor.submit(run)
+        except Exception:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+            self._slots.release()
+            raise
+
+    def shutdown(self, wait: bool = False) -> None:
+        """
+        Shut down the worker threads.
+        :param wait: Whether to wait for running and queued tasks to finish.
+        """
+        self._executor.shutdown(wait=wait)
\ No newline at end of file
@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from src.domain.exceptions import ModelMemoryBudgetExceededError
+from src.infrastructure.frameworks.cached_model_loader import CachedModelLoader
+from typing import Any, Dict, Hashable, Iterator, Optional
+
+import math
+import threading
+import time
+
+
+class ModelResidencyManager:
+    """
+    Keeps the loaded models within a memory budget.
+    Models are loaded on demand when acquired and pinned while acquired, when a load would exceed the budget
+    the least recently used unpinned models are unloaded first. Without a budget, models stay resident once loaded.
+    The estimated size of a model is reserved before it is loaded, so that concurrent loads cannot exceed the budget
+    together. A load waits for pinned models to be released while the budget cannot be met, and fails once it has
+    waited for max_wait_seconds.
+    """
+
+    def __init__(self, memory_budget_bytes: Optional[int] = None, max_wait_seconds: float = 30.0):
+        """
+        :param memory_budget_bytes: The maximum total size of the resident models, None for no limit.
+        :param max_wait_seconds: How long a load waits at most for the budget to become available.
+        """
+        self._memory_budget_bytes = memory_budget_bytes
+        self._max_wait_seconds = max(max_wait_seconds, 0.0)
+        self._model_loaders: Dict[Hashable, CachedModelLoader] = dict()
+        self._pins: Dict[Hashable, int] = dict()
+        self._last_used: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._evictions: Dict[Hashable, int] = dict()
+        # the estimated sizes of the models being loaded
+        self._reserved_bytes: Dict[Hashable, int] = dict()
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def register(self, key: Hashable, model_loader: CachedModelLoader) -> None:
+        """
+        Register the loader of a model.
+        :param key: The key of the model, e.g. (entity set id, model id).
+        :param model_loader: The CachedModelLoader of the model.
+        """
+        with self._lock:
+            self._model_loaders[key] = model_loader
+            self._pins[key] = 0
+            self._evictions[key] = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        """
+        Whether a model is registered under the key.
+        """
+        with self._lock:
+            return key in self._model_loaders
+
+    def clear(self) -> None:
+        """
+        Forget all registered models without unloading them.
+        """
+        with self._lock:
+            self._model_loaders.clear()
+            self._pins.clear()
+            self._last_used.clear()
+            self._evictions.clear()
+
+    @contextmanager
+    def acquire(self, key: Hashable) -> Iterator[Any]:
+        """
+        Load a model if it is not resident and pin it until the context exits, so that it cannot be evicted
+        while requests are using it.
+        :param key: The key of the model.
+        :return: The loaded model object.
+        :raises ModelMemoryBudgetExceededError: If the model cannot be loaded within the memory budget.
+        """
+        with self._lock:
+            model_loader: CachedModelLoader = self._model_loaders[key]
+            self._pins[key] += 1
+            self._touch(key)
+        try:
+            with self._lock:
+                reserved: bool = self._reserve(key, model_loader)
+            try:
+                model = model_loader.load()
+            finally:
+                with self._lock:
+                    if reserved:
+                        del self._reserved_bytes[key]
+                    self._touch(key)
+                    self._evict_for(key, 0)
+                    self._released.notify_all()
+            yield model
+        finally:
+            with self._lock:
+                self._pins[key] -= 1
+                self._touch(key)
+                self._released.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the budget, the total resident size and the residency of every registered model.
+        :return: A dictionary with the memory budget, the resident bytes and per-model residency details.
+        """
+        with self._lock:
+            return {
+                "memory_budget_bytes": self._memory_budget_bytes,
+                "resident_bytes": self._get_resident_bytes(),
+                "models": {
+                    key: {
+                        "resident": model_loader.is_loaded,
+                        "resident_bytes": model_loader.resident_bytes if model_loader.is_loaded else 0,
+                        "load_seconds": model_loader.load_seconds,
+                        "load_count": model_loader.load_count,
+                        "evictions": self._evictions[key],
+                        "pins": self._pins[key],
+                        "last_used": self._last_used.get(key)
+                    }
+                    for key, model_loader in self._model_loaders.items()
+                }
+            }
+
+    def _touch(self, key: Hashable) -> None:
+        """
+        Mark a model as most recently used, the caller holds the lock.
+        """
+        self._last_used[key] = time.time()
+        self._last_used.move_to_end(key)
+
+    def _get_resident_bytes(self) -> int:
+        """
+        Sum the sizes of the resident models, the caller holds the lock.
+        """
+        return sum(
+            model_loader.resident_bytes or 0
+            for model_loader in self._model_loaders.values()
+            if model_loader.is_loaded
+        )
+
+    def _reserve(self, key: Hashable, model_loader: CachedModelLoader) -> bool:
+        """
+        Reserve the estimated size of a model that is not resident before it is loaded, evicting models to make room
+        and waiting for pinned models to be released while there is none, the caller holds the lock.
+        :param key: The key of the model being acquired.
+        :param model_loader: The CachedModelLoader of the model.
+        :return: True if the size was reserved, False if the model is resident or being loaded by another request already.
+        :raises ModelMemoryBudgetExceededError: If there is no room within the budget after waiting for max_wait_seconds.
+        """
+        if self._memory_budget_bytes is None or model_loader.is_loaded or key in self._reserved_bytes:
+            return False
+        estimated_bytes: int = model_loader.estimate_resident_bytes()
+        retry_after_seconds: int = max(math.ceil(self._max_wait_seconds), 1)
+        if estimated_bytes > self._memory_budget_bytes:
+            raise ModelMemoryBudgetExceededError(str(key), estimated_bytes, self._memory_budget_bytes, retry_after_seconds)
+
+        deadline: float = time.monotonic() + self._max_wait_seconds
+        while not self._evict_for(key, estimated_bytes):
+            remaining: float = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ModelMemoryBudgetExceededError(str(key), estimated_bytes, self._memory_budget_bytes, retry_after_seconds)
+            self._released.wait(remaining)
+            if model_loader.is_loaded or key in self._reserved_bytes:
+                return False
+        self._reserved_bytes[key] = estimated_bytes
+        return True
+
+    def _evict_for(self, key: Hashable, incoming_bytes: int) -> bool:
+        """
+        Unload least recently used unpinned models until the resident models, the sizes reserved by loads in progress
+        and the incoming bytes fit the budget, the caller holds the lock.
+        :param key: The key of the model being acquired, it is never evicted.
+        :param incoming_bytes: The size of the model about to be loaded, 0 if it is resident already.
+        :return: True if they fit the budget.
+        """
+        if self._memory_budget_bytes is None:
+            return True
+        reserved_bytes: int = sum(size for reserved_key, size in self._reserved_bytes.items() if reserved_key != key)
+        for victim in list(self._last_used.keys()):
+            if self._get_resident_bytes() + reserved_bytes + incoming_bytes <= self._memory_budget_bytes:
+                return True
+            model_loader: CachedModelLoader = self._model_loaders.get(victim)
+            if victim == key or model_loader is None or self._pins[victim] > 0 or not model_loader.is_loaded:
+                continue
+            released_bytes: int = model_loader.resident_bytes or 0
+            if model_loader.unload():
+                self._evictions[victim] += 1
+                print(f"Evicted model {victim} ({released_bytes} bytes) to stay within the memory budget of {self._memory_budget_bytes} bytes")
+        if self._get_resident_bytes() + reserved_bytes + incoming_bytes > self._memory_budget_bytes:
+            if not incoming_bytes:
+                # the model was larger than estimated, it is kept until the other resident models are released
+                print(f"Memory budget of {self._memory_budget_bytes} bytes exceeded, the other resident models are in use")
+            return False
+        return True
\ No newline at end of file
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 from src.infrastructure.frameworks.model_inference_maker import ModelInferenceMaker
-from typing import Any, Dict
+from src.infrastructure.services.micro_batcher import MicroBatcher
+from src.infrastructure.services.model_executor import ModelExecutor
+from typing import Any, ContextManager, Dict, List, Tuple
 
 class ModelService(ABC):
     """
@@ -16,6 +18,76 @@ class ModelService(ABC):
         """
         pass
 
+    @abstractmethod
+    def get_micro_batcher(self, entity_set_id: str, model_id: str) -> MicroBatcher:
+        """
+        Returns the batching scheduler in front of the inference maker of the specified model.
+        :param entity_set_id: The ID of the entity set for which the model is requested.
+        :param model_id: The ID of the model to be used for inference.
+        :return: The MicroBatcher for the specified model.
+        """
+        pass
+
+    @abstractmethod
+    def get_model_executor(self, entity_set_id: str, model_id: str) -> ModelExecutor:
+        """
+        Returns the bounded executor dedicated to the specified model.
+        :param entity_set_id: The ID of the entity set for which the model is requested.
+        :param model_id: The ID of the model to be used for inference.
+        :return: The ModelExecutor for the specified model.
+        """
+        pass
+
+    @abstractmethod
+    def acquire_model(self, entity_set_id: str, model_id: str) -> ContextManager[Any]:
+        """
+        Load the specified model if it is not resident and keep it resident while the context is open.
+        :param entity_set_id: The ID of the entity set for which the model is requested.
+        :param model_id: The ID of the model to be used for inference.
+        :return: A context manager yielding the loaded model object.
+        """
+        pass
+
+    @abstractmethod
+    def get_residency(self) -> Dict[str, Any]:
+        """
+        Report the memory budget and the resident size and load time of every model.
+        :return: A dictionary with the budget, the total resident size and the per-model residency.
+        """
+        pass
+
+    @abstractmethod
+    def start_up(self) -> bool:
+        """
+        Load and warm up the registered models according to the startup configuration.
+        :return: True if every model that is to be preloaded is ready to serve, False otherwise.
+        """
+        pass
+
+    @abstractmethod
+    def prepare_fork(self) -> List[Tuple[str, str]]:
+        """
+        Prepare the started up service to be forked into worker processes, which call after_fork.
+        :return: The entity set and model IDs of the models unloaded because they cannot be shared across a fork.
+        """
+        pass
+
+    @abstractmethod
+    def after_fork(self) -> None:
+        """
+        Restore the per-process state of the service in a forked worker process.
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def get_readiness(self) -> Dict[str, Any]:
+        """
+        Report whether start up has finished and the state of every registered model.
+        :return: A dictionary with the overall readiness and the per-model startup state.
+        """
+        pass
+
     @abstractmethod
     def list_models(self, entity_set_id: str) -> Dict[str, str]:
         """
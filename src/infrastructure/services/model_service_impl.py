@@ -1,18 +1,33 @@
 import importlib.metadata
+import threading
+import time
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from packaging.requirements import Requirement
 from packaging.version import Version, InvalidVersion
 from pathlib import Path
+from src.infrastructure.services.caching_inference_maker import CachingInferenceMaker
+from src.infrastructure.services.inference_result_cache import InferenceResultCache
+from src.infrastructure.services.micro_batcher import MicroBatcher
+from src.infrastructure.services.model_executor import ModelExecutor
+from src.infrastructure.services.model_residency_manager import ModelResidencyManager
 from src.infrastructure.services.model_service import ModelService
 from src.infrastructure.frameworks.model_loader import ModelLoader
 from src.infrastructure.frameworks.sequence_tagger_loader import SequenceTaggerLoader
 from src.infrastructure.frameworks.mt5_for_conditional_generation_loader import MT5ForConditionalGenerationLoader
+from src.infrastructure.frameworks.sequence_tagger_torchscript_loader import SequenceTaggerTorchScriptLoader
+from src.infrastructure.frameworks.sequence_tagger_onnx_loader import SequenceTaggerONNXLoader
+from src.infrastructure.frameworks.mt5_for_conditional_generation_onnx_loader import MT5ForConditionalGenerationONNXLoader
 from src.infrastructure.frameworks.sequence_tagger_inference_maker import SequenceTaggerInferenceMaker
+from src.infrastructure.frameworks.compiled_sequence_tagger_inference_maker import CompiledSequenceTaggerInferenceMaker
 from src.infrastructure.frameworks.mt5_for_conditional_generation_inference_maker import MT5ForConditionalGenerationInferenceMaker
+from src.infrastructure.frameworks.mt5_for_conditional_generation_onnx_inference_maker import MT5ForConditionalGenerationONNXInferenceMaker
 from src.infrastructure.frameworks.model_inference_maker import ModelInferenceMaker
-from src.domain.exceptions import ModelNotFoundError, UnsupportedModelLoadingStrategyError, UnsupportedModelImplTypeError
+from src.infrastructure.frameworks.model_precision import ModelPrecision
+from src.domain.exceptions import ModelNotFoundError, UnsupportedModelLoadingStrategyError, UnsupportedModelImplTypeError, UnsupportedModelPrecisionError
 from src.utils import AppInfo
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterator, List, Tuple
 
 
 class ModelServiceImpl(ModelService):
@@ -22,8 +37,30 @@ class ModelServiceImpl(ModelService):
     It uses the AppInfo utility to load application configuration and supported models.
     """
     _models_registry: Dict[str, Dict[str, Tuple[ModelLoader, ModelInferenceMaker]]] = {}
+    _micro_batchers: Dict[str, Dict[str, MicroBatcher]] = {}
+    _model_executors: Dict[str, Dict[str, ModelExecutor]] = {}
+    _startup_status: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    _model_impls: List[str] = ["SequenceTagger", "MT5ForConditionalGeneration",
+                               "SequenceTaggerTorchScript", "SequenceTaggerONNX", "MT5ForConditionalGenerationONNX"]
+    # compiled models are exported once in fp32 and loaded from a sub-directory of the model version
+    _compiled_model_impls: List[str] = ["SequenceTaggerTorchScript", "SequenceTaggerONNX", "MT5ForConditionalGenerationONNX"]
+    # memory_mapped loads the weights mapped from the artifact written by scripts/convert_mapped_models.py
+    _model_loading_strategies: List[str] = ["local_disk_storage", "memory_mapped"]
     def __init__(self):
         self._app_info = AppInfo.load()
+        self._ready = threading.Event()
+        self._model_residency_manager = ModelResidencyManager(
+            memory_budget_bytes=self._app_info.model_residency.memory_budget_bytes,
+            max_wait_seconds=self._app_info.model_residency.max_wait_seconds
+        )
+        self._inference_result_cache: InferenceResultCache = None
+        if self._app_info.inference_result_cache.enabled:
+            self._inference_result_cache = InferenceResultCache(
+                max_memory_bytes=self._app_info.inference_result_cache.max_memory_bytes,
+                sqlite_path=self._app_info.inference_result_cache.sqlite_path,
+                max_disk_bytes=self._app_info.inference_result_cache.max_disk_bytes,
+                max_age_seconds=self._app_info.inference_result_cache.max_age_seconds
+            )
         self._load_model_registry()
     
     def _load_model_registry(self):
@@ -33,11 +70,150 @@ class ModelServiceImpl(ModelService):
         It clears any existing models and reloads them based on the current configuration.
         """
         self._models_registry.clear()
+        for micro_batchers in self._micro_batchers.values():
+            for micro_batcher in micro_batchers.values():
+                micro_batcher.shutdown()
+        self._micro_batchers.clear()
+        for model_executors in self._model_executors.values():
+            for model_executor in model_executors.values():
+                model_executor.shutdown(wait=False)
+        self._model_executors.clear()
+        self._startup_status.clear()
+        self._ready.clear()
+        self._model_residency_manager.clear()
         for entity_set_cfg in self._app_info.entity_sets:
             entity_set_id = entity_set_cfg.entity_set_id
             self._models_registry[entity_set_id] = {}
+            self._micro_batchers[entity_set_id] = {}
+            self._model_executors[entity_set_id] = {}
+            self._startup_status[entity_set_id] = {}
             for model_cfg in entity_set_cfg.supported_models:
-                self._models_registry[entity_set_id][model_cfg.model_id] = self._load(entity_set_cfg, model_cfg)
+                model_loader, model_inference_maker = self._load(entity_set_cfg, model_cfg)
+                self._startup_status[entity_set_id][model_cfg.model_id] = {"state": "registered" if model_inference_maker else "skipped"}
+                if model_inference_maker and model_inference_maker.deterministic and self._inference_result_cache:
+                    model_inference_maker = CachingInferenceMaker(model_inference_maker=model_inference_maker,
+                                                                  inference_result_cache=self._inference_result_cache,
+                                                                  entity_set_id=entity_set_id,
+                                                                  model_id=model_cfg.model_id,
+                                                                  model_version=f"{model_cfg.model_version}-{model_cfg.model_precision.mode}")
+                self._models_registry[entity_set_id][model_cfg.model_id] = (model_loader, model_inference_maker)
+                if model_inference_maker:
+                    self._model_residency_manager.register((entity_set_id, model_cfg.model_id), model_loader)
+                    self._micro_batchers[entity_set_id][model_cfg.model_id] = MicroBatcher(
+                        model_inference_maker=model_inference_maker,
+                        max_wait_ms=model_cfg.model_batching.max_wait_ms,
+                        max_batch_tokens=model_cfg.model_batching.max_batch_tokens,
+                        enabled=model_cfg.model_batching.enabled,
+                        name=f"micro-batcher-{entity_set_id}-{model_cfg.model_id}"
+                    )
+                    self._model_executors[entity_set_id][model_cfg.model_id] = ModelExecutor(
+                        max_workers=model_cfg.model_executor.max_workers,
+                        max_queue_depth=model_cfg.model_executor.max_queue_depth,
+                        retry_after_seconds=model_cfg.model_executor.retry_after_seconds,
+                        name=f"model-executor-{entity_set_id}-{model_cfg.model_id}"
+                    )
+
+    def start_up(self) -> bool:
+        """
+        Load the registered models concurrently and warm each of them up with the sample texts of its entity set,
+        as configured by model_startup. Without preload, models keep being loaded on their first request.
+        Models that are ready already are skipped, so that a worker forked from a started up master only loads the models
+        prepare_fork unloaded and does not warm up the shared ones, which would copy their pages into the worker.
+        The service reports ready once every preloaded model has been loaded and warmed up.
+        :return: True if every model that is to be preloaded is ready to serve, False otherwise.
+        """
+        startup_cfg = self._app_info.model_startup
+        self._ready.clear()
+        if not startup_cfg.preload:
+            self._ready.set()
+            return True
+
+        futures: List[Future] = list()
+        with ThreadPoolExecutor(max_workers=max(startup_cfg.max_parallel_loads, 1), thread_name_prefix="model-startup") as executor:
+            for entity_set_cfg in self._app_info.entity_sets:
+                for model_cfg in entity_set_cfg.supported_models:
+                    model_loader, model_inference_maker = self._models_registry[entity_set_cfg.entity_set_id][model_cfg.model_id]
+                    status: Dict[str, Any] = self._startup_status[entity_set_cfg.entity_set_id][model_cfg.model_id]
+                    if model_inference_maker and status["state"] != "ready":
+                        futures.append(executor.submit(self._load_and_warm_up, entity_set_cfg, model_cfg, model_loader, model_inference_maker))
+        all_ready: bool = all(future.result() for future in futures)
+        if all_ready:
+            self._ready.set()
+        return all_ready
+
+    def prepare_fork(self) -> List[Tuple[str, str]]:
+        """
+        Prepare the started up service to be forked into worker processes, which share the loaded models copy-on-write.
+        Models whose runtime cannot be carried across a fork are unloaded, every worker loads them again on its start up,
+        and the disk tier of the inference result cache is closed until after_fork reopens it in the worker.
+        The micro-batchers and model executors start their threads on first use, which only happens in the workers.
+        :return: The entity set and model IDs of the unloaded models.
+        """
+        unloaded_models: List[Tuple[str, str]] = list()
+        for entity_set_id, models in self._models_registry.items():
+            for model_id, (model_loader, model_inference_maker) in models.items():
+                if model_inference_maker and not model_loader.fork_safe and model_loader.unload():
+                    self._startup_status[entity_set_id][model_id] = {"state": "registered"}
+                    unloaded_models.append((entity_set_id, model_id))
+        if self._inference_result_cache:
+            self._inference_result_cache.close()
+        return unloaded_models
+
+    def after_fork(self) -> None:
+        """
+        Restore the per-process state of the service in a forked worker process.
+        :return: None
+        """
+        if self._inference_result_cache:
+            self._inference_result_cache.open()
+
+    def get_readiness(self) -> Dict[str, Any]:
+        """
+        Report whether start up has finished and the state of every registered model.
+        :return: A dictionary with the overall readiness and the per-model startup state.
+        """
+        return {
+            "ready": self._ready.is_set(),
+            "models": {
+                entity_set_id: {model_id: dict(status) for model_id, status in model_statuses.items()}
+                for entity_set_id, model_statuses in self._startup_status.items()
+            }
+        }
+
+    def _load_and_warm_up(self, entity_set_cfg, model_cfg, model_loader: ModelLoader, model_inference_maker: ModelInferenceMaker) -> bool:
+        """
+        Load a model and run the warm-up inferences on it, recording the progress in the startup status.
+        :param entity_set_cfg: The configuration for the entity set.
+        :param model_cfg: The configuration for the model.
+        :param model_loader: The ModelLoader of the model.
+        :param model_inference_maker: The ModelInferenceMaker of the model.
+        :return: True if the model is ready to serve, False otherwise.
+        """
+        startup_cfg = self._app_info.model_startup
+        status: Dict[str, Any] = self._startup_status[entity_set_cfg.entity_set_id][model_cfg.model_id]
+        try:
+            status["state"] = "loading"
+            with self.acquire_model(entity_set_cfg.entity_set_id, model_cfg.model_id) as model:
+                if model is None:
+                    raise RuntimeError("the loader returned no model")
+                status["load_seconds"] = round(model_loader.load_seconds, 3)
+
+                if startup_cfg.warmup:
+                    status["state"] = "warming_up"
+                    started_at: float = time.perf_counter()
+                    for _ in range(max(startup_cfg.warmup_rounds, 1)):
+                        model_inference_maker.warm_up(entity_set_cfg.sample_texts)
+                    status["warmup_seconds"] = round(time.perf_counter() - started_at, 3)
+
+            status["state"] = "ready"
+            print(f"Model {model_cfg.model_id} in entity set {entity_set_cfg.entity_set_id} ready, "
+                  f"loaded in {status['load_seconds']}s, warmed up in {status.get('warmup_seconds', 0.0)}s")
+            return True
+        except Exception as e:
+            status["state"] = "failed"
+            status["error"] = str(e)
+            print(f"Failed to start up model {model_cfg.model_id} in entity set {entity_set_cfg.entity_set_id}: {e}")
+            return False
 
     def check_requirements(self, requirements: List[str]) -> bool:
         """
@@ -78,22 +254,52 @@ class ModelServiceImpl(ModelService):
             print(f"Requirements not satisfied, skipping model loading in this instance for model {model_cfg.model_id} in entity set {entity_set_cfg.entity_set_id}")
             return None, None
         
-        if model_cfg.model_loading_strategy not in ["local_disk_storage"]:
+        # compiled models are loaded by their runtimes, only the eager models can be mapped
+        if model_cfg.model_loading_strategy not in self._model_loading_strategies or (
+                model_cfg.model_impl in self._compiled_model_impls and model_cfg.model_loading_strategy != "local_disk_storage"):
             print(f"Unsupported model loading strategy {model_cfg.model_loading_strategy} for model {model_cfg.model_id} in entity set {entity_set_cfg.entity_set_id}")
             raise UnsupportedModelLoadingStrategyError(entity_set_cfg.entity_set_id, model_cfg.model_id, model_cfg.model_loading_strategy)
         
-        if model_cfg.model_impl not in ["SequenceTagger", "MT5ForConditionalGeneration"]:
+        if model_cfg.model_impl not in self._model_impls:
             print(f"Unsupported model impl type {model_cfg.model_impl} for model {model_cfg.model_id} in entity set {entity_set_cfg.entity_set_id}")
             raise UnsupportedModelImplTypeError(entity_set_cfg.entity_set_id, model_cfg.model_id, model_cfg.model_impl)
         
-        if model_cfg.model_loading_strategy == "local_disk_storage":
+        if model_cfg.model_precision.mode not in ModelPrecision.MODES or (
+                model_cfg.model_impl in self._compiled_model_impls and model_cfg.model_precision.mode != ModelPrecision.FP32):
+            print(f"Unsupported model precision {model_cfg.model_precision.mode} for model {model_cfg.model_id} in entity set {entity_set_cfg.entity_set_id}")
+            raise UnsupportedModelPrecisionError(entity_set_cfg.entity_set_id, model_cfg.model_id, model_cfg.model_precision.mode)
+        
+        if model_cfg.model_loading_strategy in self._model_loading_strategies:
             model_path = self._get_model_path(entity_set_cfg, model_cfg)
+            model_precision = ModelPrecision(mode=model_cfg.model_precision.mode,
+                                             source_path=model_path,
+                                             cache_dir=model_cfg.model_precision.cache_dir,
+                                             loading_strategy=model_cfg.model_loading_strategy)
             if model_cfg.model_impl == "SequenceTagger":
-                model_loader = SequenceTaggerLoader(model_name_or_path=model_path, loading_strategy=model_cfg.model_loading_strategy)
-                model_inference_maker = SequenceTaggerInferenceMaker(model_loader=model_loader)
+                model_loader = SequenceTaggerLoader(model_name_or_path=model_path, loading_strategy=model_cfg.model_loading_strategy, model_precision=model_precision)
+                model_inference_maker = SequenceTaggerInferenceMaker(model_loader=model_loader,
+                                                                     somajo_parallel=model_cfg.model_tokenization.somajo_parallel,
+                                                                     somajo_cache_size=model_cfg.model_tokenization.somajo_cache_size,
+                                                                     sentence_cache_size=model_cfg.model_sentence_cache.max_entries
+                                                                     if model_cfg.model_sentence_cache.enabled else 0)
             elif model_cfg.model_impl == "MT5ForConditionalGeneration":
-                model_loader = MT5ForConditionalGenerationLoader(model_name_or_path=model_path, loading_strategy=model_cfg.model_loading_strategy)
-                model_inference_maker = MT5ForConditionalGenerationInferenceMaker(model_loader=model_loader)
+                model_loader = MT5ForConditionalGenerationLoader(model_name_or_path=model_path, loading_strategy=model_cfg.model_loading_strategy, model_precision=model_precision)
+                model_inference_maker = MT5ForConditionalGenerationInferenceMaker(model_loader=model_loader,
+                                                                                  somajo_parallel=model_cfg.model_tokenization.somajo_parallel,
+                                                                                  somajo_cache_size=model_cfg.model_tokenization.somajo_cache_size)
+            elif model_cfg.model_impl in ["SequenceTaggerTorchScript", "SequenceTaggerONNX"]:
+                compiled_loader_class = SequenceTaggerTorchScriptLoader if model_cfg.model_impl == "SequenceTaggerTorchScript" else SequenceTaggerONNXLoader
+                model_loader = compiled_loader_class(model_name_or_path=model_path / compiled_loader_class.DIRECTORY_NAME, loading_strategy=model_cfg.model_loading_strategy, model_precision=model_precision)
+                model_inference_maker = CompiledSequenceTaggerInferenceMaker(model_loader=model_loader,
+                                                                             somajo_parallel=model_cfg.model_tokenization.somajo_parallel,
+                                                                             somajo_cache_size=model_cfg.model_tokenization.somajo_cache_size,
+                                                                             sentence_cache_size=model_cfg.model_sentence_cache.max_entries
+                                                                             if model_cfg.model_sentence_cache.enabled else 0)
+            elif model_cfg.model_impl == "MT5ForConditionalGenerationONNX":
+                model_loader = MT5ForConditionalGenerationONNXLoader(model_name_or_path=model_path / MT5ForConditionalGenerationONNXLoader.DIRECTORY_NAME, loading_strategy=model_cfg.model_loading_strategy, model_precision=model_precision)
+                model_inference_maker = MT5ForConditionalGenerationONNXInferenceMaker(model_loader=model_loader,
+                                                                                      somajo_parallel=model_cfg.model_tokenization.somajo_parallel,
+                                                                                      somajo_cache_size=model_cfg.model_tokenization.somajo_cache_size)
         
         return model_loader, model_inference_maker
     
@@ -127,6 +333,63 @@ class ModelServiceImpl(ModelService):
         except KeyError:
             raise ModelNotFoundError(entity_set_id, model_id)
 
+    @property
+    def inference_result_cache(self) -> InferenceResultCache:
+        """
+        The cache of deterministic inference results, None if disabled.
+        """
+        return self._inference_result_cache
+
+    def get_micro_batcher(self, entity_set_id: str, model_id: str) -> MicroBatcher:
+        """
+        Retrieve the MicroBatcher in front of the ModelInferenceMaker for the specified entity set and model ID.
+        :param entity_set_id: The ID of the entity set for which the model is requested.
+        :param model_id: The ID of the model to be used for inference.
+        :return: The MicroBatcher for the specified model.
+        """
+        try:
+            return self._micro_batchers[entity_set_id][model_id]
+        except KeyError:
+            raise ModelNotFoundError(entity_set_id, model_id)
+
+    @contextmanager
+    def acquire_model(self, entity_set_id: str, model_id: str) -> Iterator[Any]:
+        """
+        Load the specified model if it is not resident and pin it while the context is open,
+        evicting least recently used models if the memory budget would be exceeded.
+        :param entity_set_id: The ID of the entity set for which the model is requested.
+        :param model_id: The ID of the model to be used for inference.
+        :return: A context manager yielding the loaded model object.
+        """
+        if (entity_set_id, model_id) not in self._model_residency_manager:
+            raise ModelNotFoundError(entity_set_id, model_id)
+        with self._model_residency_manager.acquire((entity_set_id, model_id)) as model:
+            yield model
+
+    def get_residency(self) -> Dict[str, Any]:
+        """
+        Report the memory budget and the resident size and load time of every model.
+        :return: A dictionary with the budget, the total resident size and the per-model residency.
+        """
+        residency: Dict[str, Any] = self._model_residency_manager.stats()
+        models: Dict[str, Dict[str, Any]] = dict()
+        for (entity_set_id, model_id), model_residency in residency["models"].items():
+            models.setdefault(entity_set_id, dict())[model_id] = model_residency
+        residency["models"] = models
+        return residency
+
+    def get_model_executor(self, entity_set_id: str, model_id: str) -> ModelExecutor:
+        """
+        Retrieve the ModelExecutor dedicated to the specified entity set and model ID.
+        :param entity_set_id: The ID of the entity set for which the model is requested.
+        :param model_id: The ID of the model to be used for inference.
+        :return: The ModelExecutor for the specified model.
+        """
+        try:
+            return self._model_executors[entity_set_id][model_id]
+        except KeyError:
+            raise ModelNotFoundError(entity_set_id, model_id)
+
     def list_models(self, entity_set_id: str) -> Dict[str, str]:
         """
         List available models for a given entity set.
@@ -158,8 +421,10 @@ class ModelServiceImpl(ModelService):
         """
         Reload the model registry from the application configuration.
         This method should be called to refresh the model registry, typically after configuration changes.
+        The models are started up in the background as on application start up, get_readiness reports when they are ready.
         :return: None
         """
-        self._models_registry = self._load_model_registry()
+        self._load_model_registry()
+        threading.Thread(target=self.start_up, name="model-startup", daemon=True).start()
 
     
\ No newline at end of file
@@ -0,0 +1,179 @@
+from src.infrastructure.services.model_service import ModelService
+from typing import Any, Dict, List, Optional, Tuple
+
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+
+class PreforkServer:
+    """
+    Serves the API from worker processes forked from a master process which has loaded and warmed up the models.
+    The workers share the pages of the model weights with the master copy-on-write, so the weights take their memory
+    once per node instead of once per worker. Every worker runs inference with threads_per_worker intra-op threads,
+    so that the workers together do not oversubscribe the cores. Workers which exit are forked again from the master,
+    without loading the models again.
+    """
+    # workers exiting sooner than this after their fork are restarted with a delay, to not spin on a failing start up
+    MIN_WORKER_UPTIME_SECONDS = 10.0
+    RESTART_DELAY_SECONDS = 1.0
+
+    def __init__(self,
+                 app: Any,
+                 model_service: ModelService,
+                 host: str = "0.0.0.0",
+                 port: int = 8000,
+                 workers: int = 1,
+                 threads_per_worker: Optional[int] = None,
+                 log_level: str = "info"):
+        """
+        :param app: The ASGI app, its lifespan takes the model service from app.state.model_service if set.
+        :param model_service: The model service to start up in the master and hand to every worker.
+        :param host: The host to listen on.
+        :param port: The port to listen on, shared by all workers.
+        :param workers: The number of worker processes.
+        :param threads_per_worker: The intra-op threads of every worker, defaults to the available cores split evenly.
+        :param log_level: The log level of the uvicorn server in every worker.
+        """
+        if not hasattr(os, "fork"):
+            raise RuntimeError("The prefork server needs os.fork, which is not available on this platform")
+        self.app = app
+        self.model_service = model_service
+        self.host = host
+        self.port = port
+        self.workers = max(workers, 1)
+        self.threads_per_worker = threads_per_worker or max(self.get_available_cores() // self.workers, 1)
+        self.log_level = log_level
+        self._socket: socket.socket = None
+        self._worker_pids: Dict[int, Tuple[int, float]] = dict()
+        self._stopping = False
+
+    @staticmethod
+    def get_available_cores() -> int:
+        """
+        Get the number of cores this process may run on, which can be fewer than the cores of the node in a container.
+        :return: The number of available cores.
+        """
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    @staticmethod
+    def set_intra_op_threads(num_threads: int) -> None:
+        """
+        Set the intra-op threads of torch and of the ONNX Runtime sessions and OpenMP/MKL runtimes created afterwards.
+        :param num_threads: The number of intra-op threads.
+        :return: None
+        """
+        for name in ["OMP_NUM_THREADS", "MKL_NUM_THREADS"]:
+            os.environ[name] = str(num_threads)
+        if "torch" in sys.modules:
+            import torch
+            torch.set_num_threads(num_threads)
+
+    def run(self) -> int:
+        """
+        Start up the models in the master, fork the workers and supervise them until the master is asked to stop.
+        :return: The exit code of the master.
+        """
+        # the master runs single-threaded: an OpenMP thread pool started before the fork is unusable in the workers
+        self.set_intra_op_threads(1)
+        started_at: float = time.perf_counter()
+        ready: bool = self.model_service.start_up()
+        print(f"Master {os.getpid()} started up the models in {time.perf_counter() - started_at:.1f}s, "
+              f"{'all' if ready else 'not all'} of them ready")
+        for entity_set_id, model_id in self.model_service.prepare_fork():
+            print(f"Model {model_id} in entity set {entity_set_id} cannot be shared across a fork, every worker loads its own")
+
+        # the garbage collector would write to the headers of every object it tracks, copying the pages of the master
+        gc.collect()
+        gc.freeze()
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(2048)
+        print(f"Master {os.getpid()} listening on {self.host}:{self.port} with {self.workers} workers "
+              f"of {self.threads_per_worker} intra-op threads")
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for worker_index in range(self.workers):
+            if not self._stopping:
+                self._fork_worker(worker_index)
+        self._supervise()
+        self._socket.close()
+        print(f"Master {os.getpid()} stopped")
+        return 0
+
+    def _fork_worker(self, worker_index: int) -> None:
+        """
+        Fork a worker process serving the app on the shared socket.
+        :param worker_index: The index of the worker, kept when it is restarted.
+        :return: None
+        """
+        # output buffered but not yet written would otherwise be written by the worker too
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid: int = os.fork()
+        if pid:
+            self._worker_pids[pid] = (worker_index, time.monotonic())
+            return
+
+        exit_code: int = 1
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            self.set_intra_op_threads(self.threads_per_worker)
+            self.model_service.after_fork()
+            self.app.state.model_service = self.model_service
+            print(f"Worker {worker_index} started with pid {os.getpid()}")
+
+            import uvicorn
+
+            uvicorn.Server(uvicorn.Config(self.app, log_level=self.log_level)).run(sockets=[self._socket])
+            exit_code = 0
+        except BaseException as e:
+            print(f"Worker {worker_index} failed: {e}")
+        finally:
+            sys.stdout.flush()
+            os._exit(exit_code)
+
+    def _supervise(self) -> None:
+        """
+        Wait for the workers to exit and fork the ones exiting before the master is stopped again.
+        :return: None
+        """
+        while self._worker_pids:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            if pid not in self._worker_pids:
+                continue
+            worker_index, forked_at = self._worker_pids.pop(pid)
+            if self._stopping:
+                continue
+            print(f"Worker {worker_index} with pid {pid} exited with code {os.waitstatus_to_exitcode(status)}, restarting it")
+            if time.monotonic() - forked_at < self.MIN_WORKER_UPTIME_SECONDS:
+                time.sleep(self.RESTART_DELAY_SECONDS)
+            if not self._stopping:
+                self._fork_worker(worker_index)
+
+    def _stop(self, signum: int, frame: Any) -> None:
+        """
+        Ask every worker to shut down gracefully, the master exits once all of them have.
+        :param signum: The number of the received signal.
+        :param frame: The current stack frame.
+        :return: None
+        """
+        self._stopping = True
+        worker_pids: List[int] = list(self._worker_pids)
+        for pid in worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
\ No newline at end of file
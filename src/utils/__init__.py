@@ -1,5 +1,21 @@
 from .app_info import AppInfo
+from .lru_cache import LRUCache
+from .stage_timer import (add_quantity_listener, add_stage_listener, collect_stage_timings, current_stage_labels,
+                          merge_stage_timings, record_quantity, record_stage, remove_quantity_listener,
+                          remove_stage_listener, stage_labels, timed_stage)
 
 __all__ = [
-    "AppInfo"
+    "AppInfo",
+    "LRUCache",
+    "add_quantity_listener",
+    "add_stage_listener",
+    "collect_stage_timings",
+    "current_stage_labels",
+    "merge_stage_timings",
+    "record_quantity",
+    "record_stage",
+    "remove_quantity_listener",
+    "remove_stage_listener",
+    "stage_labels",
+    "timed_stage"
 ]
\ No newline at end of file
@@ -5,6 +5,28 @@ from typing import List, Optional
 
 import yaml
 
+class ModelBatching(BaseModel):
+    enabled: bool = True
+    max_wait_ms: float = 10.0
+    max_batch_tokens: int = 8192
+
+class ModelExecutorSettings(BaseModel):
+    max_workers: int = 4
+    max_queue_depth: int = 16
+    retry_after_seconds: int = 1
+
+class ModelTokenization(BaseModel):
+    somajo_parallel: int = 1
+    somajo_cache_size: int = 4096
+
+class ModelSentenceCache(BaseModel):
+    enabled: bool = False
+    max_entries: int = 65536
+
+class ModelPrecisionSettings(BaseModel):
+    mode: str = "fp32"
+    cache_dir: Optional[str] = None
+
 class SupportedModel(BaseModel):
     model_name: str
     model_id: str
@@ -15,6 +37,11 @@ class SupportedModel(BaseModel):
     model_version: str
     model_impl: str
     model_system_requirements: List[str]
+    model_batching: ModelBatching = ModelBatching()
+    model_executor: ModelExecutorSettings = ModelExecutorSettings()
+    model_tokenization: ModelTokenization = ModelTokenization()
+    model_sentence_cache: ModelSentenceCache = ModelSentenceCache()
+    model_precision: ModelPrecisionSettings = ModelPrecisionSettings()
 
 class FineGrainedLabel(BaseModel):
     id: str
@@ -38,9 +65,60 @@ class EntitySetModel(BaseModel):
     entity_set_labels: List[EntitySetLabel]
     sample_texts: List[str]
 
+class InferenceResultCacheSettings(BaseModel):
+    enabled: bool = True
+    max_memory_bytes: int = 64 * 1024 * 1024
+    # the disk tier stores personal data found in the input texts, it is only enabled by setting a path
+    sqlite_path: Optional[str] = None
+    max_disk_bytes: int = 1024 * 1024 * 1024
+    max_age_seconds: Optional[float] = 7 * 24 * 3600
+
+class ModelStartupSettings(BaseModel):
+    preload: bool = False
+    max_parallel_loads: int = 3
+    warmup: bool = True
+    warmup_rounds: int = 1
+
+class ModelResidencySettings(BaseModel):
+    memory_budget_bytes: Optional[int] = None
+    max_wait_seconds: float = 30.0
+
+class ModelServerSettings(BaseModel):
+    workers: int = 1
+    threads_per_worker: Optional[int] = None
+
+class MetricsSettings(BaseModel):
+    enabled: bool = True
+
+class StreamingSettings(BaseModel):
+    max_in_flight_texts: int = 8
+    max_line_bytes: int = 4 * 1024 * 1024
+
+class JobsSettings(BaseModel):
+    enabled: bool = True
+    sqlite_path: str = "data/jobs.sqlite3"
+    workers: int = 1
+    chunk_size: int = 16
+    max_texts_per_job: int = 100000
+    max_defer_seconds: float = 5.0
+    lease_seconds: float = 300.0
+    retention_seconds: float = 7 * 24 * 3600
+
+class ResponseEncodingSettings(BaseModel):
+    gzip_min_bytes: int = 1024
+    gzip_level: int = 5
+
 class AppInfoData(BaseModel):
     app_name: str
     entity_set_models: List[EntitySetModel]
+    inference_result_cache: InferenceResultCacheSettings = InferenceResultCacheSettings()
+    model_startup: ModelStartupSettings = ModelStartupSettings()
+    model_residency: ModelResidencySettings = ModelResidencySettings()
+    model_server: ModelServerSettings = ModelServerSettings()
+    metrics: MetricsSettings = MetricsSettings()
+    streaming: StreamingSettings = StreamingSettings()
+    jobs: JobsSettings = JobsSettings()
+    response_encoding: ResponseEncodingSettings = ResponseEncodingSettings()
 
 class AppInfo:
     """
@@ -86,7 +164,15 @@ class AppInfo:
         
         app_info_data = AppInfoData(
             app_name=data["app_name"],
-            entity_set_models=entity_sets
+            entity_set_models=entity_sets,
+            inference_result_cache=InferenceResultCacheSettings.model_validate(data.get("inference_result_cache") or {}),
+            model_startup=ModelStartupSettings.model_validate(data.get("model_startup") or {}),
+            model_residency=ModelResidencySettings.model_validate(data.get("model_residency") or {}),
+            model_server=ModelServerSettings.model_validate(data.get("model_server") or {}),
+            metrics=MetricsSettings.model_validate(data.get("metrics") or {}),
+            streaming=StreamingSettings.model_validate(data.get("streaming") or {}),
+            jobs=JobsSettings.model_validate(data.get("jobs") or {}),
+            response_encoding=ResponseEncodingSettings.model_validate(data.get("response_encoding") or {})
         )
         return cls(app_info_data)
 
@@ -98,8 +184,49 @@ class AppInfo:
     def entity_sets(self) -> List[EntitySetModel]:
         return self._config.entity_set_models
 
+    @property
+    def inference_result_cache(self) -> InferenceResultCacheSettings:
+        return self._config.inference_result_cache
+
+    @property
+    def model_startup(self) -> ModelStartupSettings:
+        return self._config.model_startup
+
+    @property
+    def model_residency(self) -> ModelResidencySettings:
+        return self._config.model_residency
+
+    @property
+    def model_server(self) -> ModelServerSettings:
+        return self._config.model_server
+
+    @property
+    def metrics(self) -> MetricsSettings:
+        return self._config.metrics
+
+    @property
+    def streaming(self) -> StreamingSettings:
+        return self._config.streaming
+
+    @property
+    def jobs(self) -> JobsSettings:
+        return self._config.jobs
+
+    @property
+    def response_encoding(self) -> ResponseEncodingSettings:
+        return self._config.response_encoding
+
     def get_entity_set(self, entity_set_id: str) -> EntitySetModel | None:
         """
         Find an entity set by its ID.
         """
-        return next((es for es in self._config.entity_set_models if es.entity_set_id == entity_set_id), None)
\ No newline at end of file
+        return next((es for es in self._config.entity_set_models if es.entity_set_id == entity_set_id), None)
+
+    def get_fine_grained_labels(self, entity_set_id: str) -> List[str]:
+        """
+        Get the fine-grained label ids of an entity set.
+        """
+        entity_set = self.get_entity_set(entity_set_id)
+        if entity_set is None:
+            return []
+        return [fine_grained.id for label in entity_set.entity_set_labels for fine_grained in label.fine_grained]
\ No newline at end of file
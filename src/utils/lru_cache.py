@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import threading
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache bounded by number of entries and, optionally, by total size.
+    """
+
+    def __init__(self,
+                 max_entries: int = 1024,
+                 max_size: Optional[int] = None,
+                 get_size: Optional[Callable[[Any], int]] = None):
+        """
+        :param max_entries: The maximum number of entries kept in the cache.
+        :param max_size: The maximum total size of the cached values, requires get_size.
+        :param get_size: A function returning the size of a value, e.g. its size in bytes.
+        """
+        self._max_entries = max(max_entries, 0)
+        self._max_size = max_size
+        self._get_size = get_size or (lambda value: 1)
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get the cached value for a key and mark it as most recently used.
+        :param key: The key to look up.
+        :param default: The value returned if the key is not cached.
+        :return: The cached value or default.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Cache a value, evicting least recently used entries if a bound is exceeded.
+        Values larger than max_size on their own are not cached.
+        :param key: The key to cache the value under.
+        :param value: The value to cache.
+        """
+        size: int = self._get_size(value)
+        with self._lock:
+            if self._max_entries == 0 or (self._max_size is not None and size > self._max_size):
+                return
+            if key in self._entries:
+                self._size -= self._sizes.pop(key)
+                del self._entries[key]
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._size += size
+            while len(self._entries) > self._max_entries or (self._max_size is not None and self._size > self._max_size):
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._size -= self._sizes.pop(evicted_key)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Remove all entries from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """
+        The total size of the cached values.
+        """
+        return self._size
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the counters of the cache.
+        :return: A dictionary with entries, size, hits, misses and evictions.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,143 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+
+import time
+
+StageListener = Callable[[str, float, Dict[str, str]], None]
+QuantityListener = Callable[[str, float, Dict[str, str]], None]
+
+_stage_listeners: List[StageListener] = []
+_quantity_listeners: List[QuantityListener] = []
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+_stage_labels: ContextVar[Dict[str, str]] = ContextVar("stage_labels", default={})
+
+
+def add_stage_listener(listener: StageListener) -> None:
+    """
+    Register a listener called with (stage, elapsed seconds, labels) whenever a timed stage finishes.
+    :param listener: The listener to register.
+    """
+    if listener not in _stage_listeners:
+        _stage_listeners.append(listener)
+
+
+def remove_stage_listener(listener: StageListener) -> None:
+    """
+    Unregister a listener added with add_stage_listener.
+    :param listener: The listener to unregister.
+    """
+    if listener in _stage_listeners:
+        _stage_listeners.remove(listener)
+
+
+def add_quantity_listener(listener: QuantityListener) -> None:
+    """
+    Register a listener called with (quantity, value, labels) whenever a quantity is recorded, see record_quantity.
+    :param listener: The listener to register.
+    """
+    if listener not in _quantity_listeners:
+        _quantity_listeners.append(listener)
+
+
+def remove_quantity_listener(listener: QuantityListener) -> None:
+    """
+    Unregister a listener added with add_quantity_listener.
+    :param listener: The listener to unregister.
+    """
+    if listener in _quantity_listeners:
+        _quantity_listeners.remove(listener)
+
+
+@contextmanager
+def stage_labels(**labels: str) -> Iterator[Dict[str, str]]:
+    """
+    Attach labels, e.g. entity_set_id and model_id, to all stages and quantities recorded within this context.
+    Labels given to timed_stage or record_quantity directly take precedence.
+    :param **labels: The labels to attach.
+    :return: All labels in effect within this context.
+    """
+    token = _stage_labels.set({**_stage_labels.get(), **labels})
+    try:
+        yield _stage_labels.get()
+    finally:
+        _stage_labels.reset(token)
+
+
+def current_stage_labels() -> Dict[str, str]:
+    """
+    Get the labels attached with stage_labels in the current context, e.g. to carry them into a worker thread.
+    :return: A copy of the labels.
+    """
+    return dict(_stage_labels.get())
+
+
+@contextmanager
+def timed_stage(stage: str, **labels: str) -> Iterator[None]:
+    """
+    Time a processing stage.
+    The elapsed time is added to the timings collected in the current context (see collect_stage_timings)
+    and reported to all registered stage listeners.
+    :param stage: The name of the stage, e.g. somajo_tokenize.
+    :param **labels: Additional labels passed to the listeners, e.g. entity_set_id and model_id.
+    """
+    started_at: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started_at, **labels)
+
+
+def record_stage(stage: str, elapsed: float, **labels: str) -> None:
+    """
+    Record the time of a stage measured elsewhere, e.g. one that ends before its labels are known.
+    :param stage: The name of the stage, e.g. request_parse.
+    :param elapsed: The elapsed seconds.
+    :param **labels: Additional labels passed to the listeners.
+    """
+    timings: Optional[Dict[str, float]] = _stage_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+    if _stage_listeners:
+        labels = {**_stage_labels.get(), **labels}
+        for listener in list(_stage_listeners):
+            listener(stage, elapsed, labels)
+
+
+def record_quantity(quantity: str, value: float, **labels: str) -> None:
+    """
+    Report a quantity of the processing, e.g. the number of generated tokens, to all registered quantity listeners.
+    :param quantity: The name of the quantity, e.g. output_tokens.
+    :param value: The value of the quantity.
+    :param **labels: Additional labels passed to the listeners.
+    """
+    if _quantity_listeners:
+        labels = {**_stage_labels.get(), **labels}
+        for listener in list(_quantity_listeners):
+            listener(quantity, value, labels)
+
+
+@contextmanager
+def collect_stage_timings() -> Iterator[Dict[str, float]]:
+    """
+    Collect the time spent per stage, in seconds, by all timed stages run within this context.
+    :return: A dictionary mapping stage names to the accumulated elapsed seconds.
+    """
+    timings: Dict[str, float] = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+def merge_stage_timings(timings: Dict[str, float]) -> None:
+    """
+    Add timings collected elsewhere, e.g. in a worker thread, to the timings collected in the current context.
+    :param timings: A dictionary mapping stage names to elapsed seconds.
+    """
+    current: Optional[Dict[str, float]] = _stage_timings.get()
+    if current is None or current is timings:
+        return
+    for stage, elapsed in timings.items():
+        current[stage] = current.get(stage, 0.0) + elapsed